@@ -1,9 +1,15 @@
-import os, json
 from flask import jsonify
-from config import HISTORIAL_LIVE_FILE
-from sessionManager import SessionManager
+from historial import obtener_total_live
+from estadisticas import estadisticas, latencias_chat
+from sessionManager import get_session_manager
+from model import servidor_inferencia, cache_predicciones, ejecutar_modelo
+from trabajos import cola_trabajos
+from routes import emisor_eventos
+from almacen_blobs import almacen_blobs
+from miniaturas import cache_miniaturas
+from recomendaciones import rotacion_recomendaciones
 
-session_manager = SessionManager(sessions_dir="static/sessions", cleanup_hours=24)
+session_manager = get_session_manager()
 
 def register_admin_routes(app):
     @app.route("/admin/limpiar_sesiones", methods=["POST"])
@@ -12,7 +18,8 @@ def register_admin_routes(app):
             sesiones_eliminadas = session_manager.force_cleanup()
             return jsonify({
                 "success": True,
-                "message": f"Limpieza completada: {sesiones_eliminadas} sesiones eliminadas"
+                "message": f"Limpieza completada: {sesiones_eliminadas} sesiones eliminadas",
+                "detalle": session_manager.last_cleanup
             })
         except Exception as e:
             return jsonify({"success": False, "error": str(e)})
@@ -25,54 +32,21 @@ def register_admin_routes(app):
             
             # Obtener lista de sesiones con detalles
             sessions_dir = session_manager.sessions_dir
-            session_details = []
-            
-            if os.path.exists(sessions_dir):
-                session_files = [f for f in os.listdir(sessions_dir) if f.startswith('session_') and f.endswith('.json')]
-                
-                for session_file in session_files:
-                    session_path = os.path.join(sessions_dir, session_file)
-                    try:
-                        with open(session_path, 'r', encoding='utf-8') as f:
-                            session_data = json.load(f)
-                        
-                        # Compatibilidad con formato nuevo y antiguo
-                        total_conversations = 0
-                        total_analyses = session_data.get("total_images_analyzed", 0)
-                        
-                        if 'conversations' in session_data:
-                            total_conversations = len(session_data['conversations'])
-                        elif 'analyses' in session_data:
-                            # Formato antiguo - migrar temporalmente para mostrar stats
-                            total_conversations = len(session_data['analyses'])
-                        
-                        session_details.append({
-                            "session_id": session_data.get("session_id"),
-                            "created": session_data.get("created"),
-                            "last_activity": session_data.get("last_activity"),
-                            "total_conversations": total_conversations,
-                            "total_analyses": total_analyses,
-                            "format": "nuevo" if 'conversations' in session_data else "antiguo"
-                        })
-                    except Exception as e:
-                        print(f"[ADMIN] Error al procesar {session_file}: {e}")
-                        continue
+            session_details = session_manager.get_session_summaries()
             
             # Estadísticas live
-            live_total = 0
-            if os.path.exists(HISTORIAL_LIVE_FILE):
-                with open(HISTORIAL_LIVE_FILE, 'r', encoding='utf-8') as f:
-                    historial_live = json.load(f)
-                live_total = historial_live.get("total_images_analyzed", 0)
+            live_total = obtener_total_live()
             
             return jsonify({
                 "sesiones": {
                     "total_activas": session_stats["active_sessions"],
                     "total_analisis": session_stats["total_analyses"],
+                    "por_clase": session_stats["analyses_by_class"],
                     "detalles": session_details
                 },
                 "live": {
-                    "total_analisis": live_total
+                    "total_analisis": live_total,
+                    "por_clase": estadisticas.resumen()["clases_live"]
                 },
                 "sistema": {
                     "cleanup_hours": session_stats["cleanup_hours"],
@@ -81,4 +55,59 @@ def register_admin_routes(app):
                 }
             })
         except Exception as e:
-            return jsonify({"error": f"Error al obtener estadísticas detalladas: {str(e)}"})
\ No newline at end of file
+            return jsonify({"error": f"Error al obtener estadísticas detalladas: {str(e)}"})
+
+    @app.route("/admin/estadisticas_inferencia")
+    def estadisticas_inferencia():
+        """Profundidad de cola e histograma de lotes del servidor de inferencia"""
+        try:
+            stats = servidor_inferencia.get_stats()
+            stats["modelo"] = ejecutar_modelo.get_stats()  # Carga y estadísticas del ejecutor
+            return jsonify(stats)
+        except Exception as e:
+            return jsonify({"error": f"Error al obtener estadísticas de inferencia: {str(e)}"})
+
+    @app.route("/admin/estadisticas_cache")
+    def estadisticas_cache():
+        """Aciertos y fallos del cache de predicciones"""
+        if cache_predicciones is None:
+            return jsonify({"activo": False})
+        return jsonify({"activo": True, **cache_predicciones.get_stats()})
+
+    @app.route("/admin/estadisticas_cache_sesiones")
+    def estadisticas_cache_sesiones():
+        """Tamaño y tasa de aciertos del cache de sesiones"""
+        return jsonify(session_manager.get_cache_stats())
+
+    @app.route("/admin/estadisticas_latencia")
+    def estadisticas_latencia():
+        """Tiempo hasta el primer resultado y tiempo total de las peticiones del chat"""
+        return jsonify(latencias_chat.get_stats())
+
+    @app.route("/admin/estadisticas_trabajos")
+    def estadisticas_trabajos():
+        """Ocupación de la cola de análisis en vivo"""
+        return jsonify(cola_trabajos.get_stats())
+
+    @app.route("/admin/estadisticas_eventos")
+    def estadisticas_eventos():
+        """Clientes Socket.IO, suscriptores por canal y buffers de salida"""
+        return jsonify(emisor_eventos.get_stats())
+
+    @app.route("/admin/estadisticas_blobs")
+    def estadisticas_blobs():
+        """Ocupación y deduplicación del almacén de imágenes y miniaturas generadas"""
+        return jsonify({**almacen_blobs.get_stats(), "miniaturas": cache_miniaturas.get_stats()})
+
+    @app.route("/admin/estadisticas_recomendaciones")
+    def estadisticas_recomendaciones():
+        """Estados de rotación de recomendaciones en memoria"""
+        return jsonify(rotacion_recomendaciones.get_stats())
+
+    @app.route("/admin/recolectar_blobs", methods=["POST"])
+    def recolectar_blobs():
+        try:
+            eliminados, liberados = almacen_blobs.recolectar()
+            return jsonify({"success": True, "blobs_eliminados": eliminados, "bytes_liberados": liberados})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)})
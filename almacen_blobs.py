@@ -0,0 +1,291 @@
+# almacen_blobs.py - Almacén de imágenes direccionado por contenido con referencias
+import atexit
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import (UPLOAD_FOLDER, BLOBS_DIR, BLOBS_DB_FILE, BLOBS_GRACIA_SEGUNDOS, ESCRITOR_MAX_BYTES_PENDIENTES,
+                    ESCRITOR_UMBRAL_DERRAME)
+
+# Extensión según los primeros bytes del contenido
+_EXTENSIONES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+
+def extension_imagen(contenido: bytes) -> str:
+    for firma, extension in _EXTENSIONES:
+        if contenido.startswith(firma):
+            return extension
+    if contenido[:4] == b"RIFF" and contenido[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+def listar_imagenes(extensiones: Tuple[str, ...] = (".jpg", ".jpeg", ".png")) -> List[str]:
+    """
+    Rutas de todas las imágenes guardadas: las antiguas de static/uploads y los blobs
+
+    Args:
+        extensiones: Extensiones admitidas (en minúsculas)
+
+    Returns:
+        List[str]: Rutas ordenadas
+    """
+    rutas = [os.path.join(UPLOAD_FOLDER, f) for f in os.listdir(UPLOAD_FOLDER)
+             if f.lower().endswith(extensiones) and os.path.isfile(os.path.join(UPLOAD_FOLDER, f))]
+    for raiz, _, archivos in os.walk(BLOBS_DIR):
+        rutas.extend(os.path.join(raiz, f) for f in archivos if f.lower().endswith(extensiones))
+    return sorted(rutas)
+
+class _Escritura:
+    def __init__(self, ruta: str, tamaño: int):
+        self.ruta = ruta
+        self.tamaño = tamaño
+        self.contenido = None  # Bytes en memoria...
+        self.temporal = None   # ...o archivo temporal si se derramó a disco
+        self.hecho = threading.Event()
+
+class AlmacenBlobs:
+    def __init__(self, directorio: str, ruta_db: str, gracia_segundos: float = 3600,
+                 max_bytes_pendientes: int = 64 * 1024 * 1024, umbral_derrame: int = 8 * 1024 * 1024):
+        """
+        Cada imagen se guarda una sola vez con su hash SHA-256 como nombre, repartida en
+        subdirectorios (ab/cd/abcd....jpg). Las sesiones y el historial live registran
+        referencias; el recolector borra los blobs que se quedan sin ninguna
+
+        Args:
+            directorio: Raíz de los blobs (dentro de static/ para servirlos directamente)
+            ruta_db: Base SQLite con los blobs y sus referencias
+            gracia_segundos: Edad mínima de un blob sin referencias para poder borrarlo
+                (cubre el intervalo entre guardar el blob y registrar su referencia)
+            max_bytes_pendientes: Memoria máxima retenida por escrituras diferidas
+            umbral_derrame: Tamaño a partir del cual una escritura diferida se vuelca
+                a un archivo temporal en lugar de quedarse en memoria
+        """
+        self.directorio = directorio
+        self.gracia_segundos = gracia_segundos
+        self.max_bytes_pendientes = max_bytes_pendientes
+        self.umbral_derrame = umbral_derrame
+        self.escritos = 0
+        self.duplicados = 0
+        self.derramados = 0
+
+        # Escritor en segundo plano: hash -> _Escritura pendiente
+        self._pendientes = {}
+        self._bytes_pendientes = 0
+        self._lock_pendientes = threading.Lock()
+        self._cola = queue.Queue()
+        threading.Thread(target=self._escritor, name="escritor-blobs", daemon=True).start()
+        atexit.register(self.vaciar)
+        os.makedirs(directorio, exist_ok=True)
+
+        self._conn = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    ruta TEXT NOT NULL,
+                    tamaño INTEGER NOT NULL,
+                    creado REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS referencias (
+                    hash TEXT NOT NULL,
+                    propietario TEXT NOT NULL,
+                    PRIMARY KEY (hash, propietario)
+                );
+                CREATE INDEX IF NOT EXISTS idx_referencias_propietario ON referencias(propietario);
+            """)
+            self._conn.commit()
+
+    def ruta_blob(self, hash_hex: str, extension: str) -> str:
+        return os.path.join(self.directorio, hash_hex[:2], hash_hex[2:4], f"{hash_hex}.{extension}")
+
+    def ruta_de(self, hash_hex: str) -> Optional[str]:
+        """Ruta del blob con este hash, o None si no está en el almacén"""
+        with self._lock:
+            fila = self._conn.execute("SELECT ruta FROM blobs WHERE hash = ?", (hash_hex,)).fetchone()
+        return fila[0] if fila else None
+
+    def url_relativa(self, ruta: str) -> str:
+        return "/" + ruta.replace(os.sep, "/")
+
+    def guardar(self, contenido: bytes, diferido: bool = False) -> Dict[str, Any]:
+        """
+        Guardar el contenido si no existe ya (escritura atómica con archivo temporal)
+
+        Args:
+            contenido: Bytes de la imagen
+            diferido: Devolver sin esperar al disco; el escritor en segundo plano
+                lo guarda (ver esperar())
+
+        Returns:
+            Diccionario con hash, ruta, url_relativa y tamaño del blob
+        """
+        hash_hex = hashlib.sha256(contenido).hexdigest()
+        ruta = self.ruta_blob(hash_hex, extension_imagen(contenido))
+
+        with self._lock, self._conn:
+            # Registrar (o renovar 'creado') antes de tocar el archivo: el recolector no
+            # borra un blob reciente, y así lo protege hasta que se registre su referencia
+            self._conn.execute(
+                "INSERT INTO blobs (hash, ruta, tamaño, creado) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET creado = excluded.creado",
+                (hash_hex, ruta, len(contenido), time.time())
+            )
+
+        info = {"hash": hash_hex, "ruta": ruta, "url_relativa": self.url_relativa(ruta), "tamaño": len(contenido)}
+        if os.path.exists(ruta):
+            self.duplicados += 1
+            return info
+
+        if not diferido:
+            self._escribir_archivo(ruta, contenido)
+            self.escritos += 1
+            return info
+
+        with self._lock_pendientes:
+            if hash_hex in self._pendientes:
+                self.duplicados += 1
+                return info
+            escritura = _Escritura(ruta, len(contenido))
+            if len(contenido) >= self.umbral_derrame or self._bytes_pendientes + len(contenido) > self.max_bytes_pendientes:
+                # Cuerpo grande o memoria agotada: volcar ya a un temporal y solo renombrar después
+                escritura.temporal = self._escribir_temporal(ruta, contenido)
+                self.derramados += 1
+            else:
+                escritura.contenido = contenido
+                self._bytes_pendientes += len(contenido)
+            self._pendientes[hash_hex] = escritura
+        self._cola.put(hash_hex)
+        return info
+
+    def _escribir_temporal(self, ruta: str, contenido: bytes) -> str:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(contenido)
+        return temporal
+
+    def _escribir_archivo(self, ruta: str, contenido: bytes):
+        os.replace(self._escribir_temporal(ruta, contenido), ruta)
+
+    def _escritor(self):
+        while True:
+            hash_hex = self._cola.get()
+            with self._lock_pendientes:
+                escritura = self._pendientes[hash_hex]
+            try:
+                if escritura.temporal is not None:
+                    os.replace(escritura.temporal, escritura.ruta)
+                else:
+                    self._escribir_archivo(escritura.ruta, escritura.contenido)
+                self.escritos += 1
+            except OSError as e:
+                print(f"[BLOBS ERROR] Error al escribir {escritura.ruta}: {e}")
+            finally:
+                with self._lock_pendientes:
+                    del self._pendientes[hash_hex]
+                    if escritura.contenido is not None:
+                        self._bytes_pendientes -= escritura.tamaño
+                escritura.hecho.set()
+                self._cola.task_done()
+
+    def esperar(self, hash_hex: str, timeout: Optional[float] = None) -> bool:
+        """Esperar a que una escritura diferida llegue a disco (True si ya no está pendiente)"""
+        with self._lock_pendientes:
+            escritura = self._pendientes.get(hash_hex)
+        return escritura is None or escritura.hecho.wait(timeout)
+
+    def vaciar(self):
+        """Esperar a que terminen todas las escrituras diferidas"""
+        self._cola.join()
+
+    def agregar_referencias(self, hashes: Iterable[str], propietario: str):
+        """Registrar que un propietario ('sesion:<id>', 'live') usa estos blobs"""
+        filas = [(hash_hex, propietario) for hash_hex in set(hashes) if hash_hex]
+        if not filas:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO referencias (hash, propietario) VALUES (?, ?)", filas)
+
+    def liberar(self, propietarios: Iterable[str]) -> int:
+        """Quitar todas las referencias de los propietarios indicados"""
+        propietarios = [(p,) for p in propietarios]
+        if not propietarios:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.executemany("DELETE FROM referencias WHERE propietario = ?", propietarios)
+            return cursor.rowcount
+
+    def recolectar(self) -> Tuple[int, int]:
+        """
+        Borrar los blobs sin referencias más antiguos que el periodo de gracia
+
+        Returns:
+            (blobs eliminados, bytes liberados)
+        """
+        limite = time.time() - self.gracia_segundos
+        with self._lock:
+            candidatos = self._conn.execute(
+                "SELECT b.hash, b.ruta, b.tamaño FROM blobs b "
+                "WHERE b.creado < ? AND NOT EXISTS (SELECT 1 FROM referencias r WHERE r.hash = b.hash)",
+                (limite,)
+            ).fetchall()
+
+        eliminados, liberados = [], 0
+        for hash_hex, ruta, tamaño in candidatos:
+            with self._lock, self._conn:
+                # Volver a comprobar: pudo referenciarse o reescribirse entre tanto
+                vigente = self._conn.execute(
+                    "SELECT 1 FROM blobs b WHERE b.hash = ? AND b.creado < ? AND NOT EXISTS "
+                    "(SELECT 1 FROM referencias r WHERE r.hash = b.hash)", (hash_hex, limite)
+                ).fetchone()
+                if vigente is None:
+                    continue
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"[BLOBS ERROR] Error al eliminar {ruta}: {e}")
+                    continue
+                self._conn.execute("DELETE FROM blobs WHERE hash = ?", (hash_hex,))
+            eliminados.append(hash_hex)
+            liberados += tamaño
+
+        if eliminados:
+            print(f"[BLOBS] {len(eliminados)} blobs sin referencias eliminados ({liberados / 1024:.0f} KB)")
+        return len(eliminados), liberados
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Blobs guardados, bytes ocupados, referencias y deduplicación"""
+        with self._lock:
+            blobs, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(tamaño), 0) FROM blobs").fetchone()
+            referencias = self._conn.execute("SELECT COUNT(*) FROM referencias").fetchone()[0]
+            sin_referencia = self._conn.execute(
+                "SELECT COUNT(*) FROM blobs b WHERE NOT EXISTS (SELECT 1 FROM referencias r WHERE r.hash = b.hash)"
+            ).fetchone()[0]
+        return {
+            "blobs": blobs,
+            "bytes": total_bytes,
+            "referencias": referencias,
+            "sin_referencia": sin_referencia,
+            "escritos": self.escritos,
+            "duplicados": self.duplicados,
+            "escrituras_pendientes": len(self._pendientes),
+            "bytes_pendientes": self._bytes_pendientes,
+            "derramados": self.derramados
+        }
+
+almacen_blobs = AlmacenBlobs(BLOBS_DIR, BLOBS_DB_FILE, BLOBS_GRACIA_SEGUNDOS,
+                             ESCRITOR_MAX_BYTES_PENDIENTES, ESCRITOR_UMBRAL_DERRAME)
@@ -1,12 +1,34 @@
 # app.py - Actualizado con soporte de cookies
-from flask import Flask, make_response
+#
+# Desarrollo:  python app.py
+# Producción:  MODO_SERVIDOR=produccion python app.py
+#              (o con varios procesos: SOCKETIO_MESSAGE_QUEUE=redis://... gunicorn -k eventlet -w 1 app:app
+#               por proceso, detrás de un balanceador con sesiones fijas)
+import concurrencia
+concurrencia.parchear()  # Antes de cualquier otro import
+
+import os
+from io import BytesIO
+from flask import Flask, Request, make_response
 from flask_socketio import SocketIO
+from config import (MODO_SERVIDOR, SOCKETIO_MESSAGE_QUEUE, SERVIDOR_HOST, SERVIDOR_PUERTO,
+                    SUBIDA_MAX_EN_MEMORIA, MODELO_CALENTAR_AL_INICIAR)
 from routes import register_routes, socketio
 from admin_routes import register_admin_routes
 from historial import inicializar_historial_live
-from sessionManager import SessionManager
+from sessionManager import get_session_manager
+from model import ejecutar_modelo
+
+class RequestEnMemoria(Request):
+    """Recibir los archivos subidos en memoria (Werkzeug los vuelca a disco a partir de 500 KB)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= SUBIDA_MAX_EN_MEMORIA:
+            return BytesIO()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
 
 app = Flask(__name__)
+app.request_class = RequestEnMemoria
 app.config["UPLOAD_FOLDER"] = "static/uploads"
 app.config["SECRET_KEY"] = "tu_clave_secreta_aqui"  # Necesaria para cookies
 
@@ -14,16 +36,33 @@ app.config["SECRET_KEY"] = "tu_clave_secreta_aqui"  # Necesaria para cookies
 register_routes(app)
 register_admin_routes(app)
 
+# La cola de mensajes permite emitir eventos desde cualquier proceso del servidor
+socketio.init_app(app, message_queue=SOCKETIO_MESSAGE_QUEUE)
+
+# También al arrancar con gunicorn, que no ejecuta el bloque __main__
+inicializar_historial_live()
+
+# El servidor acepta conexiones mientras el modelo se carga; ver /ready. En desarrollo,
+# el proceso inicial del recargador de Werkzeug solo vigila archivos y no sirve peticiones
+proceso_recargador = (__name__ == "__main__" and MODO_SERVIDOR != "produccion"
+                      and not os.environ.get("WERKZEUG_RUN_MAIN"))
+if MODELO_CALENTAR_AL_INICIAR and not proceso_recargador:
+    ejecutar_modelo.calentar_en_segundo_plano()
+
 if __name__ == "__main__":
-    inicializar_historial_live()
     print("="*60)
     print("🚀 SERVIDOR INICIADO CON SISTEMA DE SESIONES Y COOKIES")
     print("="*60)
-    session_manager = SessionManager(sessions_dir="static/sessions", cleanup_hours=24)
+    session_manager = get_session_manager()
     print(f"📁 Directorio de sesiones: {session_manager.sessions_dir}")
     print(f"⏰ Limpieza automática cada: {session_manager.cleanup_hours} horas")
     print(f"🍪 Cookies configuradas con expiración de 30 días")
+    print(f"⚙️  Modo: {MODO_SERVIDOR} ({concurrencia.MODO_ASYNC})")
+    if SOCKETIO_MESSAGE_QUEUE:
+        print(f"📨 Cola de mensajes Socket.IO: {SOCKETIO_MESSAGE_QUEUE}")
     print("="*60)
 
-    socketio.init_app(app)
-    socketio.run(app, host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    if MODO_SERVIDOR == "produccion":
+        socketio.run(app, host=SERVIDOR_HOST, port=SERVIDOR_PUERTO, debug=False, use_reloader=False)
+    else:
+        socketio.run(app, host=SERVIDOR_HOST, port=SERVIDOR_PUERTO, debug=True)
@@ -0,0 +1,71 @@
+# benchmark_arranque.py - Tiempo de importación y RSS base de cada módulo del servidor
+# Uso: python benchmarks/benchmark_arranque.py [repeticiones]
+#
+# Cada medición se hace en un proceso nuevo (importar es un coste de una sola vez por
+# proceso). Con "app" se mide además la carga y el calentamiento del modelo, que ya no
+# ocurren al importar.
+import os
+import sys
+import json
+import time
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+MODULOS = ("config", "model", "routes", "admin_routes", "app")
+
+def rss_mb():
+    """RSS actual del proceso (VmRSS en Linux; si no, el máximo que da getrusage)"""
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def medir_importacion(modulo):
+    """Ejecutado en el proceso hijo: importa el módulo y devuelve JSON"""
+    rss_inicial = rss_mb()
+    inicio = time.perf_counter()
+    __import__(modulo)
+    resultado = {
+        "importacion_ms": (time.perf_counter() - inicio) * 1000,
+        "rss_mb": rss_mb(),
+        "rss_inicial_mb": rss_inicial,
+        "tensorflow": "tensorflow" in sys.modules
+    }
+    if modulo == "app":
+        from model import ejecutar_modelo
+        inicio = time.perf_counter()
+        ejecutar_modelo.cargar()
+        resultado["listo_ms"] = (time.perf_counter() - inicio) * 1000
+        resultado["rss_listo_mb"] = rss_mb()
+    print(json.dumps(resultado))
+
+def ejecutar_hijo(modulo):
+    # Sin calentamiento en segundo plano: la carga del modelo se mide aparte
+    entorno = dict(os.environ, MODELO_CALENTAR_AL_INICIAR="0")
+    salida = subprocess.run([sys.executable, __file__, "--hijo", modulo], env=entorno, cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if "--hijo" in sys.argv:
+        medir_importacion(sys.argv[sys.argv.index("--hijo") + 1])
+        sys.exit(0)
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'módulo':14s} {'import ms':>10s} {'RSS MB':>8s} {'TF':>4s}")
+    for modulo in MODULOS:
+        # Mediana de varias ejecuciones; la primera calienta la cache de disco del sistema
+        resultados = sorted((ejecutar_hijo(modulo) for _ in range(repeticiones)), key=lambda r: r["importacion_ms"])
+        resultado = resultados[len(resultados) // 2]
+        print(f"{modulo:14s} {resultado['importacion_ms']:10.0f} {resultado['rss_mb']:8.0f} "
+              f"{'sí' if resultado['tensorflow'] else 'no':>4s}")
+        if "listo_ms" in resultado:
+            print(f"{'  + modelo':14s} {resultado['listo_ms']:10.0f} {resultado['rss_listo_mb']:8.0f} "
+                  f"{'(carga y calentamiento)':>4s}")
@@ -0,0 +1,35 @@
+# benchmark_inferencia.py - Latencia por imagen de cada modo de ejecución del modelo
+# Uso: python benchmarks/benchmark_inferencia.py [repeticiones]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from almacen_blobs import listar_imagenes
+from model import crear_ejecutor, cargar_modelo_keras
+from preprocesamiento import preprocesar
+
+def cargar_imagenes():
+    return [preprocesar(ruta) for ruta in listar_imagenes()]
+
+def medir(ejecutor, arrays, repeticiones):
+    # Primera llamada fuera de la medición (trazado / creación del adaptador)
+    ejecutor(np.expand_dims(arrays[0], axis=0))
+    tiempos = []
+    for _ in range(repeticiones):
+        for array in arrays:
+            inicio = time.perf_counter()
+            ejecutor(np.expand_dims(array, axis=0))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return np.array(tiempos)
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    arrays = cargar_imagenes()
+    modelo = cargar_modelo_keras()
+    print(f"{len(arrays)} imágenes x {repeticiones} repeticiones, lote de 1")
+    for modo in ("predict", "directo", "tf_function"):
+        tiempos = medir(crear_ejecutor(modo, modelo), arrays, repeticiones)
+        print(f"{modo:12s} media {tiempos.mean():7.2f}ms  p50 {np.percentile(tiempos, 50):7.2f}ms  p95 {np.percentile(tiempos, 95):7.2f}ms")
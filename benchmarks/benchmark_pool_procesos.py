@@ -0,0 +1,51 @@
+# benchmark_pool_procesos.py - Imágenes/segundo del pool de inferencia de 1 a N procesos
+# Uso: python benchmarks/benchmark_pool_procesos.py [max_procesos] [tamaño_lote] [segundos]
+#
+# Para cada número de procesos arranca un PoolInferenciaProcesos y lo alimenta desde
+# tantos hilos como procesos, con lotes aleatorios del tamaño indicado.
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from config import TAMAÑO_IMAGEN
+from pool_inferencia import PoolInferenciaProcesos
+
+def medir(num_procesos, tamaño_lote, segundos):
+    pool = PoolInferenciaProcesos(num_procesos, max_lote=tamaño_lote)
+    lote = np.random.rand(tamaño_lote, *TAMAÑO_IMAGEN, 3).astype(np.float32)
+    pool(lote)  # Primera pasada fuera de la medición
+
+    fin = time.perf_counter() + segundos
+    contadores = [0] * num_procesos
+
+    def alimentar(i):
+        while time.perf_counter() < fin:
+            pool(lote)
+            contadores[i] += tamaño_lote
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=alimentar, args=(i,)) for i in range(num_procesos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    pool.cerrar()
+    return sum(contadores) / duracion, pool.hilos_por_proceso
+
+if __name__ == "__main__":
+    max_procesos = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    tamaño_lote = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    segundos = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    print(f"{os.cpu_count()} núcleos, lote de {tamaño_lote}, {segundos:.0f}s por medición")
+    base = None
+    for num_procesos in range(1, max_procesos + 1):
+        imagenes_s, hilos = medir(num_procesos, tamaño_lote, segundos)
+        base = base or imagenes_s
+        print(f"{num_procesos:2d} procesos x {hilos:2d} hilos  {imagenes_s:8.1f} img/s  escalado x{imagenes_s / base:.2f}")
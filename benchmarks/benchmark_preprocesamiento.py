@@ -0,0 +1,45 @@
+# benchmark_preprocesamiento.py - keras.utils.load_img vs preprocesamiento.preprocesar
+# Uso: python benchmarks/benchmark_preprocesamiento.py [repeticiones]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from io import BytesIO
+from keras.utils import load_img, img_to_array
+from config import UPLOAD_FOLDER, TAMAÑO_IMAGEN
+from preprocesamiento import preprocesar
+
+def ruta_keras(imagen_bytes):
+    # Camino anterior de model.predecir_imagen
+    imagen = load_img(BytesIO(imagen_bytes), target_size=TAMAÑO_IMAGEN)
+    array_imagen = img_to_array(imagen)
+    return np.expand_dims(array_imagen, axis=0) / 255.0
+
+def ruta_nueva(imagen_bytes, buffer):
+    return preprocesar(imagen_bytes, salida=buffer)
+
+def medir(funcion, datos, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(datos)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return np.median(tiempos)
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    buffer = np.empty((*TAMAÑO_IMAGEN[::-1], 3), dtype=np.float32)
+    archivos = sorted(f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+
+    print(f"{'imagen':60s} {'KB':>7s} {'keras ms':>9s} {'nuevo ms':>9s} {'x':>6s} {'max|Δ|':>7s}")
+    for archivo in archivos:
+        with open(os.path.join(UPLOAD_FOLDER, archivo), "rb") as f:
+            imagen_bytes = f.read()
+        t_keras = medir(ruta_keras, imagen_bytes, repeticiones)
+        t_nuevo = medir(lambda datos: ruta_nueva(datos, buffer), imagen_bytes, repeticiones)
+        diferencia = np.abs(ruta_keras(imagen_bytes)[0] - ruta_nueva(imagen_bytes, buffer)).max()
+        print(f"{archivo[:60]:60s} {len(imagen_bytes)/1024:7.0f} {t_keras:9.2f} {t_nuevo:9.2f} "
+              f"{t_keras/t_nuevo:6.1f} {diferencia:7.3f}")
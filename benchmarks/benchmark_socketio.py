@@ -0,0 +1,112 @@
+# benchmark_socketio.py - Carga de eventos live con muchos clientes Socket.IO locales
+# Uso: python benchmarks/benchmark_socketio.py [clientes] [eventos] [fraccion_lentos]
+#
+# Levanta un servidor mínimo con EmisorEventos (sin modelo), suscribe clientes al canal
+# live (una fracción confirma despacio) y emite eventos nueva_imagen. Mide el tiempo de
+# emisión en el servidor, la latencia de entrega a los clientes rápidos, los eventos
+# descartados a los lentos y el tamaño de los mensajes en formato completo y compacto.
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import socketio as sio_cliente
+from flask import Flask, request
+from flask_socketio import SocketIO
+from eventos_live import EmisorEventos, compactar
+
+PUERTO = 5099
+CANAL = "live"
+RETARDO_LENTO = 0.5  # Segundos que tarda un cliente lento en confirmar cada evento
+
+def crear_servidor():
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="threading", cors_allowed_origins="*")
+    emisor = EmisorEventos(socketio, max_pendientes=16, timeout_confirmacion=5.0)
+
+    @socketio.on("connect")
+    def conectar(auth=None):
+        emisor.registrar(request.sid, request.args.get("formato") == "compacto")
+
+    @socketio.on("suscribir")
+    def suscribir(datos):
+        return {"ok": emisor.suscribir(request.sid, datos["canal"])}
+
+    @socketio.on("disconnect")
+    def desconectar(*args):
+        emisor.eliminar(request.sid)
+
+    hilo = threading.Thread(target=socketio.run, args=(app,),
+                            kwargs={"port": PUERTO, "allow_unsafe_werkzeug": True}, daemon=True)
+    hilo.start()
+    time.sleep(1)
+    return emisor
+
+def conectar_clientes(n, formato, fraccion_lentos):
+    clientes = []
+    for i in range(n):
+        lento = i < int(n * fraccion_lentos)
+        cliente = sio_cliente.Client()
+        recibidos = []
+
+        def al_recibir(datos, recibidos=recibidos, lento=lento):
+            # job_id lleva el instante de emisión para medir la latencia
+            enviado = float(datos[0] if isinstance(datos, list) else datos["job_id"])
+            recibidos.append((time.time() - enviado) * 1000)
+            if lento:
+                time.sleep(RETARDO_LENTO)
+            return True  # Confirmación (ack)
+
+        cliente.on("ni" if formato == "compacto" else "nueva_imagen", al_recibir)
+        cliente.connect(f"http://127.0.0.1:{PUERTO}?formato={formato}", transports=["websocket"])
+        cliente.call("suscribir", {"canal": CANAL})
+        clientes.append((cliente, recibidos, lento))
+    return clientes
+
+def ejecutar(emisor, n_clientes, n_eventos, formato, fraccion_lentos):
+    clientes = conectar_clientes(n_clientes, formato, fraccion_lentos)
+    tiempos_emision = []
+    for i in range(n_eventos):
+        datos = {"job_id": repr(time.time()), "url": f"/static/uploads/imagen_{i}.jpg",
+                 "etiqueta": "plastico", "confianza": 0.9731234}
+        inicio = time.perf_counter()
+        emisor.emitir("nueva_imagen", datos, canal=CANAL)
+        tiempos_emision.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(0.01)
+    time.sleep(2)
+
+    stats = emisor.get_stats()
+    rapidos = [r for _, recibidos, lento in clientes if not lento for r in recibidos]
+    lentos = [len(recibidos) for _, recibidos, lento in clientes if lento]
+    emision = np.array(tiempos_emision)
+    print(f"[{formato}] {n_clientes} clientes ({len(lentos)} lentos), {n_eventos} eventos")
+    print(f"  emisión en servidor  media {emision.mean():6.2f}ms  p95 {np.percentile(emision, 95):6.2f}ms")
+    if rapidos:
+        print(f"  entrega (rápidos)    p50 {np.percentile(rapidos, 50):6.1f}ms  p95 {np.percentile(rapidos, 95):6.1f}ms"
+              f"  recibidos {len(rapidos)}/{n_eventos * (n_clientes - len(lentos))}")
+    if lentos:
+        print(f"  recibidos por lento  media {np.mean(lentos):.1f}  descartados {stats['descartados']}"
+              f"  pendientes máx {stats['max_pendientes_cliente']}")
+
+    for cliente, _, _ in clientes:
+        cliente.disconnect()
+    time.sleep(0.5)
+
+if __name__ == "__main__":
+    n_clientes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_eventos = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    fraccion_lentos = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+    ejemplo = {"job_id": "3f2c9a0d1b7e4c55a6e8f0b2d4c6a8e1", "url": "/static/uploads/imagen_1712345678901_3f2c9a0d.jpg",
+               "etiqueta": "plastico", "confianza": 0.973123412}
+    completo = len(json.dumps(["nueva_imagen", ejemplo]))
+    compacto = len(json.dumps(list(compactar("nueva_imagen", ejemplo))))
+    print(f"Tamaño de nueva_imagen: completo {completo} bytes, compacto {compacto} bytes")
+
+    emisor = crear_servidor()
+    for formato in ("completo", "compacto"):
+        ejecutar(emisor, n_clientes, n_eventos, formato, fraccion_lentos)
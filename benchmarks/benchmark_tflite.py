@@ -0,0 +1,76 @@
+# benchmark_tflite.py - Paridad de precisión, latencia y RSS: Keras vs TFLite
+# Uso: python benchmarks/benchmark_tflite.py [modelo.tflite ...]
+# Cada backend se mide en un proceso aparte para que el RSS sea comparable.
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+def medir_backend():
+    """Ejecutado en el proceso hijo: predice todas las imágenes y devuelve JSON"""
+    import numpy as np
+    from almacen_blobs import listar_imagenes
+    from model import ejecutar_modelo
+    from preprocesamiento import preprocesar
+
+    archivos = listar_imagenes()
+    arrays = [preprocesar(ruta) for ruta in archivos]
+    ejecutar_modelo.cargar()  # Carga y calentamiento fuera de la medición
+
+    probabilidades, tiempos = [], []
+    for array in arrays:
+        inicio = time.perf_counter()
+        salida = ejecutar_modelo(np.expand_dims(array, axis=0).astype(np.float32))
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        probabilidades.append(salida[0].tolist())
+
+    print(json.dumps({
+        "archivos": archivos,
+        "probabilidades": probabilidades,
+        "latencia_ms": float(np.median(tiempos[1:] or tiempos)),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+def ejecutar_hijo(backend, ruta_tflite=None):
+    entorno = dict(os.environ, BACKEND_MODELO=backend)
+    if ruta_tflite:
+        entorno["RUTA_MODELO_TFLITE"] = ruta_tflite
+    salida = subprocess.run([sys.executable, __file__, "--hijo"], env=entorno, cwd=RAIZ,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    if "--hijo" in sys.argv:
+        medir_backend()
+        sys.exit(0)
+
+    import numpy as np
+    from config import CLASES
+
+    rutas_tflite = sys.argv[1:] or ["mobilenet_practica_5clases_fp16.tflite", "mobilenet_practica_5clases_int8.tflite"]
+    referencia = ejecutar_hijo("keras")
+    ref_probs = np.array(referencia["probabilidades"])
+    ref_clases = ref_probs.argmax(axis=1)
+    print(f"{'backend':45s} {'acuerdo':>8s} {'max|Δp|':>8s} {'lat ms':>8s} {'RSS MB':>8s}")
+    print(f"{'keras':45s} {'100.0%':>8s} {0:8.4f} {referencia['latencia_ms']:8.2f} {referencia['rss_mb']:8.0f}")
+
+    for ruta in rutas_tflite:
+        if not os.path.exists(os.path.join(RAIZ, ruta)):
+            print(f"{ruta:45s} no existe (ejecuta convertir_tflite.py)")
+            continue
+        resultado = ejecutar_hijo("tflite", ruta)
+        probs = np.array(resultado["probabilidades"])
+        clases = probs.argmax(axis=1)
+        acuerdo = (clases == ref_clases).mean() * 100
+        print(f"{ruta:45s} {acuerdo:7.1f}% {np.abs(probs - ref_probs).max():8.4f} "
+              f"{resultado['latencia_ms']:8.2f} {resultado['rss_mb']:8.0f}")
+        # Paridad por clase (según la clase que predice el modelo Keras)
+        for id_clase, nombre in enumerate(CLASES):
+            mascara = ref_clases == id_clase
+            if mascara.any():
+                print(f"    {nombre:10s} {(clases[mascara] == id_clase).mean()*100:5.1f}% de {mascara.sum()} imágenes")
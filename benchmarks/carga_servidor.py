@@ -0,0 +1,83 @@
+# carga_servidor.py - Capacidad de peticiones concurrentes de un servidor en marcha
+# Uso: python benchmarks/carga_servidor.py [url_base] [peticiones_por_nivel]
+#
+# Envía imágenes de UPLOAD_FOLDER a POST / con concurrencia creciente y, en paralelo,
+# consulta una ruta ligera para ver si la inferencia bloquea el bucle de eventos.
+# Comparar: python app.py  frente a  MODO_SERVIDOR=produccion python app.py
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import requests
+from config import UPLOAD_FOLDER
+
+NIVELES = (1, 2, 4, 8, 16, 32)
+RUTA_LIGERA = "/estadisticas_historial"
+
+def cargar_imagenes():
+    archivos = sorted(f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    imagenes = []
+    for nombre in archivos[:16]:
+        with open(os.path.join(UPLOAD_FOLDER, nombre), "rb") as f:
+            imagenes.append((nombre, f.read()))
+    return imagenes
+
+def enviar(url_base, imagen):
+    nombre, contenido = imagen
+    contenido += os.urandom(8)  # Bytes finales ignorados al decodificar; evitan el cache de predicciones
+    inicio = time.perf_counter()
+    respuesta = requests.post(url_base + "/", files={"imagen": (f"carga_{nombre}", contenido)},
+                              headers={"X-Requested-With": "XMLHttpRequest"}, timeout=120)
+    respuesta.raise_for_status()
+    return (time.perf_counter() - inicio) * 1000
+
+def sondear(url_base, parar, tiempos):
+    """Latencia de una ruta sin inferencia mientras dura la carga"""
+    sesion = requests.Session()
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            sesion.get(url_base + RUTA_LIGERA, timeout=30)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+
+def nivel(url_base, imagenes, concurrencia, peticiones):
+    parar, sondeos = threading.Event(), []
+    sonda = threading.Thread(target=sondear, args=(url_base, parar, sondeos), daemon=True)
+    sonda.start()
+
+    latencias, errores = [], 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        futuros = [pool.submit(enviar, url_base, imagenes[i % len(imagenes)]) for i in range(peticiones)]
+        for futuro in futuros:
+            try:
+                latencias.append(futuro.result())
+            except Exception:
+                errores += 1
+    duracion = time.perf_counter() - inicio
+    parar.set()
+    sonda.join()
+
+    latencias = np.array(latencias) if latencias else np.zeros(1)
+    sondeos = np.array(sondeos) if sondeos else np.zeros(1)
+    print(f"concurrencia {concurrencia:3d}  {len(latencias) / duracion:6.1f} pet/s"
+          f"  p50 {np.percentile(latencias, 50):7.1f}ms  p95 {np.percentile(latencias, 95):7.1f}ms"
+          f"  errores {errores:3d}  {RUTA_LIGERA} p95 {np.percentile(sondeos, 95):7.1f}ms")
+
+if __name__ == "__main__":
+    url_base = sys.argv[1].rstrip("/") if len(sys.argv) > 1 else "http://127.0.0.1:5000"
+    peticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    imagenes = cargar_imagenes()
+    if not imagenes:
+        sys.exit(f"No hay imágenes en {UPLOAD_FOLDER}")
+    print(f"{url_base}: {peticiones} peticiones por nivel, {len(imagenes)} imágenes distintas")
+    for concurrencia in NIVELES:
+        nivel(url_base, imagenes, concurrencia, peticiones)
@@ -0,0 +1,165 @@
+# cache_predicciones.py - Cache de predicciones por hash del contenido de la imagen
+import os
+import atexit
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+class CachePredicciones:
+    def __init__(self, version_modelo: str, max_entradas=2048, ttl_segundos=86400, ruta_disco=None,
+                 max_filas_disco=100000, intervalo_escritura=2.0):
+        """
+        Inicializar el cache de predicciones
+
+        Args:
+            version_modelo: Identificador del modelo; forma parte de la clave
+            max_entradas: Tamaño máximo del nivel en memoria (LRU)
+            ttl_segundos: Tiempo de vida de cada entrada
+            ruta_disco: Archivo SQLite del nivel persistente (None para desactivarlo)
+            max_filas_disco: Filas máximas del nivel en disco; al podar se borran las más antiguas
+            intervalo_escritura: Segundos entre escrituras agrupadas al disco (fuera de la petición)
+        """
+        self.version_modelo = version_modelo
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.ruta_disco = ruta_disco
+        self.max_filas_disco = max_filas_disco
+        self.intervalo_escritura = intervalo_escritura
+        self.memoria = OrderedDict()  # clave -> (etiqueta, confianza, creado)
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self.filas_podadas = 0
+        self._pendientes_disco = {}  # clave -> (etiqueta, confianza, creado) aún sin escribir
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()  # La conexión SQLite, separada del nivel en memoria
+        self._conexion = None
+
+        if ruta_disco:
+            directorio = os.path.dirname(ruta_disco)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            self._conexion = sqlite3.connect(ruta_disco, check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS predicciones ("
+                "clave TEXT PRIMARY KEY, etiqueta TEXT NOT NULL, confianza REAL NOT NULL, creado REAL NOT NULL)"
+            )
+            self._conexion.execute("CREATE INDEX IF NOT EXISTS idx_predicciones_creado ON predicciones(creado)")
+            self._conexion.commit()
+            self.podar()
+            threading.Thread(target=self._escritor, name="escritor-cache-ia", daemon=True).start()
+            atexit.register(self.vaciar)
+
+        print(f"[CACHE IA] Inicializado - Máx: {max_entradas} entradas, TTL: {ttl_segundos}s, Disco: {ruta_disco}")
+
+    def calcular_clave(self, imagen_bytes: bytes) -> str:
+        """Clave = hash del contenido de la imagen + versión del modelo"""
+        digest = hashlib.sha256(imagen_bytes).hexdigest()
+        return f"{self.version_modelo}:{digest}"
+
+    def obtener(self, clave: str) -> Optional[Tuple[str, float]]:
+        ahora = time.time()
+        with self._lock:
+            entrada = self.memoria.get(clave) or self._pendientes_disco.get(clave)
+            if entrada is not None:
+                etiqueta, confianza, creado = entrada
+                if ahora - creado <= self.ttl_segundos:
+                    self._guardar_memoria(clave, etiqueta, confianza, creado)
+                    self.aciertos_memoria += 1
+                    return etiqueta, confianza
+                self.memoria.pop(clave, None)
+
+        if self._conexion is not None:
+            with self._lock_disco:
+                fila = self._conexion.execute(
+                    "SELECT etiqueta, confianza, creado FROM predicciones WHERE clave = ?", (clave,)
+                ).fetchone()
+            # Las filas vencidas se ignoran aquí y se borran al podar
+            if fila is not None and ahora - fila[2] <= self.ttl_segundos:
+                etiqueta, confianza, creado = fila
+                with self._lock:
+                    self._guardar_memoria(clave, etiqueta, confianza, creado)
+                    self.aciertos_disco += 1
+                return etiqueta, confianza
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave: str, etiqueta: str, confianza: float):
+        """Guardar en memoria; el escritor en segundo plano lo persiste en el siguiente lote"""
+        creado = time.time()
+        confianza = float(confianza)
+        with self._lock:
+            self._guardar_memoria(clave, etiqueta, confianza, creado)
+            if self._conexion is not None:
+                self._pendientes_disco[clave] = (etiqueta, confianza, creado)
+
+    def _escritor(self):
+        ultima_poda = time.time()
+        while True:
+            time.sleep(self.intervalo_escritura)
+            try:
+                self.vaciar()
+                if time.time() - ultima_poda >= 3600:
+                    self.podar()
+                    ultima_poda = time.time()
+            except Exception as e:
+                print(f"[CACHE IA ERROR] Error al escribir en disco: {e}")
+
+    def vaciar(self):
+        """Escribir en una sola transacción las entradas pendientes"""
+        with self._lock:
+            pendientes, self._pendientes_disco = self._pendientes_disco, {}
+        if not pendientes:
+            return
+        with self._lock_disco, self._conexion:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO predicciones (clave, etiqueta, confianza, creado) VALUES (?, ?, ?, ?)",
+                [(clave, *entrada) for clave, entrada in pendientes.items()]
+            )
+
+    def podar(self) -> int:
+        """Borrar del disco las filas vencidas y, por encima de max_filas_disco, las más antiguas"""
+        with self._lock_disco, self._conexion:
+            borradas = self._conexion.execute(
+                "DELETE FROM predicciones WHERE creado < ?", (time.time() - self.ttl_segundos,)
+            ).rowcount
+            sobrantes = self._conexion.execute("SELECT COUNT(*) FROM predicciones").fetchone()[0] - self.max_filas_disco
+            if sobrantes > 0:
+                borradas += self._conexion.execute(
+                    "DELETE FROM predicciones WHERE clave IN "
+                    "(SELECT clave FROM predicciones ORDER BY creado LIMIT ?)", (sobrantes,)
+                ).rowcount
+        if borradas:
+            self.filas_podadas += borradas
+            print(f"[CACHE IA] {borradas} predicciones eliminadas del disco")
+        return borradas
+
+    def _guardar_memoria(self, clave, etiqueta, confianza, creado):
+        self.memoria[clave] = (etiqueta, confianza, creado)
+        self.memoria.move_to_end(clave)
+        while len(self.memoria) > self.max_entradas:
+            self.memoria.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            aciertos = self.aciertos_memoria + self.aciertos_disco
+            return {
+                "entradas_memoria": len(self.memoria),
+                "max_entradas": self.max_entradas,
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "tasa_aciertos": aciertos / consultas if consultas else 0.0,
+                "disco": self.ruta_disco,
+                "pendientes_disco": len(self._pendientes_disco),
+                "filas_podadas": self.filas_podadas,
+                "version_modelo": self.version_modelo
+            }
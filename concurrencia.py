@@ -0,0 +1,37 @@
+# concurrencia.py - Modelo de concurrencia del servidor (hilos, eventlet o gevent)
+import os
+from config import MODO_SERVIDOR, SOCKETIO_ASYNC_MODE, HILOS_BLOQUEANTES
+
+# En desarrollo se usan hilos normales; en producción el bucle de eventos configurado
+MODO_ASYNC = SOCKETIO_ASYNC_MODE if MODO_SERVIDOR == "produccion" else "threading"
+
+def parchear():
+    """
+    Aplicar el monkey patching del bucle de eventos. Debe llamarse antes de importar
+    el resto de módulos (app.py lo hace en su primera línea)
+    """
+    if MODO_ASYNC == "eventlet":
+        os.environ.setdefault("EVENTLET_THREADPOOL_SIZE", str(HILOS_BLOQUEANTES))
+        import eventlet
+        eventlet.monkey_patch()
+    elif MODO_ASYNC == "gevent":
+        os.environ.setdefault("GEVENT_THREADPOOL_SIZE", str(HILOS_BLOQUEANTES))
+        from gevent import monkey
+        monkey.patch_all()
+
+def ejecutar_bloqueante(funcion, *args, **kwargs):
+    """
+    Ejecutar trabajo de CPU (inferencia, decodificación) en un hilo del sistema.
+    Con eventlet o gevent la corrutina que llama cede el bucle mientras espera;
+    con hilos normales se llama directamente
+
+    Returns:
+        El valor devuelto por funcion
+    """
+    if MODO_ASYNC == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(funcion, *args, **kwargs)
+    if MODO_ASYNC == "gevent":
+        from gevent import get_hub
+        return get_hub().threadpool.apply(funcion, args, kwargs)
+    return funcion(*args, **kwargs)
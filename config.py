@@ -6,4 +6,115 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 TAMAÑO_IMAGEN = (224, 224)
 CLASES = ["Carton", "Latas", "Papel", "Plastico", "Vidrio"]
 
-HISTORIAL_LIVE_FILE = "historial_analisis_live.json"
+HISTORIAL_LIVE_FILE = "historial_analisis_live.json"  # Formato antiguo (se migra al log)
+HISTORIAL_LIVE_LOG = "historial_analisis_live.jsonl"  # Un análisis por línea, solo se agrega
+HISTORIAL_LIVE_META = "historial_analisis_live.meta.json"
+HISTORIAL_META_CADA = 100  # Análisis entre escrituras de los agregados en el archivo de metadatos
+
+# Micro-batching de inferencia entre peticiones concurrentes
+MICROBATCH_ACTIVO = True
+MICROBATCH_MAX_LOTE = 32
+MICROBATCH_MAX_ESPERA_MS = 5
+
+# Backend del modelo: "keras" (modelo .h5 completo) o "tflite" (modelo convertido
+# con convertir_tflite.py, pensado para servidores solo-CPU)
+BACKEND_MODELO = os.environ.get("BACKEND_MODELO", "keras")
+RUTA_MODELO_KERAS = "mobilenet_practica_5clases.h5"
+RUTA_MODELO_TFLITE = os.environ.get("RUTA_MODELO_TFLITE", "mobilenet_practica_5clases_fp16.tflite")
+TFLITE_NUM_HILOS = None  # None = dejar que TFLite decida
+
+# Ruta de ejecución del modelo Keras: "predict" (Keras predict), "directo" (modelo(x))
+# o "tf_function" (grafo trazado con firma fija, calentado al iniciar)
+MODO_INFERENCIA = "tf_function"
+
+# El modelo se carga al primer uso; con esto activo, app.py lo carga y calienta en
+# segundo plano al arrancar (/ready responde 503 hasta que termina)
+MODELO_CALENTAR_AL_INICIAR = os.environ.get("MODELO_CALENTAR_AL_INICIAR", "1") == "1"
+
+# Cache de predicciones por hash de la imagen
+CACHE_PREDICCIONES_ACTIVO = True
+CACHE_PREDICCIONES_MAX_ENTRADAS = 2048
+CACHE_PREDICCIONES_TTL_SEGUNDOS = 7 * 24 * 3600
+CACHE_PREDICCIONES_DISCO = "cache_predicciones.sqlite"  # None = solo memoria
+CACHE_PREDICCIONES_DISCO_MAX_FILAS = 100000
+CACHE_PREDICCIONES_INTERVALO_ESCRITURA = 2.0  # Segundos entre escrituras agrupadas al disco
+
+# Almacenamiento de sesiones: "sqlite" (conversaciones como filas, last_activity indexado)
+# o "json" (un archivo por sesión, formato original)
+SESSION_BACKEND = "sqlite"
+SESSION_DB_FILE = "sessions.sqlite"
+SESSIONS_DIR = "static/sessions"
+SESSION_CLEANUP_HOURS = 24
+
+# Cache de sesiones en memoria (LRU) y locks por sesión
+SESSION_CACHE_MAX_ENTRIES = 1000
+SESSION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SESSION_LOCK_STRIPES = 64
+
+# Escritura de sesiones:
+#   "sync"          cada cambio se escribe al momento
+#   "conversations" las conversaciones se escriben al momento; los cambios de actividad
+#                   se agrupan y se escriben junto con la siguiente escritura o flush
+#   "deferred"      todo se agrupa; se pueden perder hasta SESSION_FLUSH_INTERVAL
+#                   segundos de cambios si el proceso muere sin cerrar limpiamente
+SESSION_WRITE_MODE = "conversations"
+SESSION_FLUSH_INTERVAL = 2.0
+
+# Descarga de imágenes por URL
+DESCARGA_TIMEOUT = 10
+DESCARGA_MAX_BYTES = 15 * 1024 * 1024
+DESCARGA_MAX_POR_HOST = 4
+DESCARGA_MAX_CONCURRENTES = 8
+
+# Pipeline por etapas de la ruta principal
+PIPELINE_HILOS_IO = 8
+PIPELINE_HILOS_DECODIFICACION = 2
+PIPELINE_MAX_EN_VUELO = 8
+
+# Cola de trabajos del análisis en vivo (/analizar_url)
+LIVE_TRABAJOS_HILOS = 2
+LIVE_TRABAJOS_MAX_COLA = 32  # Por encima se responde 429
+LIVE_TRABAJOS_RETENCION_SEGUNDOS = 600
+
+# Eventos Socket.IO del análisis en vivo
+CANAL_LIVE = "live"  # Canal con los eventos de todos los trabajos (suscripción explícita con 'suscribir')
+EVENTOS_MAX_PENDIENTES_CLIENTE = 16
+EVENTOS_TIMEOUT_CONFIRMACION = 5.0
+EVENTOS_INTERVALO_BARRIDO = 1.0  # Segundos entre reintentos de clientes con confirmaciones vencidas
+
+# Modo de ejecución del servidor: "desarrollo" (hilos de Flask, debug) o
+# "produccion" (eventlet o gevent para los sockets, inferencia en hilos del sistema)
+MODO_SERVIDOR = os.environ.get("MODO_SERVIDOR", "desarrollo")
+SOCKETIO_ASYNC_MODE = os.environ.get("SOCKETIO_ASYNC_MODE", "eventlet")  # "eventlet" o "gevent"
+# Cola de mensajes para emitir entre varios procesos (p. ej. redis://localhost:6379/0)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None
+SERVIDOR_HOST = os.environ.get("SERVIDOR_HOST", "0.0.0.0")
+SERVIDOR_PUERTO = int(os.environ.get("SERVIDOR_PUERTO", "5000"))
+HILOS_BLOQUEANTES = int(os.environ.get("HILOS_BLOQUEANTES", "8"))  # Hilos del sistema para inferencia y decodificación
+
+# Pool de inferencia multiproceso: 0 = modelo en el proceso web. Con N > 0 el modelo
+# se carga en N procesos trabajadores y los lotes viajan por memoria compartida
+POOL_PROCESOS = int(os.environ.get("POOL_PROCESOS", "0"))
+POOL_HILOS_POR_PROCESO = None  # None = núcleos / procesos
+POOL_FIJAR_CPUS = True
+
+# Almacén de imágenes direccionado por contenido (static/uploads/blobs/ab/cd/<sha256>.<ext>)
+BLOBS_DIR = os.path.join(UPLOAD_FOLDER, "blobs")
+BLOBS_DB_FILE = "blobs.sqlite"
+BLOBS_GRACIA_SEGUNDOS = 3600  # Edad mínima de un blob sin referencias antes de borrarlo
+
+# Escritura diferida de imágenes: la petición clasifica desde memoria y el archivo
+# se guarda en segundo plano
+ESCRITOR_MAX_BYTES_PENDIENTES = 64 * 1024 * 1024  # Memoria máxima en escrituras pendientes
+ESCRITOR_UMBRAL_DERRAME = 8 * 1024 * 1024  # Cuerpos mayores se vuelcan a un temporal al momento
+SUBIDA_MAX_EN_MEMORIA = 16 * 1024 * 1024  # Archivos subidos mayores se reciben en un temporal
+
+# Miniaturas de las imágenes subidas (generadas la primera vez que se piden)
+MINIATURAS_DIR = "cache_miniaturas"
+MINIATURAS_TAMAÑOS = (128, 320, 640)  # Lado mayor en píxeles
+MINIATURAS_CALIDAD = 80
+MINIATURAS_MAX_AGE = 365 * 24 * 3600  # Los derivados no cambian nunca
+MINIATURAS_MAX_PENDIENTES = 8  # Imágenes en cola de generación en segundo plano
+
+# Rotación de recomendaciones: pares (sesión, material) recordados como máximo
+RECOMENDACIONES_MAX_ESTADOS = 4096
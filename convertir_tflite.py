@@ -0,0 +1,67 @@
+# convertir_tflite.py - Exportar el modelo Keras a TFLite (float16 e int8)
+# Uso: python convertir_tflite.py [--modo fp16|int8|todos] [--muestras N]
+import os
+import argparse
+
+import numpy as np
+import tensorflow as tf
+from config import UPLOAD_FOLDER, RUTA_MODELO_KERAS
+from almacen_blobs import listar_imagenes
+from preprocesamiento import preprocesar
+
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png")
+
+def dataset_representativo(max_muestras=100):
+    """Generador de imágenes de static/uploads (incluidos los blobs) para calibrar la cuantización int8"""
+    archivos = listar_imagenes(EXTENSIONES_IMAGEN)
+    if not archivos:
+        raise RuntimeError(f"No hay imágenes en {UPLOAD_FOLDER} para el dataset representativo")
+
+    def generador():
+        for archivo in archivos[:max_muestras]:
+            array_imagen = preprocesar(archivo)
+            yield [np.expand_dims(array_imagen, axis=0)]
+
+    return generador
+
+def convertir(modelo, modo, max_muestras=100):
+    """
+    Convertir el modelo a TFLite
+
+    Args:
+        modelo: Modelo Keras cargado
+        modo: "fp16" (pesos float16) o "int8" (cuantización completa con dataset representativo)
+
+    Returns:
+        bytes: Modelo .tflite serializado
+    """
+    convertidor = tf.lite.TFLiteConverter.from_keras_model(modelo)
+    convertidor.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if modo == "fp16":
+        convertidor.target_spec.supported_types = [tf.float16]
+    elif modo == "int8":
+        convertidor.representative_dataset = dataset_representativo(max_muestras)
+        convertidor.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        convertidor.inference_input_type = tf.uint8
+        convertidor.inference_output_type = tf.uint8
+    else:
+        raise ValueError(f"Modo de conversión no soportado: {modo}")
+
+    return convertidor.convert()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportar el modelo Keras a TFLite")
+    parser.add_argument("--modo", choices=["fp16", "int8", "todos"], default="todos")
+    parser.add_argument("--muestras", type=int, default=100, help="Imágenes para calibrar int8")
+    args = parser.parse_args()
+
+    modelo = tf.keras.models.load_model(RUTA_MODELO_KERAS)
+    base = os.path.splitext(RUTA_MODELO_KERAS)[0]
+    modos = ["fp16", "int8"] if args.modo == "todos" else [args.modo]
+
+    for modo in modos:
+        ruta_salida = f"{base}_{modo}.tflite"
+        with open(ruta_salida, "wb") as f:
+            f.write(convertir(modelo, modo, args.muestras))
+        print(f"[TFLITE] {ruta_salida} generado ({os.path.getsize(ruta_salida)/1024/1024:.1f} MB)")
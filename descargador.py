@@ -0,0 +1,111 @@
+# descargador.py - Descarga concurrente de imágenes con conexiones reutilizadas
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import (DESCARGA_TIMEOUT, DESCARGA_MAX_BYTES, DESCARGA_MAX_POR_HOST,
+                    DESCARGA_MAX_CONCURRENTES)
+
+# Firmas de los formatos de imagen aceptados
+FIRMAS_IMAGEN = (
+    b"\xff\xd8\xff",          # JPEG
+    b"\x89PNG\r\n\x1a\n",     # PNG
+    b"GIF87a", b"GIF89a",     # GIF
+    b"BM",                    # BMP
+)
+
+def es_imagen(cabecera: bytes) -> bool:
+    """Comprobar los primeros bytes del contenido (magic bytes)"""
+    if cabecera.startswith(FIRMAS_IMAGEN):
+        return True
+    return cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WEBP"
+
+class ErrorDescarga(Exception):
+    pass
+
+class DescargadorImagenes:
+    def __init__(self, timeout=10, max_bytes=15 * 1024 * 1024, max_por_host=4, max_concurrentes=8):
+        """
+        Inicializar el descargador
+
+        Args:
+            timeout: Segundos de espera de conexión y lectura
+            max_bytes: Tamaño máximo del cuerpo; se corta la descarga al superarlo
+            max_por_host: Descargas simultáneas máximas contra un mismo host
+            max_concurrentes: Conexiones reutilizables por host en el pool HTTP
+        """
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_por_host = max_por_host
+
+        # Sesión HTTP compartida: reutiliza conexiones keep-alive entre peticiones
+        self.sesion = requests.Session()
+        self.sesion.headers.update({"User-Agent": "Mozilla/5.0"})
+        adaptador = HTTPAdapter(pool_connections=max_concurrentes, pool_maxsize=max_concurrentes)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+        # host -> [semáforo, descargas en curso o en espera]; se elimina al quedar sin uso,
+        # así solo hay entradas para los hosts con descargas activas
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _limite_host(self, url):
+        """Limitar las descargas simultáneas contra el host de la URL"""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            entrada = self._semaforos.get(host)
+            if entrada is None:
+                entrada = self._semaforos[host] = [threading.BoundedSemaphore(self.max_por_host), 0]
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._semaforos[host]
+
+    def descargar(self, url: str) -> bytes:
+        """
+        Descargar una imagen
+
+        Returns:
+            bytes: Contenido de la imagen
+
+        Raises:
+            ErrorDescarga: Si la respuesta no es una imagen válida o excede el tamaño máximo
+        """
+        with self._limite_host(url):
+            with self.sesion.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    raise ErrorDescarga(f"Respuesta HTTP {response.status_code}")
+
+                # Descartar antes de leer el cuerpo si el tipo o el tamaño declarado no sirven
+                content_type = response.headers.get("Content-Type", "")
+                if "image" not in content_type:
+                    raise ErrorDescarga(f"El contenido no es una imagen ({content_type or 'sin Content-Type'})")
+                declarado = response.headers.get("Content-Length")
+                if declarado and declarado.isdigit() and int(declarado) > self.max_bytes:
+                    raise ErrorDescarga(f"La imagen supera el tamaño máximo ({self.max_bytes} bytes)")
+
+                partes = []
+                total = 0
+                for parte in response.iter_content(chunk_size=64 * 1024):
+                    if not partes and not es_imagen(parte[:12]):
+                        raise ErrorDescarga("El contenido no tiene formato de imagen reconocido")
+                    total += len(parte)
+                    if total > self.max_bytes:
+                        raise ErrorDescarga(f"La imagen supera el tamaño máximo ({self.max_bytes} bytes)")
+                    partes.append(parte)
+
+        if not partes:
+            raise ErrorDescarga("Respuesta vacía")
+        return b"".join(partes)
+
+descargador = DescargadorImagenes(DESCARGA_TIMEOUT, DESCARGA_MAX_BYTES, DESCARGA_MAX_POR_HOST,
+                                  DESCARGA_MAX_CONCURRENTES)
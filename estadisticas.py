@@ -0,0 +1,220 @@
+# estadisticas.py - Agregados de estadísticas mantenidos de forma incremental
+import threading
+from collections import Counter, deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+def _etiquetas_sesion(session_data: Dict[str, Any]) -> Counter:
+    """Contar materiales de una sesión (formato nuevo, migrado y antiguo)"""
+    etiquetas = Counter()
+    for conversation in session_data.get("conversations", []):
+        etiquetas.update(_etiquetas_conversacion(conversation))
+    for analysis in session_data.get("analyses", []):
+        etiqueta = analysis.get("resultado", {}).get("etiqueta")
+        if etiqueta:
+            etiquetas[etiqueta] += 1
+    return etiquetas
+
+def _etiquetas_conversacion(conversation: Dict[str, Any]) -> Counter:
+    respuestas = conversation.get("bot_responses")
+    if respuestas is None:
+        # Conversación migrada del formato antiguo
+        respuestas = [conversation.get("bot_response", {})]
+    return Counter(r.get("resultado", {}).get("etiqueta") for r in respuestas
+                   if r.get("resultado", {}).get("etiqueta"))
+
+def resumir_sesion(session_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Counter]:
+    """Resumen para la vista de administración y conteo de materiales de una sesión completa"""
+    if 'conversations' in session_data:
+        total_conversations = len(session_data['conversations'])
+    else:
+        total_conversations = len(session_data.get('analyses', []))
+    resumen = {
+        "session_id": session_data.get("session_id"),
+        "created": session_data.get("created"),
+        "last_activity": session_data.get("last_activity"),
+        "total_conversations": total_conversations,
+        "total_analyses": session_data.get("total_images_analyzed", 0),
+        "format": "nuevo" if 'conversations' in session_data else "antiguo"
+    }
+    return resumen, _etiquetas_sesion(session_data)
+
+class EstadisticasAgregadas:
+    def __init__(self):
+        """
+        Estadísticas de sesiones y del historial live actualizadas en cada escritura,
+        para que las consultas no tengan que leer el almacenamiento
+        """
+        self._lock = threading.Lock()
+        self.sesiones = {}  # session_id -> resumen para la vista de administración
+        self._clases_por_sesion = {}  # session_id -> Counter de materiales
+        self.total_analisis_sesiones = 0
+        self.clases_sesiones = Counter()
+        self.total_live = 0
+        self.clases_live = Counter()
+
+    # --- Reconstrucción desde el almacenamiento ---
+
+    def reconstruir_sesiones(self, agregados: Iterable[Tuple[Dict[str, Any], Counter]]):
+        """
+        Reemplazar los agregados de sesiones
+
+        Args:
+            agregados: (resumen, materiales) de cada sesión almacenada, calculados por el
+                backend (ver session_aggregates en sessionStorage.py)
+        """
+        resumenes, clases_por_sesion = {}, {}
+        for resumen, clases in agregados:
+            resumenes[resumen["session_id"]] = resumen
+            clases_por_sesion[resumen["session_id"]] = clases
+
+        with self._lock:
+            self.sesiones = resumenes
+            self._clases_por_sesion = clases_por_sesion
+            self.total_analisis_sesiones = sum(r["total_analyses"] for r in resumenes.values())
+            self.clases_sesiones = sum(clases_por_sesion.values(), Counter())
+
+    def reconstruir_live(self, analisis: Iterable[Dict[str, Any]], total: int = 0,
+                         clases: Optional[Dict[str, int]] = None) -> int:
+        """
+        Recalcular los agregados del historial live
+
+        Args:
+            analisis: Análisis a contar
+            total, clases: Agregados ya conocidos (p. ej. persistidos) a los que se suman
+
+        Returns:
+            int: Total de análisis
+        """
+        clases = Counter(clases or {})
+        for entrada in analisis:
+            total += 1
+            etiqueta = entrada.get("resultado", {}).get("etiqueta")
+            if etiqueta:
+                clases[etiqueta] += 1
+        with self._lock:
+            self.total_live = total
+            self.clases_live = clases
+        return total
+
+    # --- Actualizaciones incrementales ---
+
+    def sesion_creada(self, session_data: Dict[str, Any]):
+        session_id = session_data["session_id"]
+        with self._lock:
+            self.sesiones[session_id] = {
+                "session_id": session_id,
+                "created": session_data.get("created"),
+                "last_activity": session_data.get("last_activity"),
+                "total_conversations": len(session_data.get("conversations", [])),
+                "total_analyses": session_data.get("total_images_analyzed", 0),
+                "format": "nuevo"
+            }
+            self._clases_por_sesion[session_id] = Counter()
+
+    def actividad_sesion(self, session_id: str, last_activity: str):
+        with self._lock:
+            if session_id in self.sesiones:
+                self.sesiones[session_id]["last_activity"] = last_activity
+
+    def conversacion_agregada(self, session_data: Dict[str, Any], conversation: Dict[str, Any]):
+        session_id = session_data["session_id"]
+        etiquetas = _etiquetas_conversacion(conversation)
+        analisis = len(conversation.get("bot_responses", []))
+        with self._lock:
+            resumen = self.sesiones.get(session_id)
+            if resumen is None:
+                return
+            resumen["last_activity"] = session_data.get("last_activity")
+            resumen["total_conversations"] += 1
+            resumen["total_analyses"] += analisis
+            self.total_analisis_sesiones += analisis
+            self._clases_por_sesion[session_id].update(etiquetas)
+            self.clases_sesiones.update(etiquetas)
+
+    def sesiones_eliminadas(self, session_ids: Iterable[str]):
+        with self._lock:
+            for session_id in session_ids:
+                resumen = self.sesiones.pop(session_id, None)
+                if resumen is None:
+                    continue
+                self.total_analisis_sesiones -= resumen["total_analyses"]
+                self.clases_sesiones.subtract(self._clases_por_sesion.pop(session_id, Counter()))
+            self.clases_sesiones = +self.clases_sesiones  # Descartar contadores en cero
+
+    def analisis_live_agregado(self, etiqueta: str):
+        with self._lock:
+            self.total_live += 1
+            self.clases_live[etiqueta] += 1
+
+    def agregados_live(self) -> Tuple[int, Dict[str, int]]:
+        with self._lock:
+            return self.total_live, dict(self.clases_live)
+
+    # --- Consultas ---
+
+    def resumen(self) -> Dict[str, Any]:
+        """Agregados globales (coste constante)"""
+        with self._lock:
+            return {
+                "active_sessions": len(self.sesiones),
+                "total_analyses": self.total_analisis_sesiones,
+                "clases_sesiones": dict(self.clases_sesiones),
+                "total_live": self.total_live,
+                "clases_live": dict(self.clases_live)
+            }
+
+    def detalles_sesiones(self) -> List[Dict[str, Any]]:
+        """Resumen por sesión para la vista de administración (sin acceder a disco)"""
+        with self._lock:
+            return [dict(resumen) for resumen in self.sesiones.values()]
+
+class LatenciasRespuesta:
+    def __init__(self, max_muestras: int = 1000):
+        """
+        Latencias recientes de las peticiones del chat: tiempo hasta el primer
+        resultado y tiempo total, guardadas en una ventana acotada
+        """
+        self._lock = threading.Lock()
+        self._primer_resultado = deque(maxlen=max_muestras)
+        self._total = deque(maxlen=max_muestras)
+        self.peticiones = 0
+        self.imagenes = 0
+
+    def registrar(self, primer_resultado_ms: float, total_ms: float, imagenes: int):
+        with self._lock:
+            self.peticiones += 1
+            self.imagenes += imagenes
+            if primer_resultado_ms is not None:
+                self._primer_resultado.append(primer_resultado_ms)
+            self._total.append(total_ms)
+
+    @staticmethod
+    def _percentiles(muestras: List[float]) -> Dict[str, Any]:
+        if not muestras:
+            return {"muestras": 0}
+        ordenadas = sorted(muestras)
+        def percentil(p):
+            return round(ordenadas[min(len(ordenadas) - 1, int(p * len(ordenadas)))], 1)
+        return {
+            "muestras": len(ordenadas),
+            "media_ms": round(sum(ordenadas) / len(ordenadas), 1),
+            "p50_ms": percentil(0.50),
+            "p95_ms": percentil(0.95),
+            "max_ms": round(ordenadas[-1], 1)
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Percentiles del tiempo hasta el primer resultado y del tiempo total"""
+        with self._lock:
+            primer_resultado, total = list(self._primer_resultado), list(self._total)
+            peticiones, imagenes = self.peticiones, self.imagenes
+        return {
+            "peticiones": peticiones,
+            "imagenes": imagenes,
+            "primer_resultado": self._percentiles(primer_resultado),
+            "total": self._percentiles(total)
+        }
+
+# Instancias únicas del proceso
+estadisticas = EstadisticasAgregadas()
+latencias_chat = LatenciasRespuesta()
@@ -0,0 +1,173 @@
+# eventos_live.py - Emisión de eventos por salas con buffer acotado por cliente
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Formato compacto: nombre corto y lista de campos en orden fijo
+# (static/js/live/socketManager.js usa la misma tabla para decodificar)
+EVENTOS_COMPACTOS = {
+    "inicio_analisis": ("ia", ("job_id",)),
+    "nueva_imagen": ("ni", ("job_id", "url", "etiqueta", "confianza", "miniatura")),
+    "analisis_error": ("ae", ("job_id", "error")),
+}
+
+def compactar(evento: str, datos: Dict[str, Any]):
+    """Convertir un evento al formato compacto (nombre corto y lista de valores)"""
+    if evento not in EVENTOS_COMPACTOS:
+        return evento, datos
+    nombre, campos = EVENTOS_COMPACTOS[evento]
+    valores = [datos.get(campo) for campo in campos]
+    if "confianza" in campos:
+        i = campos.index("confianza")
+        valores[i] = round(valores[i], 4) if valores[i] is not None else None
+    return nombre, valores
+
+class _Cliente:
+    def __init__(self, sid: str, compacto: bool, max_pendientes: int):
+        self.sid = sid
+        self.canales = set()
+        self.compacto = compacto
+        self.pendientes = deque(maxlen=max_pendientes)
+        self.en_vuelo = None  # Momento del último envío sin confirmar
+        self.enviados = 0
+        self.descartados = 0
+
+class EmisorEventos:
+    def __init__(self, socketio, max_pendientes=16, timeout_confirmacion=5.0, intervalo_barrido=1.0):
+        """
+        Cada cliente tiene como mucho un evento sin confirmar y una cola de pendientes
+        acotada; si un cliente lento la llena se descartan sus eventos más antiguos,
+        sin retener al servidor ni a los demás clientes
+
+        Args:
+            socketio: Instancia de SocketIO de la aplicación
+            max_pendientes: Eventos en espera por cliente
+            timeout_confirmacion: Segundos tras los que un envío sin confirmar se da por perdido
+            intervalo_barrido: Segundos entre revisiones de los clientes con eventos
+                retenidos por una confirmación que no llegó
+        """
+        self.socketio = socketio
+        self.max_pendientes = max_pendientes
+        self.timeout_confirmacion = timeout_confirmacion
+        self.intervalo_barrido = intervalo_barrido
+        self._barrido_iniciado = False
+        self._clientes = {}  # sid -> _Cliente
+        self._canales = {}  # canal -> set de sids
+        self._lock = threading.Lock()
+
+    def registrar(self, sid: str, compacto: bool = False):
+        """Registrar un cliente al conectarse (sin canales: solo recibe lo dirigido a su sid)"""
+        with self._lock:
+            self._clientes[sid] = _Cliente(sid, compacto, self.max_pendientes)
+            iniciar_barrido = not self._barrido_iniciado
+            self._barrido_iniciado = True
+        if iniciar_barrido:
+            # Aquí socketio ya está asociado a la aplicación
+            self.socketio.start_background_task(self._barrer)
+
+    def suscribir(self, sid: str, canal: str) -> bool:
+        """Suscribir un cliente registrado a un canal (False si el cliente no existe)"""
+        with self._lock:
+            cliente = self._clientes.get(sid)
+            if cliente is None:
+                return False
+            cliente.canales.add(canal)
+            self._canales.setdefault(canal, set()).add(sid)
+            return True
+
+    def eliminar(self, sid: str):
+        with self._lock:
+            cliente = self._clientes.pop(sid, None)
+            for canal in (cliente.canales if cliente else ()):
+                miembros = self._canales.get(canal, set())
+                miembros.discard(sid)
+                if not miembros:
+                    self._canales.pop(canal, None)
+
+    def emitir(self, evento: str, datos: Dict[str, Any], sid: Optional[str] = None,
+               canal: Optional[str] = None):
+        """
+        Emitir un evento a un cliente y/o a los suscriptores de un canal
+
+        Args:
+            evento: Nombre del evento en formato completo
+            datos: Contenido del evento
+            sid: Cliente destinatario
+            canal: Canal cuyos suscriptores reciben también el evento
+        """
+        listos = []
+        with self._lock:
+            destinos = set(self._canales.get(canal, ())) if canal else set()
+            if sid:
+                if sid not in self._clientes:
+                    # Cliente no registrado (p. ej. conectado antes de arrancar el emisor)
+                    self.socketio.emit(evento, datos, to=sid)
+                else:
+                    destinos.add(sid)
+            for destino in destinos:
+                cliente = self._clientes[destino]
+                mensaje = compactar(evento, datos) if cliente.compacto else (evento, datos)
+                if len(cliente.pendientes) == cliente.pendientes.maxlen:
+                    cliente.descartados += 1  # append descarta el más antiguo
+                cliente.pendientes.append(mensaje)
+                if self._puede_enviar(cliente):
+                    listos.append(self._siguiente(cliente))
+        for destino, mensaje in listos:
+            self._enviar(destino, mensaje)
+
+    def _puede_enviar(self, cliente: _Cliente) -> bool:
+        if cliente.en_vuelo is None:
+            return True
+        if time.time() - cliente.en_vuelo > self.timeout_confirmacion:
+            cliente.en_vuelo = None  # La confirmación no llegó; no bloquear al cliente
+            return True
+        return False
+
+    def _siguiente(self, cliente: _Cliente):
+        """Sacar el siguiente evento y marcarlo en vuelo (llamar con el lock)"""
+        cliente.en_vuelo = time.time()
+        cliente.enviados += 1
+        return cliente.sid, cliente.pendientes.popleft()
+
+    def _enviar(self, sid: str, mensaje):
+        evento, datos = mensaje
+        self.socketio.emit(evento, datos, to=sid, callback=lambda *args: self._confirmado(sid))
+
+    def _confirmado(self, sid: str):
+        """El cliente confirmó el último evento: enviar el siguiente pendiente"""
+        with self._lock:
+            cliente = self._clientes.get(sid)
+            if cliente is None:
+                return
+            cliente.en_vuelo = None
+            if not cliente.pendientes:
+                return
+            destino, mensaje = self._siguiente(cliente)
+        self._enviar(destino, mensaje)
+
+    def _barrer(self):
+        """Reanudar periódicamente los clientes cuya confirmación venció sin nuevos eventos"""
+        while True:
+            self.socketio.sleep(self.intervalo_barrido)
+            listos = []
+            with self._lock:
+                for cliente in self._clientes.values():
+                    if cliente.pendientes and self._puede_enviar(cliente):
+                        listos.append(self._siguiente(cliente))
+            for destino, mensaje in listos:
+                self._enviar(destino, mensaje)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Clientes, suscriptores por canal y eventos pendientes o descartados"""
+        with self._lock:
+            clientes = list(self._clientes.values())
+            return {
+                "clientes": len(clientes),
+                "canales": {canal: len(sids) for canal, sids in self._canales.items()},
+                "compactos": sum(1 for c in clientes if c.compacto),
+                "pendientes": sum(len(c.pendientes) for c in clientes),
+                "max_pendientes_cliente": max((len(c.pendientes) for c in clientes), default=0),
+                "enviados": sum(c.enviados for c in clientes),
+                "descartados": sum(c.descartados for c in clientes)
+            }
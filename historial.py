@@ -1,26 +1,123 @@
-import os, json
-from datetime import datetime
-from config import HISTORIAL_LIVE_FILE
+import os, json, threading, atexit
+from datetime import date, datetime, time
+from config import HISTORIAL_LIVE_FILE, HISTORIAL_LIVE_LOG, HISTORIAL_LIVE_META, HISTORIAL_META_CADA
+from estadisticas import estadisticas
+
+DESCRIPCION_HISTORIAL = "Historial persistente de análisis en vivo - nunca se borra"
+
+_lock = threading.Lock()
+_meta = None  # {"created", "description", "total_images_analyzed"} mantenido en memoria
+_cursor_log = 0  # Bytes del log cubiertos por los agregados en memoria
+_sin_guardar = 0  # Análisis agregados desde la última escritura de los metadatos
+
+def _guardar_meta():
+    """
+    Persistir los agregados junto con la posición del log que cubren (llamar con _lock).
+    Al iniciar solo se lee el log a partir de esa posición
+    """
+    global _sin_guardar
+    total, clases = estadisticas.agregados_live()
+    temporal = HISTORIAL_LIVE_META + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"created": _meta["created"], "description": _meta["description"],
+                   "total_images_analyzed": total, "clases": clases, "log_offset": _cursor_log},
+                  f, indent=2, ensure_ascii=False)
+    os.replace(temporal, HISTORIAL_LIVE_META)
+    _sin_guardar = 0
+
+def _agregados_validos(meta):
+    """
+    Los agregados persistidos valen si su posición cae en un fin de línea del log actual;
+    si no (log reemplazado o truncado) se reconstruye desde el principio
+    """
+    offset = meta.get("log_offset")
+    if not isinstance(offset, int) or "total_images_analyzed" not in meta or "clases" not in meta:
+        return False
+    if offset == 0:
+        return True
+    if offset > os.path.getsize(HISTORIAL_LIVE_LOG):
+        return False
+    with open(HISTORIAL_LIVE_LOG, "rb") as f:
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+def _guardar_meta_al_salir():
+    with _lock:
+        if _meta is not None and _sin_guardar:
+            _guardar_meta()
+
+atexit.register(_guardar_meta_al_salir)
+
+def _migrar_historial_json():
+    """
+    Migración única del archivo JSON completo al log de una línea por análisis. El JSON
+    original se conserva (está versionado); no se vuelve a migrar mientras exista el log
+    """
+    with open(HISTORIAL_LIVE_FILE, "r", encoding="utf-8") as f:
+        historial = json.load(f)
+
+    analisis = historial.get("analyses", [])
+    temporal = HISTORIAL_LIVE_LOG + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        for entrada in analisis:
+            f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+    os.replace(temporal, HISTORIAL_LIVE_LOG)
+
+    print(f"[HISTORIAL LIVE] Migrados {len(analisis)} análisis de {HISTORIAL_LIVE_FILE} a {HISTORIAL_LIVE_LOG}")
+    return historial.get("created", datetime.now().isoformat()), len(analisis)
 
 def inicializar_historial_live():
-    if not os.path.exists(HISTORIAL_LIVE_FILE):
-        historial_data = {
-            "created": datetime.now().isoformat(),
-            "description": "Historial persistente de análisis en vivo - nunca se borra",
-            "total_images_analyzed": 0,
-            "analyses": []
+    global _meta, _cursor_log
+    with _lock:
+        if _meta is not None:
+            return
+
+        creado = None
+        migrado = False
+        if os.path.exists(HISTORIAL_LIVE_FILE) and not os.path.exists(HISTORIAL_LIVE_LOG):
+            creado, _ = _migrar_historial_json()
+            migrado = True
+
+        if not os.path.exists(HISTORIAL_LIVE_LOG):
+            open(HISTORIAL_LIVE_LOG, "a", encoding="utf-8").close()
+            print(f"[HISTORIAL LIVE] Archivo {HISTORIAL_LIVE_LOG} creado")
+        else:
+            print(f"[HISTORIAL LIVE] Archivo {HISTORIAL_LIVE_LOG} ya existe")
+
+        meta = None
+        if os.path.exists(HISTORIAL_LIVE_META):
+            try:
+                with open(HISTORIAL_LIVE_META, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except Exception as e:
+                print(f"[ERROR HISTORIAL LIVE] Metadatos ilegibles, se reconstruyen: {e}")
+
+        if meta and not migrado and _agregados_validos(meta):
+            # Solo se cuentan los análisis escritos después de la última persistencia
+            inicio, total, clases = meta["log_offset"], meta["total_images_analyzed"], meta["clases"]
+        else:
+            if meta is not None:
+                print("[HISTORIAL LIVE] Agregados desactualizados, se reconstruyen desde el log")
+            inicio, total, clases = 0, 0, None
+
+        _cursor_log = inicio
+        def contar():
+            global _cursor_log
+            for analisis, cursor in _leer_log(inicio):
+                _cursor_log = cursor
+                yield analisis
+
+        _meta = {
+            "created": (meta or {}).get("created") or creado or datetime.now().isoformat(),
+            "description": DESCRIPCION_HISTORIAL,
+            "total_images_analyzed": estadisticas.reconstruir_live(contar(), total, clases)
         }
-        with open(HISTORIAL_LIVE_FILE, "w", encoding="utf-8") as f:
-            json.dump(historial_data, f, indent=2, ensure_ascii=False)
-        print(f"[HISTORIAL LIVE] Archivo {HISTORIAL_LIVE_FILE} creado")
-    else:
-        print(f"[HISTORIAL LIVE] Archivo {HISTORIAL_LIVE_FILE} ya existe")
+        _guardar_meta()
 
 def guardar_analisis_live(imagen_info, etiqueta, confianza, recomendacion):
+    global _cursor_log, _sin_guardar
     try:
         inicializar_historial_live()
-        with open(HISTORIAL_LIVE_FILE, "r", encoding="utf-8") as f:
-            historial = json.load(f)
 
         analisis = {
             "timestamp": datetime.now().isoformat(),
@@ -34,12 +131,108 @@ def guardar_analisis_live(imagen_info, etiqueta, confianza, recomendacion):
             "recomendacion": recomendacion
         }
 
-        historial["analyses"].append(analisis)
-        historial["total_images_analyzed"] += 1
-
-        with open(HISTORIAL_LIVE_FILE, "w", encoding="utf-8") as f:
-            json.dump(historial, f, indent=2, ensure_ascii=False)
+        linea = json.dumps(analisis, ensure_ascii=False) + "\n"
+        with _lock:
+            with open(HISTORIAL_LIVE_LOG, "ab") as f:
+                f.write(linea.encode("utf-8"))
+                _cursor_log = f.tell()
+            _meta["total_images_analyzed"] += 1
+            estadisticas.analisis_live_agregado(etiqueta)
+            _sin_guardar += 1
+            if _sin_guardar >= HISTORIAL_META_CADA:
+                _guardar_meta()
 
         print(f"[HISTORIAL LIVE] Guardado análisis: {etiqueta} ({confianza*100:.1f}%)")
     except Exception as e:
         print(f"[ERROR HISTORIAL LIVE] {e}")
+
+def obtener_total_live():
+    """Total de análisis live sin leer el log"""
+    inicializar_historial_live()
+    return _meta["total_images_analyzed"]
+
+def obtener_meta_live():
+    inicializar_historial_live()
+    return dict(_meta)
+
+def iterar_analisis_live_desde(cursor=0):
+    """
+    Recorrer el log desde una posición en bytes
+
+    Args:
+        cursor: Posición en bytes devuelta por una llamada anterior (0 = inicio)
+
+    Returns:
+        Generador de tuplas (analisis, cursor_siguiente)
+    """
+    inicializar_historial_live()
+    return _leer_log(cursor)
+
+def _leer_log(cursor):
+    with open(HISTORIAL_LIVE_LOG, "rb") as f:
+        f.seek(cursor)
+        for linea in f:
+            cursor += len(linea)
+            if not linea.endswith(b"\n"):
+                # Línea todavía en escritura: se leerá en la próxima página
+                cursor -= len(linea)
+                break
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea.decode("utf-8")), cursor
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+
+def iterar_analisis_live():
+    """Recorrer los análisis del log en orden de escritura, uno a uno"""
+    for analisis, _ in iterar_analisis_live_desde(0):
+        yield analisis
+
+def _hora_local(momento):
+    """Los timestamps del historial se guardan en hora local sin zona"""
+    if momento.tzinfo is not None:
+        momento = momento.astimezone().replace(tzinfo=None)
+    return momento
+
+def parsear_limite_fecha(valor, fin_de_dia=False):
+    """
+    Convertir un límite 'desde'/'hasta' ISO 8601 en datetime comparable con el historial
+
+    Args:
+        valor: Fecha u hora ISO 8601; con zona horaria se convierte a hora local
+        fin_de_dia: Una fecha sin hora cubre el día completo (para 'hasta')
+
+    Returns:
+        datetime sin zona horaria, o None si no hay valor
+
+    Raises:
+        ValueError: Formato no válido
+    """
+    if not valor:
+        return None
+    if fin_de_dia and len(valor) == 10:
+        return datetime.combine(date.fromisoformat(valor), time.max)
+    return _hora_local(datetime.fromisoformat(valor))
+
+def coincide_filtros(analisis, desde=None, hasta=None, etiqueta=None):
+    """
+    Comprobar si un análisis cumple los filtros
+
+    Args:
+        desde, hasta: datetime límite (inclusive) sin zona horaria (ver parsear_limite_fecha)
+        etiqueta: Material a filtrar (sin distinguir mayúsculas)
+    """
+    if etiqueta and analisis.get("resultado", {}).get("etiqueta", "").lower() != etiqueta.lower():
+        return False
+    if desde or hasta:
+        try:
+            momento = _hora_local(datetime.fromisoformat(analisis.get("timestamp", "")))
+        except (TypeError, ValueError):
+            return False
+        if desde and momento < desde:
+            return False
+        if hasta and momento > hasta:
+            return False
+    return True
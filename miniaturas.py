@@ -0,0 +1,143 @@
+# miniaturas.py - Miniaturas (JPEG/WebP) de las imágenes del almacén de blobs
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from PIL import Image, features
+from config import MINIATURAS_DIR, MINIATURAS_TAMAÑOS, MINIATURAS_CALIDAD, MINIATURAS_MAX_PENDIENTES
+
+# Formato -> (extensión, mimetype)
+FORMATOS = {
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+VERSION_MINIATURAS = 1  # Cambiar si cambia la forma de generar (invalida los ETag)
+
+class CacheMiniaturas:
+    def __init__(self, directorio: str, tamaños=(128, 320, 640), calidad: int = 80, max_pendientes: int = 8):
+        """
+        Derivados de cada blob a unos pocos tamaños fijos (lado mayor en píxeles),
+        generados la primera vez que se piden y guardados en disco. Como el blob está
+        direccionado por contenido, un derivado nunca cambia y su ETag es fijo
+
+        Args:
+            directorio: Raíz de los derivados (ab/<hash>_<tamaño>.<ext>)
+            tamaños: Tamaños permitidos
+            calidad: Calidad de compresión JPEG/WebP
+            max_pendientes: Imágenes en espera de generar derivados en segundo plano;
+                con la cola llena se omiten (se generarán al pedirlas)
+        """
+        self.directorio = directorio
+        self.tamaños = tuple(sorted(tamaños))
+        self.calidad = calidad
+        self.formatos = [f for f in FORMATOS if f != "webp" or features.check("webp")]
+        self.generados = 0
+        self.desde_decodificacion = 0
+        self.omitidos = 0
+        self.max_pendientes = max_pendientes
+        self._pendientes = 0
+        self._lock_pendientes = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(64)]
+        self._fondo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="miniaturas")
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, hash_hex: str, tamaño: int, formato: str) -> str:
+        extension = FORMATOS[formato][0]
+        return os.path.join(self.directorio, hash_hex[:2], f"{hash_hex}_{tamaño}.{extension}")
+
+    @staticmethod
+    def etag(hash_hex: str, tamaño: int, formato: str) -> str:
+        return f"{hash_hex}-{tamaño}-{formato}-v{VERSION_MINIATURAS}"
+
+    def _lock(self, ruta: str) -> threading.Lock:
+        return self._locks[hash(ruta) % len(self._locks)]
+
+    def _guardar(self, imagen: Image.Image, ruta: str, formato: str):
+        """Codificar y escribir de forma atómica"""
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        imagen.save(temporal, format=formato.upper(), quality=self.calidad)
+        os.replace(temporal, ruta)
+        self.generados += 1
+
+    @staticmethod
+    def _reducir(imagen: Image.Image, tamaño: int) -> Image.Image:
+        miniatura = imagen.copy()
+        miniatura.thumbnail((tamaño, tamaño), Image.LANCZOS)
+        return miniatura
+
+    def obtener(self, hash_hex: str, ruta_original: str, tamaño: int, formato: str) -> str:
+        """
+        Ruta del derivado, generándolo a partir del original si aún no existe
+
+        Raises:
+            ValueError: Tamaño o formato no permitidos
+        """
+        if tamaño not in self.tamaños or formato not in self.formatos:
+            raise ValueError(f"Miniatura no soportada: {tamaño}px {formato}")
+        ruta = self.ruta(hash_hex, tamaño, formato)
+        if os.path.exists(ruta):
+            return ruta
+
+        with self._lock(ruta):
+            if os.path.exists(ruta):  # Generada por otra petición mientras esperábamos
+                return ruta
+            with Image.open(ruta_original) as imagen:
+                # En JPEG, draft decodifica directamente a una escala reducida
+                imagen.draft("RGB", (tamaño, tamaño))
+                imagen = imagen.convert("RGB")
+                self._guardar(self._reducir(imagen, tamaño), ruta, formato)
+        return ruta
+
+    def generar_desde(self, hash_hex: str, imagen: Image.Image):
+        """
+        Aprovechar una imagen ya decodificada (para la inferencia): se copia y los
+        derivados JPEG que caben en su resolución se generan en segundo plano
+        """
+        pendientes = [(tamaño, self.ruta(hash_hex, tamaño, "jpeg")) for tamaño in self.tamaños
+                      if max(imagen.size) >= tamaño]
+        pendientes = [(tamaño, ruta) for tamaño, ruta in pendientes if not os.path.exists(ruta)]
+        if not pendientes:
+            return
+        with self._lock_pendientes:
+            if self._pendientes >= self.max_pendientes:
+                self.omitidos += 1
+                return
+            self._pendientes += 1
+        # Lo que queda en cola es una reducción entera rápida (a no menos del doble del
+        # mayor derivado), no el mapa de bits completo: en PNG draft() no reduce nada
+        factor = max(1, max(imagen.size) // (2 * pendientes[-1][0]))
+        reducida = imagen.reduce(factor) if factor > 1 else imagen.copy()
+        self._fondo.submit(self._generar_pendientes, reducida, pendientes)
+
+    def _generar_pendientes(self, imagen: Image.Image, pendientes):
+        try:
+            self._generar(imagen, pendientes)
+        finally:
+            with self._lock_pendientes:
+                self._pendientes -= 1
+
+    def _generar(self, imagen: Image.Image, pendientes):
+        for tamaño, ruta in pendientes:
+            try:
+                with self._lock(ruta):
+                    if not os.path.exists(ruta):
+                        self._guardar(self._reducir(imagen, tamaño), ruta, "jpeg")
+                        self.desde_decodificacion += 1
+            except Exception as e:
+                print(f"[MINIATURAS ERROR] Error al guardar {ruta}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "tamaños": list(self.tamaños),
+            "formatos": self.formatos,
+            "generados": self.generados,
+            "desde_decodificacion": self.desde_decodificacion,
+            "pendientes": self._pendientes,
+            "omitidos": self.omitidos
+        }
+
+cache_miniaturas = CacheMiniaturas(MINIATURAS_DIR, MINIATURAS_TAMAÑOS, MINIATURAS_CALIDAD,
+                                   MINIATURAS_MAX_PENDIENTES)
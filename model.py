@@ -1,22 +1,433 @@
-import tensorflow as tf
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from io import BytesIO
+
 import numpy as np
-from keras.utils import load_img, img_to_array
-from config import TAMAÑO_IMAGEN, CLASES
+from config import (TAMAÑO_IMAGEN, CLASES, MICROBATCH_ACTIVO,
+                    MICROBATCH_MAX_LOTE, MICROBATCH_MAX_ESPERA_MS, MODO_INFERENCIA,
+                    BACKEND_MODELO, RUTA_MODELO_KERAS, RUTA_MODELO_TFLITE, TFLITE_NUM_HILOS,
+                    CACHE_PREDICCIONES_ACTIVO, CACHE_PREDICCIONES_MAX_ENTRADAS,
+                    CACHE_PREDICCIONES_TTL_SEGUNDOS, CACHE_PREDICCIONES_DISCO,
+                    CACHE_PREDICCIONES_DISCO_MAX_FILAS, CACHE_PREDICCIONES_INTERVALO_ESCRITURA,
+                    POOL_PROCESOS, POOL_HILOS_POR_PROCESO, POOL_FIJAR_CPUS)
+from cache_predicciones import CachePredicciones
+from preprocesamiento import preprocesar, preprocesar_lote
+from concurrencia import ejecutar_bloqueante
 
-# Cargar modelo una sola vez
-modelo = tf.keras.models.load_model("mobilenet_practica_5clases.h5")
+# TensorFlow no se importa aquí: importarlo y cargar el modelo cuesta segundos y cientos
+# de MB, y solo lo necesitan los procesos que clasifican (ver ModeloPerezoso)
+def cargar_modelo_keras():
+    import tensorflow as tf
+    return tf.keras.models.load_model(RUTA_MODELO_KERAS)
 
-def predecir_imagen(ruta_imagen=None, imagen_bytes=None):
-    if ruta_imagen:
-        imagen = load_img(ruta_imagen, target_size=TAMAÑO_IMAGEN)
-    else:
-        imagen = load_img(imagen_bytes, target_size=TAMAÑO_IMAGEN)
+class _InterpreteLote:
+    """Intérprete TFLite reservado una sola vez para un tamaño de lote fijo"""
+
+    def __init__(self, ruta_modelo, num_hilos, tamaño_lote):
+        import tensorflow as tf
+        self.tamaño_lote = tamaño_lote
+        self.interprete = tf.lite.Interpreter(model_path=ruta_modelo, num_threads=num_hilos)
+        entrada = self.interprete.get_input_details()[0]
+        if entrada["shape"][0] != tamaño_lote:
+            self.interprete.resize_tensor_input(entrada["index"], [tamaño_lote, *entrada["shape"][1:]])
+        self.interprete.allocate_tensors()
+        self.entrada = self.interprete.get_input_details()[0]
+        self.salida = self.interprete.get_output_details()[0]
+        self.lock = threading.Lock()  # El intérprete no es seguro entre hilos
+
+class EjecutorTFLite:
+    def __init__(self, ruta_modelo, num_hilos=None, max_lote=32):
+        """
+        Ejecutar un modelo convertido con el intérprete de TFLite
+
+        Cambiar el tamaño de entrada obliga a reservar de nuevo los tensores, y con el
+        micro-batching casi cada lote tiene un tamaño distinto. Por eso hay un intérprete
+        por potencia de dos (1, 2, 4, ... max_lote), creado la primera vez que se usa, y
+        cada lote se rellena con ceros hasta la potencia siguiente
+
+        Args:
+            ruta_modelo: Archivo .tflite (float16 o int8)
+            num_hilos: Hilos de cada intérprete (None = valor por defecto de TFLite)
+            max_lote: Lote máximo; los mayores se dividen
+        """
+        self.ruta_modelo = ruta_modelo
+        self.num_hilos = num_hilos
+        self.max_lote = max_lote
+        self._interpretes = {}  # tamaño de lote -> _InterpreteLote
+        self._lock = threading.Lock()
+
+    def _interprete(self, n):
+        tamaño = min(1 << (n - 1).bit_length(), self.max_lote)
+        with self._lock:
+            interprete = self._interpretes.get(tamaño)
+            if interprete is None:
+                interprete = self._interpretes[tamaño] = _InterpreteLote(self.ruta_modelo, self.num_hilos, tamaño)
+            return interprete
+
+    def __call__(self, lote):
+        n = lote.shape[0]
+        if n > self.max_lote:
+            return np.concatenate([self(lote[i:i + self.max_lote]) for i in range(0, n, self.max_lote)])
+
+        interprete = self._interprete(n)
+        entrada, salida_info = interprete.entrada, interprete.salida
+        # Modelos int8 con entrada cuantizada
+        if entrada["dtype"] != np.float32:
+            escala, punto_cero = entrada["quantization"]
+            lote = np.round(lote / escala + punto_cero).astype(entrada["dtype"])
+        if n < interprete.tamaño_lote:
+            relleno = np.zeros((interprete.tamaño_lote - n, *lote.shape[1:]), dtype=lote.dtype)
+            lote = np.concatenate([lote, relleno])
+
+        with interprete.lock:
+            interprete.interprete.set_tensor(entrada["index"], lote)
+            interprete.interprete.invoke()
+            salida = interprete.interprete.get_tensor(salida_info["index"])[:n]
+
+        if salida_info["dtype"] != np.float32:
+            escala, punto_cero = salida_info["quantization"]
+            salida = (salida.astype(np.float32) - punto_cero) * escala
+        return salida.copy()
+
+    def get_stats(self):
+        return {"lotes_reservados": sorted(self._interpretes)}
+
+def crear_ejecutor(modo, modelo):
+    """
+    Construir la función que ejecuta el modelo sobre un lote float32 (N, 224, 224, 3)
+
+    Args:
+        modo: "predict", "directo" o "tf_function"
+        modelo: Modelo Keras cargado (ver cargar_modelo_keras())
+
+    Returns:
+        Función que recibe un np.ndarray y devuelve las probabilidades como np.ndarray
+    """
+    if modo == "predict":
+        # Ruta original: crea el adaptador de datos y callbacks en cada llamada
+        return lambda lote: modelo.predict(lote, verbose=0)
+
+    if modo == "directo":
+        return lambda lote: modelo(lote, training=False).numpy()
+
+    if modo == "tf_function":
+        import tensorflow as tf
+        firma = [tf.TensorSpec(shape=(None, *TAMAÑO_IMAGEN, 3), dtype=tf.float32)]
+
+        @tf.function(input_signature=firma)
+        def inferir(lote):
+            return modelo(lote, training=False)
+
+        return lambda lote: inferir(tf.convert_to_tensor(lote, dtype=tf.float32)).numpy()
+
+    raise ValueError(f"Modo de inferencia no soportado: {modo}")
+
+def _crear_backend():
+    """Construir el ejecutor del backend configurado y su descripción"""
+    if POOL_PROCESOS:
+        from pool_inferencia import PoolInferenciaProcesos
+        ejecutor = PoolInferenciaProcesos(POOL_PROCESOS, POOL_HILOS_POR_PROCESO, MICROBATCH_MAX_LOTE, POOL_FIJAR_CPUS)
+        return ejecutor, f"{BACKEND_MODELO} en {POOL_PROCESOS} procesos"
+    if BACKEND_MODELO == "tflite":
+        ejecutor = EjecutorTFLite(RUTA_MODELO_TFLITE, TFLITE_NUM_HILOS, MICROBATCH_MAX_LOTE)
+        return ejecutor, f"tflite ({RUTA_MODELO_TFLITE})"
+    if BACKEND_MODELO == "keras":
+        return crear_ejecutor(MODO_INFERENCIA, cargar_modelo_keras()), f"keras ({MODO_INFERENCIA})"
+    raise ValueError(f"Backend de modelo no soportado: {BACKEND_MODELO}")
+
+class ModeloPerezoso:
+    def __init__(self):
+        """
+        Cargar el backend del modelo la primera vez que se necesita (o en segundo plano
+        con calentar_en_segundo_plano()) y ejecutar un lote de prueba antes de darlo por
+        listo, para que la primera petición real no pague el trazado del grafo
+        """
+        self.estado = "sin_cargar"  # sin_cargar / cargando / listo / error
+        self.descripcion = None
+        self.error = None
+        self.tiempo_carga_ms = None
+        self.tiempo_calentamiento_ms = None
+        self._ejecutor = None
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        """
+        Devolver el ejecutor, cargándolo y calentándolo si aún no lo está; las
+        llamadas concurrentes esperan a la misma carga
+
+        Returns:
+            Función que recibe un lote float32 y devuelve las probabilidades
+        """
+        if self._ejecutor is not None:
+            return self._ejecutor
+        with self._lock:
+            if self._ejecutor is not None:
+                return self._ejecutor
+            self.estado = "cargando"
+            try:
+                # La carga y el lote de prueba bloquean: fuera del bucle de eventos
+                inicio = time.perf_counter()
+                ejecutor, self.descripcion = ejecutar_bloqueante(_crear_backend)
+                self.tiempo_carga_ms = (time.perf_counter() - inicio) * 1000
+                inicio = time.perf_counter()
+                ejecutar_bloqueante(ejecutor, np.zeros((1, *TAMAÑO_IMAGEN, 3), dtype=np.float32))
+                self.tiempo_calentamiento_ms = (time.perf_counter() - inicio) * 1000
+            except Exception as e:
+                self.estado = "error"
+                self.error = str(e)
+                print(f"[IA ERROR] No se pudo cargar el modelo: {e}")
+                raise
+            self._ejecutor = ejecutor
+            self.estado = "listo"
+            self.error = None
+            print(f"[IA] Modelo cargado con backend {self.descripcion} "
+                  f"({self.tiempo_carga_ms:.0f}ms, calentado en {self.tiempo_calentamiento_ms:.0f}ms)")
+            return ejecutor
+
+    def calentar_en_segundo_plano(self):
+        """Iniciar la carga sin bloquear el arranque del servidor"""
+        def calentar():
+            try:
+                self.cargar()
+            except Exception:
+                pass  # Ya registrado; la siguiente petición lo reintentará
+        threading.Thread(target=calentar, name="carga-modelo", daemon=True).start()
+
+    def listo(self) -> bool:
+        return self._ejecutor is not None
+
+    def __call__(self, lote):
+        return self.cargar()(lote)
+
+    def get_stats(self):
+        """Estado de la carga, tiempos y estadísticas del ejecutor (pool de procesos o intérpretes TFLite)"""
+        stats = {
+            "estado": self.estado,
+            "backend": self.descripcion,
+            "tiempo_carga_ms": round(self.tiempo_carga_ms, 1) if self.tiempo_carga_ms is not None else None,
+            "tiempo_calentamiento_ms": round(self.tiempo_calentamiento_ms, 1) if self.tiempo_calentamiento_ms is not None else None,
+            "error": self.error
+        }
+        if hasattr(self._ejecutor, "get_stats"):
+            stats["ejecutor"] = self._ejecutor.get_stats()
+        return stats
+
+ejecutar_modelo = ModeloPerezoso()
+
+def _version_modelo():
+    """Identificador del modelo configurado; cambia si se reemplaza el archivo"""
+    ruta = RUTA_MODELO_TFLITE if BACKEND_MODELO == "tflite" else RUTA_MODELO_KERAS
+    try:
+        modificado = int(os.path.getmtime(ruta))
+    except OSError:
+        # Sin archivo el import no debe fallar: la carga perezosa informará del error (ver /ready)
+        modificado = "sin_archivo"
+    return f"{BACKEND_MODELO}:{os.path.basename(ruta)}:{modificado}"
 
-    array_imagen = img_to_array(imagen)
-    array_imagen = np.expand_dims(array_imagen, axis=0) / 255.0
-    prediccion = modelo.predict(array_imagen)
-    id_clase = np.argmax(prediccion)
+VERSION_MODELO = _version_modelo()
+
+def _leer_bytes(fuente):
+    """Obtener los bytes de una ruta de archivo o de un buffer"""
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, "rb") as f:
+            return f.read()
+    if isinstance(fuente, (bytes, bytearray)):
+        return bytes(fuente)
+    if isinstance(fuente, BytesIO):
+        return fuente.getvalue()
+    fuente.seek(0)
+    return fuente.read()
+
+def _interpretar(prediccion):
+    id_clase = int(np.argmax(prediccion))
     etiqueta = CLASES[id_clase]
-    confianza = prediccion[0][id_clase]
+    confianza = prediccion[id_clase]
     print(f"[IA] Predicción: {etiqueta} ({confianza*100:.1f}%)")
     return etiqueta, confianza
+
+class ServidorInferencia:
+    def __init__(self, max_lote=32, max_espera_ms=5, num_hilos=1):
+        """
+        Agrupar imágenes de peticiones concurrentes en un solo lote del modelo
+
+        Args:
+            max_lote: Número máximo de imágenes por pasada del modelo
+            max_espera_ms: Tiempo máximo que espera el primer elemento a que se llene el lote
+            num_hilos: Lotes en ejecución a la vez (uno por proceso del pool de inferencia)
+        """
+        self.max_lote = max_lote
+        self.num_hilos = num_hilos
+        self.max_espera = max_espera_ms / 1000.0
+        self.cola = queue.Queue()
+        self.histograma_lotes = Counter()
+        self.lotes_procesados = 0
+        self.imagenes_procesadas = 0
+        self._lock = threading.Lock()
+        self._hilos = []
+
+    def iniciar(self):
+        """Iniciar los hilos de inferencia si aún no están corriendo"""
+        with self._lock:
+            self._hilos = [hilo for hilo in self._hilos if hilo.is_alive()]
+            if len(self._hilos) < self.num_hilos:
+                while len(self._hilos) < self.num_hilos:
+                    hilo = threading.Thread(target=self._worker, daemon=True)
+                    hilo.start()
+                    self._hilos.append(hilo)
+                print(f"[IA] Servidor de inferencia iniciado - Lote máx: {self.max_lote}, Espera máx: {self.max_espera*1000:.0f}ms, Hilos: {self.num_hilos}")
+
+    def enviar(self, array_imagen) -> Future:
+        """Encolar una imagen preprocesada y devolver un Future con (etiqueta, confianza)"""
+        self.iniciar()
+        futuro = Future()
+        self.cola.put((array_imagen, futuro))
+        return futuro
+
+    def _worker(self):
+        while True:
+            lote = [self.cola.get()]
+            limite = time.monotonic() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self.cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._procesar_lote(lote)
+
+    def _procesar_lote(self, lote):
+        try:
+            predicciones = ejecutar_bloqueante(ejecutar_modelo.cargar(), np.stack([array for array, _ in lote]))
+        except Exception as e:
+            print(f"[IA ERROR] Error en lote de {len(lote)} imágenes: {e}")
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+
+        for (_, futuro), prediccion in zip(lote, predicciones):
+            futuro.set_result(_interpretar(prediccion))
+
+        with self._lock:
+            self.histograma_lotes[len(lote)] += 1
+            self.lotes_procesados += 1
+            self.imagenes_procesadas += len(lote)
+
+    def get_stats(self):
+        """Profundidad de cola e histograma de tamaños de lote"""
+        with self._lock:
+            return {
+                "cola_pendiente": self.cola.qsize(),
+                "lotes_procesados": self.lotes_procesados,
+                "imagenes_procesadas": self.imagenes_procesadas,
+                "histograma_lotes": {str(k): v for k, v in sorted(self.histograma_lotes.items())},
+                "max_lote": self.max_lote,
+                "max_espera_ms": self.max_espera * 1000,
+                "hilos": self.num_hilos
+            }
+
+servidor_inferencia = ServidorInferencia(MICROBATCH_MAX_LOTE, MICROBATCH_MAX_ESPERA_MS, max(1, POOL_PROCESOS))
+
+cache_predicciones = CachePredicciones(
+    VERSION_MODELO,
+    max_entradas=CACHE_PREDICCIONES_MAX_ENTRADAS,
+    ttl_segundos=CACHE_PREDICCIONES_TTL_SEGUNDOS,
+    ruta_disco=CACHE_PREDICCIONES_DISCO,
+    max_filas_disco=CACHE_PREDICCIONES_DISCO_MAX_FILAS,
+    intervalo_escritura=CACHE_PREDICCIONES_INTERVALO_ESCRITURA
+) if CACHE_PREDICCIONES_ACTIVO else None
+
+def predecir_imagenes(fuentes):
+    """
+    Predecir varias imágenes con una sola pasada del modelo
+
+    Args:
+        fuentes: Lista de rutas de archivo, bytes o buffers (BytesIO) con imágenes
+
+    Returns:
+        Lista de tuplas (etiqueta, confianza) en el mismo orden que las fuentes
+    """
+    if not fuentes:
+        return []
+
+    if cache_predicciones is None:
+        return _inferir(fuentes)
+
+    # Consultar el cache antes de ejecutar el modelo
+    resultados = [None] * len(fuentes)
+    pendientes = []  # (posición, clave, bytes)
+    for i, fuente in enumerate(fuentes):
+        imagen_bytes = _leer_bytes(fuente)
+        clave = cache_predicciones.calcular_clave(imagen_bytes)
+        en_cache = cache_predicciones.obtener(clave)
+        if en_cache is not None:
+            print(f"[IA] Predicción desde cache: {en_cache[0]} ({en_cache[1]*100:.1f}%)")
+            resultados[i] = en_cache
+        else:
+            pendientes.append((i, clave, imagen_bytes))
+
+    if pendientes:
+        bytes_pendientes = [imagen_bytes for _, _, imagen_bytes in pendientes]
+        for (i, clave, _), (etiqueta, confianza) in zip(pendientes, _inferir(bytes_pendientes)):
+            cache_predicciones.guardar(clave, etiqueta, confianza)
+            resultados[i] = (etiqueta, confianza)
+
+    return resultados
+
+def _inferir(fuentes):
+    if MICROBATCH_ACTIVO:
+        # Las imágenes se agrupan con las de otras peticiones concurrentes
+        futuros = [servidor_inferencia.enviar(ejecutar_bloqueante(preprocesar, fuente)) for fuente in fuentes]
+        return [futuro.result() for futuro in futuros]
+
+    ejecutor = ejecutar_modelo.cargar()
+    predicciones = ejecutar_bloqueante(lambda: ejecutor(preprocesar_lote(fuentes)))
+    return [_interpretar(prediccion) for prediccion in predicciones]
+
+def predecir_async(imagen_bytes, al_decodificar=None) -> Future:
+    """
+    Iniciar la predicción de una imagen sin esperar el resultado: consulta el cache,
+    preprocesa en el hilo que llama y encola la imagen en el servidor de inferencia
+
+    Args:
+        imagen_bytes: Contenido de la imagen
+        al_decodificar: Ver preprocesar() (no se llama si la predicción está en cache)
+
+    Returns:
+        Future con (etiqueta, confianza)
+    """
+    clave = None
+    if cache_predicciones is not None:
+        clave = cache_predicciones.calcular_clave(imagen_bytes)
+        en_cache = cache_predicciones.obtener(clave)
+        if en_cache is not None:
+            print(f"[IA] Predicción desde cache: {en_cache[0]} ({en_cache[1]*100:.1f}%)")
+            futuro = Future()
+            futuro.set_result(en_cache)
+            return futuro
+
+    array = ejecutar_bloqueante(preprocesar, imagen_bytes, al_decodificar=al_decodificar)
+    if MICROBATCH_ACTIVO:
+        futuro = servidor_inferencia.enviar(array)
+    else:
+        futuro = Future()
+        try:
+            futuro.set_result(_interpretar(ejecutar_bloqueante(ejecutar_modelo.cargar(), array[np.newaxis])[0]))
+        except Exception as e:
+            futuro.set_exception(e)
+
+    if clave is not None:
+        def guardar_en_cache(f):
+            if f.exception() is None:
+                cache_predicciones.guardar(clave, *f.result())
+        futuro.add_done_callback(guardar_en_cache)
+    return futuro
+
+def predecir_imagen(ruta_imagen=None, imagen_bytes=None):
+    fuente = ruta_imagen if ruta_imagen else imagen_bytes
+    return predecir_imagenes([fuente])[0]
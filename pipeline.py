@@ -0,0 +1,73 @@
+# pipeline.py - Procesamiento por etapas de las imágenes de un mensaje
+from concurrent.futures import Future, ThreadPoolExecutor
+from model import predecir_async
+from config import PIPELINE_HILOS_IO, PIPELINE_HILOS_DECODIFICACION, PIPELINE_MAX_EN_VUELO
+
+def _propagar(origen: Future, destino: Future):
+    error = origen.exception()
+    if error is not None:
+        destino.set_exception(error)
+    else:
+        destino.set_result(origen.result())
+
+class PipelineImagenes:
+    def __init__(self, hilos_io=8, hilos_decodificacion=2, max_en_vuelo=8):
+        """
+        Etapas: obtener (descarga/lectura y guardado) -> decodificar y preprocesar -> inferencia
+        por lotes. Cada etapa corre en su propio pool, así la E/S de la imagen N+1 se solapa
+        con la inferencia de la imagen N
+
+        Args:
+            hilos_io: Hilos para descargas, lecturas y escrituras a disco
+            hilos_decodificacion: Hilos para decodificar y preprocesar
+            max_en_vuelo: Imágenes de una misma petición procesándose a la vez
+        """
+        self.max_en_vuelo = max_en_vuelo
+        self._io = ThreadPoolExecutor(max_workers=hilos_io, thread_name_prefix="pipeline-io")
+        self._decodificacion = ThreadPoolExecutor(max_workers=hilos_decodificacion, thread_name_prefix="pipeline-decode")
+
+    def _iniciar(self, obtener, al_decodificar=None) -> Future:
+        final = Future()
+
+        def decodificar(futuro_io):
+            try:
+                futuro_ia = predecir_async(futuro_io.result(), al_decodificar)
+            except Exception as e:
+                final.set_exception(e)
+                return
+            futuro_ia.add_done_callback(lambda f: _propagar(f, final))
+
+        futuro_io = self._io.submit(obtener)
+        futuro_io.add_done_callback(lambda f: self._decodificacion.submit(decodificar, f))
+        return final
+
+    def procesar(self, obtenedores, al_decodificar=None):
+        """
+        Procesar las imágenes de una petición
+
+        Args:
+            obtenedores: Funciones sin argumentos que devuelven los bytes de cada imagen
+            al_decodificar: Funciones (una por imagen) que reciben la imagen decodificada
+                para reutilizarla; ver preprocesar()
+
+        Yields:
+            (etiqueta, confianza) o la excepción producida, en el orden de entrada y en cuanto
+            cada resultado está listo (como mucho max_en_vuelo imágenes en curso)
+        """
+        obtenedores = list(obtenedores)
+        al_decodificar = list(al_decodificar) if al_decodificar is not None else [None] * len(obtenedores)
+        en_curso = [self._iniciar(obtener, funcion) for obtener, funcion
+                    in zip(obtenedores[:self.max_en_vuelo], al_decodificar)]
+        siguiente = len(en_curso)
+
+        for i in range(len(obtenedores)):
+            futuro = en_curso[i]
+            try:
+                yield futuro.result()
+            except Exception as e:
+                yield e
+            if siguiente < len(obtenedores):
+                en_curso.append(self._iniciar(obtenedores[siguiente], al_decodificar[siguiente]))
+                siguiente += 1
+
+pipeline = PipelineImagenes(PIPELINE_HILOS_IO, PIPELINE_HILOS_DECODIFICACION, PIPELINE_MAX_EN_VUELO)
@@ -0,0 +1,236 @@
+# pool_inferencia.py - Inferencia en varios procesos con lotes en memoria compartida
+#
+# Cada trabajador es un proceso aparte (este mismo archivo con --trabajador) que carga
+# el modelo una vez. El proceso web escribe el lote en un bloque de memoria compartida
+# del trabajador, le envía por stdin el número de imágenes y lee las probabilidades del
+# bloque de salida: los arrays nunca se serializan.
+import atexit
+import importlib
+import os
+import queue
+import subprocess
+import sys
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from config import TAMAÑO_IMAGEN, CLASES
+
+FORMA_IMAGEN = (*TAMAÑO_IMAGEN, 3)
+
+class TrabajadorCaido(RuntimeError):
+    pass
+
+class _Trabajador:
+    def __init__(self, indice: int, max_lote: int, hilos: int, cpus: List[int], modulo_modelo: str = "model"):
+        self.indice = indice
+        self.max_lote = max_lote
+        self.hilos = hilos
+        self.cpus = cpus
+        self.modulo_modelo = modulo_modelo
+        self.lotes = 0
+        self.imagenes = 0
+        self.shm_entrada = shared_memory.SharedMemory(
+            create=True, size=int(np.prod((max_lote, *FORMA_IMAGEN))) * 4)
+        self.shm_salida = shared_memory.SharedMemory(create=True, size=max_lote * len(CLASES) * 4)
+        self.entrada = np.ndarray((max_lote, *FORMA_IMAGEN), dtype=np.float32, buffer=self.shm_entrada.buf)
+        self.salida = np.ndarray((max_lote, len(CLASES)), dtype=np.float32, buffer=self.shm_salida.buf)
+
+        entorno = {
+            **os.environ,
+            "POOL_PROCESOS": "0",  # El trabajador ejecuta el modelo en su propio proceso
+            "MODO_SERVIDOR": "desarrollo",
+            "TF_NUM_INTRAOP_THREADS": str(hilos),
+            "TF_NUM_INTEROP_THREADS": "1",
+            "OMP_NUM_THREADS": str(hilos),
+        }
+        self.proceso = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--trabajador", self.shm_entrada.name,
+             self.shm_salida.name, str(max_lote), str(hilos), ",".join(map(str, cpus)), modulo_modelo],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=entorno, text=True, bufsize=1
+        )
+
+    def esperar_listo(self):
+        respuesta = self.proceso.stdout.readline().strip()
+        if respuesta != "listo":
+            raise RuntimeError(f"El trabajador {self.indice} no pudo cargar el modelo ({respuesta or 'terminó'})")
+
+    def ejecutar(self, lote: np.ndarray) -> np.ndarray:
+        n = lote.shape[0]
+        self.entrada[:n] = lote
+        try:
+            self.proceso.stdin.write(f"{n}\n")
+            self.proceso.stdin.flush()
+            respuesta = self.proceso.stdout.readline().strip()
+        except OSError:  # Tubería rota: el proceso ya no existe
+            respuesta = ""
+        if not respuesta:
+            raise TrabajadorCaido(f"El trabajador {self.indice} terminó (código {self.proceso.poll()})")
+        if respuesta != "ok":
+            raise RuntimeError(f"Error en el trabajador {self.indice}: {respuesta or 'terminó'}")
+        self.lotes += 1
+        self.imagenes += n
+        return self.salida[:n].copy()
+
+    def cerrar(self):
+        if self.proceso.poll() is None:
+            try:
+                self.proceso.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proceso.kill()
+        for shm in (self.shm_entrada, self.shm_salida):
+            shm.close()
+            shm.unlink()
+
+class PoolInferenciaProcesos:
+    def __init__(self, num_procesos: int, hilos_por_proceso: Optional[int] = None,
+                 max_lote: int = 32, fijar_cpus: bool = True, modulo_modelo: str = "model"):
+        """
+        Arrancar los procesos trabajadores y esperar a que carguen el modelo
+
+        Args:
+            num_procesos: Procesos trabajadores (cada uno con su copia del modelo)
+            hilos_por_proceso: Hilos de TF por proceso (None = núcleos / procesos)
+            max_lote: Imágenes máximas por llamada a un trabajador; lotes mayores se dividen
+            fijar_cpus: Fijar cada trabajador a su propio grupo de núcleos (solo Linux)
+            modulo_modelo: Módulo cuyo ejecutar_modelo carga cada trabajador
+        """
+        nucleos = os.cpu_count() or 1
+        self.num_procesos = num_procesos
+        self.hilos_por_proceso = hilos_por_proceso or max(1, nucleos // num_procesos)
+        self.max_lote = max_lote
+        self.reinicios = 0
+        self._libres = queue.Queue()  # Trabajadores libres; None avisa de que no queda ninguno
+        self._trabajadores = []
+        self._lock = threading.Lock()  # Protege _trabajadores frente a reinicios concurrentes
+
+        for i in range(num_procesos):
+            cpus = []
+            if fijar_cpus and hasattr(os, "sched_setaffinity"):
+                cpus = [(i * self.hilos_por_proceso + j) % nucleos for j in range(self.hilos_por_proceso)]
+            self._trabajadores.append(_Trabajador(i, max_lote, self.hilos_por_proceso, cpus, modulo_modelo))
+        atexit.register(self.cerrar)
+
+        for trabajador in self._trabajadores:
+            trabajador.esperar_listo()
+            self._libres.put(trabajador)
+        print(f"[IA] Pool de inferencia iniciado - {num_procesos} procesos x {self.hilos_por_proceso} hilos")
+
+    def __call__(self, lote: np.ndarray) -> np.ndarray:
+        """Ejecutar el modelo sobre un lote float32 en el primer trabajador libre"""
+        if lote.shape[0] > self.max_lote:
+            return np.concatenate([self(lote[i:i + self.max_lote])
+                                   for i in range(0, lote.shape[0], self.max_lote)])
+        with self._lock:
+            if not self._trabajadores:
+                raise RuntimeError("El pool de inferencia no tiene trabajadores")
+        trabajador = self._libres.get()
+        if trabajador is None:
+            # Se retiró el último trabajador mientras esperábamos: propagar el aviso al resto
+            self._libres.put(None)
+            raise RuntimeError("El pool de inferencia no tiene trabajadores")
+        try:
+            return trabajador.ejecutar(lote)
+        except TrabajadorCaido as e:
+            # Reemplazar el proceso y repetir el lote una vez en el nuevo
+            print(f"[IA ERROR] {e}; reiniciando")
+            trabajador = self._reemplazar(trabajador)
+            if trabajador is None:
+                raise
+            return trabajador.ejecutar(lote)
+        finally:
+            if trabajador is not None:
+                self._libres.put(trabajador)
+
+    def _reemplazar(self, caido: _Trabajador) -> Optional[_Trabajador]:
+        """Arrancar un proceso nuevo en lugar de uno caído (None si tampoco arranca)"""
+        caido.cerrar()
+        try:
+            nuevo = _Trabajador(caido.indice, caido.max_lote, caido.hilos, caido.cpus, caido.modulo_modelo)
+            nuevo.esperar_listo()
+        except Exception as e:
+            # Sacarlo de la rotación: los demás trabajadores siguen atendiendo
+            print(f"[IA ERROR] No se pudo reiniciar el trabajador {caido.indice}: {e}")
+            with self._lock:
+                self._trabajadores.remove(caido)
+                if not self._trabajadores:
+                    self._libres.put(None)  # Despertar a quien espera un trabajador libre
+            return None
+        with self._lock:
+            self._trabajadores[self._trabajadores.index(caido)] = nuevo
+            self.reinicios += 1
+        return nuevo
+
+    def cerrar(self):
+        with self._lock:
+            trabajadores, self._trabajadores = self._trabajadores, []
+        for trabajador in trabajadores:
+            trabajador.cerrar()
+        if trabajadores:
+            self._libres.put(None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lotes e imágenes procesados por cada trabajador"""
+        with self._lock:
+            trabajadores = list(self._trabajadores)
+        return {
+            "procesos": self.num_procesos,
+            "hilos_por_proceso": self.hilos_por_proceso,
+            "libres": self._libres.qsize(),
+            "reinicios": self.reinicios,
+            "trabajadores": [
+                {"indice": t.indice, "pid": t.proceso.pid, "cpus": t.cpus, "lotes": t.lotes, "imagenes": t.imagenes}
+                for t in trabajadores
+            ]
+        }
+
+def _trabajador(nombre_entrada: str, nombre_salida: str, max_lote: int, hilos: int, cpus: str,
+                modulo_modelo: str):
+    """Bucle del proceso trabajador: stdin recibe el tamaño del lote, stdout confirma"""
+    protocolo = sys.stdout
+    sys.stdout = sys.stderr  # Los print del modelo no deben mezclarse con el protocolo
+
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {int(c) for c in cpus.split(",")})
+
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(hilos)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except ImportError:
+        pass  # Backend sin TensorFlow: bastan las variables de entorno de hilos
+    # Cargar y calentar antes de anunciar "listo"
+    ejecutar_modelo = importlib.import_module(modulo_modelo).ejecutar_modelo.cargar()
+
+    from multiprocessing import resource_tracker
+    bloques = []
+    for nombre in (nombre_entrada, nombre_salida):
+        shm = shared_memory.SharedMemory(name=nombre)
+        # El bloque pertenece al proceso web; este proceso no debe liberarlo al salir
+        resource_tracker.unregister(shm._name, "shared_memory")
+        bloques.append(shm)
+    entrada = np.ndarray((max_lote, *FORMA_IMAGEN), dtype=np.float32, buffer=bloques[0].buf)
+    salida = np.ndarray((max_lote, len(CLASES)), dtype=np.float32, buffer=bloques[1].buf)
+
+    protocolo.write("listo\n")
+    protocolo.flush()
+    for linea in sys.stdin:
+        n = int(linea)
+        try:
+            salida[:n] = ejecutar_modelo(entrada[:n])
+            protocolo.write("ok\n")
+        except Exception as e:
+            mensaje = str(e).replace("\n", " ")
+            protocolo.write(f"error {mensaje}\n")
+        protocolo.flush()
+
+    for shm in bloques:
+        shm.close()
+
+if __name__ == "__main__" and len(sys.argv) == 8 and sys.argv[1] == "--trabajador":
+    _trabajador(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]), sys.argv[6], sys.argv[7])
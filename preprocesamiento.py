@@ -0,0 +1,62 @@
+# preprocesamiento.py - Decodificación y preprocesado de imágenes para el modelo
+import os
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+from config import TAMAÑO_IMAGEN
+
+# Mismo remuestreo que keras.utils.load_img por defecto ("nearest")
+REMUESTREO = Image.NEAREST
+_ESCALA = np.float32(1.0 / 255.0)
+
+def _abrir(fuente):
+    """Abrir una imagen desde bytes, ruta o archivo sin volver a codificarla"""
+    if isinstance(fuente, (bytes, bytearray, memoryview)):
+        fuente = BytesIO(fuente)
+    elif isinstance(fuente, (str, os.PathLike)):
+        return Image.open(fuente)
+    elif hasattr(fuente, "seek"):
+        fuente.seek(0)
+    return Image.open(fuente)
+
+def preprocesar(fuente, salida=None, al_decodificar=None):
+    """
+    Decodificar una imagen y dejarla lista para el modelo
+
+    Args:
+        fuente: bytes, ruta de archivo u objeto tipo archivo
+        salida: Buffer float32 (224, 224, 3) donde escribir el resultado (opcional)
+        al_decodificar: Función que recibe la imagen RGB decodificada antes de reducirla
+            a 224x224, para reutilizar la decodificación (p. ej. miniaturas)
+
+    Returns:
+        np.ndarray float32 (224, 224, 3) normalizado a [0, 1]
+    """
+    if salida is None:
+        salida = np.empty((*TAMAÑO_IMAGEN[::-1], 3), dtype=np.float32)
+
+    with _abrir(fuente) as imagen:
+        # En JPEG, draft decodifica directamente a la escala 1/2, 1/4 u 1/8 más cercana
+        imagen.draft("RGB", TAMAÑO_IMAGEN)
+        if imagen.mode != "RGB":
+            imagen = imagen.convert("RGB")
+        if al_decodificar is not None:
+            try:
+                al_decodificar(imagen)
+            except Exception as e:
+                print(f"[PREPROCESAMIENTO] Error en al_decodificar: {e}")
+        if imagen.size != TAMAÑO_IMAGEN:
+            imagen = imagen.resize(TAMAÑO_IMAGEN, REMUESTREO)
+        pixeles = np.asarray(imagen, dtype=np.uint8)
+
+    # Conversión a float32 y normalización en una sola pasada sobre el buffer
+    np.multiply(pixeles, _ESCALA, out=salida, dtype=np.float32)
+    return salida
+
+def preprocesar_lote(fuentes):
+    """Preprocesar varias imágenes escribiendo directamente en un tensor (N, 224, 224, 3)"""
+    lote = np.empty((len(fuentes), *TAMAÑO_IMAGEN[::-1], 3), dtype=np.float32)
+    for i, fuente in enumerate(fuentes):
+        preprocesar(fuente, salida=lote[i])
+    return lote
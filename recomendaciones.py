@@ -1,4 +1,11 @@
 import random
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+from config import RECOMENDACIONES_MAX_ESTADOS
+
+MATERIAL_NO_RECONOCIDO = "Material no reconocido para recomendaciones específicas."
 
 # Diccionario con recomendaciones para cada material
 RECOMENDACIONES_BASE = {
@@ -64,33 +71,94 @@ RECOMENDACIONES_BASE = {
     ]
 }
 
-recomendaciones_por_sesion = {}
+class _Rotacion:
+    __slots__ = ("orden", "cursor")
+
+    def __init__(self, n: int):
+        self.orden = array("B", range(n))  # Permutación de índices (un byte por recomendación)
+        random.shuffle(self.orden)
+        self.cursor = 0
+
+class RotacionRecomendaciones:
+    def __init__(self, max_estados: int = 4096):
+        """
+        Cada (sesión, material) recorre una permutación aleatoria de los índices de sus
+        recomendaciones; al agotarla se baraja de nuevo. Elegir es O(1) y no crea listas,
+        y el número de estados está acotado: se descartan los menos usados recientemente
+
+        Args:
+            max_estados: Pares (sesión, material) que se recuerdan como máximo
+        """
+        self.max_estados = max_estados
+        self._estados = OrderedDict()  # (session_id, material) -> _Rotacion
+        self._lock = threading.Lock()
+        self.entregadas = 0
+        self.descartados = 0
+
+    def _siguiente(self, material: str, session_id: Optional[str]) -> str:
+        """Siguiente recomendación de la rotación (llamar con el lock)"""
+        base = RECOMENDACIONES_BASE[material]
+        clave = (session_id, material)
+        rotacion = self._estados.get(clave)
+        if rotacion is None:
+            rotacion = self._estados[clave] = _Rotacion(len(base))
+            if len(self._estados) > self.max_estados:
+                self._estados.popitem(last=False)
+                self.descartados += 1
+        else:
+            self._estados.move_to_end(clave)
+
+        if rotacion.cursor == len(rotacion.orden):
+            # Nueva vuelta; evitar que la primera repita la última de la vuelta anterior
+            ultima = rotacion.orden[-1]
+            random.shuffle(rotacion.orden)
+            if rotacion.orden[0] == ultima and len(rotacion.orden) > 1:
+                j = random.randrange(1, len(rotacion.orden))
+                rotacion.orden[0], rotacion.orden[j] = rotacion.orden[j], rotacion.orden[0]
+            rotacion.cursor = 0
+
+        indice = rotacion.orden[rotacion.cursor]
+        rotacion.cursor += 1
+        self.entregadas += 1
+        return base[indice]
+
+    def obtener(self, materiales: Iterable[str], session_id: Optional[str] = None) -> List[str]:
+        """
+        Una recomendación por material, en orden y tomando el lock una sola vez
+
+        Args:
+            materiales: Etiquetas clasificadas (pueden repetirse)
+            session_id: Sesión del usuario (None para el análisis live)
+
+        Returns:
+            Lista de recomendaciones, una por material
+        """
+        with self._lock:
+            return [self._siguiente(material, session_id) if material in RECOMENDACIONES_BASE
+                    else MATERIAL_NO_RECONOCIDO for material in materiales]
+
+    def olvidar_sesiones(self, session_ids: Iterable[str]):
+        """Descartar la rotación de sesiones eliminadas"""
+        session_ids = set(session_ids)
+        if not session_ids:
+            return
+        with self._lock:
+            for clave in [clave for clave in self._estados if clave[0] in session_ids]:
+                del self._estados[clave]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "estados": len(self._estados),
+                "max_estados": self.max_estados,
+                "entregadas": self.entregadas,
+                "descartados": self.descartados
+            }
+
+rotacion_recomendaciones = RotacionRecomendaciones(RECOMENDACIONES_MAX_ESTADOS)
+
+def obtener_recomendaciones(materiales, session_id=None):
+    return rotacion_recomendaciones.obtener(materiales, session_id)
 
 def obtener_recomendacion(material, session_id=None):
-    if material not in RECOMENDACIONES_BASE:
-        return "Material no reconocido para recomendaciones específicas."
-
-    if session_id is None:
-        if material not in recomendaciones_por_sesion:
-            recomendaciones_por_sesion[material] = []
-        disponibles = [r for r in RECOMENDACIONES_BASE[material] if r not in recomendaciones_por_sesion[material]]
-        if not disponibles:
-            recomendaciones_por_sesion[material] = []
-            disponibles = RECOMENDACIONES_BASE[material]
-        rec = random.choice(disponibles)
-        recomendaciones_por_sesion[material].append(rec)
-        return rec
-
-    if session_id not in recomendaciones_por_sesion:
-        recomendaciones_por_sesion[session_id] = {}
-    if material not in recomendaciones_por_sesion[session_id]:
-        recomendaciones_por_sesion[session_id][material] = []
-
-    disponibles = [r for r in RECOMENDACIONES_BASE[material] if r not in recomendaciones_por_sesion[session_id][material]]
-    if not disponibles:
-        recomendaciones_por_sesion[session_id][material] = []
-        disponibles = RECOMENDACIONES_BASE[material]
-
-    rec = random.choice(disponibles)
-    recomendaciones_por_sesion[session_id][material].append(rec)
-    return rec
+    return rotacion_recomendaciones.obtener((material,), session_id)[0]
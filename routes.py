@@ -1,22 +1,77 @@
-import os, time, requests, json, shutil
+import os, re, time, json
+from functools import partial
 from io import BytesIO
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, Response, stream_with_context, send_file
 from flask_socketio import SocketIO
-from config import UPLOAD_FOLDER, HISTORIAL_LIVE_FILE
-from model import predecir_imagen
-from historial import guardar_analisis_live
-from recomendaciones import obtener_recomendacion
-from sessionManager import SessionManager
+from config import (CANAL_LIVE, EVENTOS_MAX_PENDIENTES_CLIENTE,
+                    EVENTOS_TIMEOUT_CONFIRMACION, EVENTOS_INTERVALO_BARRIDO, MINIATURAS_MAX_AGE)
+from model import predecir_imagen, ejecutar_modelo
+from pipeline import pipeline
+from historial import (guardar_analisis_live, obtener_total_live, obtener_meta_live,
+                       iterar_analisis_live_desde, coincide_filtros, parsear_limite_fecha)
+from recomendaciones import obtener_recomendacion, obtener_recomendaciones
+from sessionManager import get_session_manager
+from estadisticas import estadisticas, latencias_chat
+from descargador import descargador
+from trabajos import cola_trabajos, ColaLlena
+from almacen_blobs import almacen_blobs
+from miniaturas import cache_miniaturas, FORMATOS
+from eventos_live import EmisorEventos
+from concurrencia import MODO_ASYNC
 
-socketio = SocketIO(cors_allowed_origins="*")
-session_manager = SessionManager(sessions_dir="static/sessions", cleanup_hours=24)
+MAX_LIMITE_HISTORIAL = 500
+CANALES_PUBLICOS = (CANAL_LIVE,)
+HASH_BLOB = re.compile(r"^[0-9a-f]{64}$")
 
-def generar_texto_recomendaciones(resultados, session_id=None):
+socketio = SocketIO(cors_allowed_origins="*", async_mode=MODO_ASYNC)
+emisor_eventos = EmisorEventos(socketio, EVENTOS_MAX_PENDIENTES_CLIENTE, EVENTOS_TIMEOUT_CONFIRMACION,
+                               EVENTOS_INTERVALO_BARRIDO)
+session_manager = get_session_manager()
+
+def _guardar_blob(contenido, imagen_info):
+    """
+    Registrar la imagen en el almacén de blobs y completar su información (hash, ruta, url).
+    La escritura a disco queda en segundo plano: la clasificación usa los bytes en memoria
+    """
+    blob = almacen_blobs.guardar(contenido, diferido=True)
+    imagen_info.update({"hash": blob["hash"], "ruta": blob["ruta"], "url_relativa": blob["url_relativa"]})
+
+def _obtener_archivo(file, imagen_info):
+    """Leer un archivo subido y guardarlo en el almacén de blobs"""
+    contenido = file.read()
+    _guardar_blob(contenido, imagen_info)
+    return contenido
+
+def _obtener_url(url, imagen_info):
+    """Descargar una imagen remota y guardarla en el almacén de blobs"""
+    contenido = descargador.descargar(url)
+    _guardar_blob(contenido, imagen_info)
+    return contenido
+
+def _miniaturas_desde_decodificacion(imagen_info, imagen):
+    """Generar las miniaturas con la imagen que ya se decodificó para la inferencia"""
+    if imagen_info.get("hash"):
+        cache_miniaturas.generar_desde(imagen_info["hash"], imagen)
+
+def _url_miniatura(hash_hex, tamaño):
+    return f"/miniatura/{hash_hex}?t={tamaño}"
+
+def _obtener_ruta_local(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+def generar_texto_recomendaciones(resultados, session_id=None, recomendaciones=None):
+    """
+    Args:
+        resultados: Lista de (etiqueta, confianza)
+        session_id: Sesión cuya rotación de recomendaciones se usa
+        recomendaciones: Recomendaciones ya elegidas para estos resultados (no se eligen otras)
+    """
+    if recomendaciones is None:
+        recomendaciones = obtener_recomendaciones([etiqueta for etiqueta, _ in resultados], session_id)
     mensaje = ""
-    recomendaciones_individuales = []
-    for idx, (etiqueta, confianza) in enumerate(resultados, start=1):
-        rec = obtener_recomendacion(etiqueta, session_id)
-        recomendaciones_individuales.append(rec)
+    recomendaciones_individuales = list(recomendaciones)
+    for idx, ((etiqueta, confianza), rec) in enumerate(zip(resultados, recomendaciones_individuales), start=1):
         mensaje += (
             f"Imagen {idx}:<br>"
             f"Material identificado: {etiqueta}<br>"
@@ -25,8 +80,101 @@ def generar_texto_recomendaciones(resultados, session_id=None):
         )
     return mensaje, recomendaciones_individuales
 
+def _emitir_trabajo(trabajo, evento, datos=None):
+    """Emitir un evento al cliente que envió el trabajo y a los suscritos al canal live"""
+    emisor_eventos.emitir(evento, {**(datos or {}), "job_id": trabajo.id}, sid=trabajo.sid, canal=CANAL_LIVE)
+
+def _analizar_live(trabajo, url):
+    """
+    Descargar (o copiar), clasificar y guardar en el historial live una imagen
+
+    Args:
+        trabajo: Trabajo de la cola; recibe la etapa en curso
+        url: URL http(s) o ruta local de la imagen
+
+    Returns:
+        Diccionario con url, etiqueta y confianza
+    """
+    print(f"[ANÁLISIS] Emitiendo evento inicio_analisis")
+    _emitir_trabajo(trabajo, "inicio_analisis")
+    
+    timestamp = int(time.time() * 1000)
+    nombre_archivo = f"imagen_{timestamp}_{trabajo.id[:8]}.jpg"
+
+    try:
+        if url.startswith("http://") or url.startswith("https://"):
+            trabajo.avanzar("descarga")
+            print(f"[ANÁLISIS] Descargando imagen desde URL: {url}")
+            try:
+                contenido = descargador.descargar(url)
+            except Exception as e:
+                print(f"[ANÁLISIS] Descarga rechazada: {e}")
+                raise ValueError("No se pudo descargar la imagen o no es válida")
+            imagen_info = {"tipo": "url_live", "url_original": url}
+        elif os.path.exists(url):
+            contenido = _obtener_ruta_local(url)
+            imagen_info = {"tipo": "ruta_local_live", "ruta_original": url}
+        else:
+            raise ValueError("La ruta local no existe")
+
+        imagen_info["filename"] = nombre_archivo
+        _guardar_blob(contenido, imagen_info)  # La escritura se solapa con la inferencia
+        trabajo.avanzar("inferencia")
+        etiqueta, confianza = predecir_imagen(imagen_bytes=BytesIO(contenido))
+        trabajo.avanzar("guardado")
+
+        # Obtener recomendación específica (sin sesión para análisis live)
+        recomendacion = obtener_recomendacion(etiqueta)
+        
+        # Guardar en historial live (global); el historial mantiene vivo el blob
+        guardar_analisis_live(imagen_info, etiqueta, confianza, recomendacion)
+        almacen_blobs.agregar_referencias([imagen_info["hash"]], "live")
+        # El cliente carga la imagen al recibir nueva_imagen: debe estar ya en disco
+        almacen_blobs.esperar(imagen_info["hash"])
+    except Exception as e:
+        _emitir_trabajo(trabajo, "analisis_error", {"error": str(e)})
+        raise
+
+    print(f"[IA LIVE] {url} -> {etiqueta} ({confianza*100:.1f}%)")
+    resultado = {"url": imagen_info["url_relativa"], "etiqueta": etiqueta, "confianza": float(confianza),
+                 "miniatura": _url_miniatura(imagen_info["hash"], 640)}
+    _emitir_trabajo(trabajo, "nueva_imagen", resultado)
+    return resultado
+
 def register_routes(app):
 
+    @socketio.on("connect")
+    def conectar(auth=None):
+        # /live se conecta con ?formato=compacto; cada cliente recibe solo sus trabajos
+        emisor_eventos.registrar(request.sid, request.args.get("formato") == "compacto")
+
+    @socketio.on("suscribir")
+    def suscribir(datos=None):
+        """Recibir además los eventos de todos los trabajos de un canal (p. ej. un monitor)"""
+        canal = (datos or {}).get("canal")
+        if canal not in CANALES_PUBLICOS:
+            return {"ok": False, "error": f"Canal no disponible: {canal}"}
+        return {"ok": emisor_eventos.suscribir(request.sid, canal)}
+
+    @socketio.on("disconnect")
+    def desconectar(*args):
+        emisor_eventos.eliminar(request.sid)
+
+    @app.route("/ready")
+    def ready():
+        """Sonda de disponibilidad: 200 con el modelo cargado y calentado, 503 mientras tanto"""
+        listo = ejecutar_modelo.listo()
+        respuesta = jsonify({
+            "listo": listo,
+            "estado": ejecutar_modelo.estado,
+            "backend": ejecutar_modelo.descripcion,
+            "error": ejecutar_modelo.error
+        })
+        if listo:
+            return respuesta, 200
+        respuesta.headers["Retry-After"] = "5"
+        return respuesta, 503
+
     @app.route("/", methods=["GET", "POST"])
     def index():
         resultado = None
@@ -52,103 +200,113 @@ def register_routes(app):
             archivos = request.files.getlist("imagen")
             urls = request.form.getlist("imagen_url")
             resultados_lista = []
+            
+            # Si el cliente envía su socket_id, cada resultado se emite a su sala en cuanto está listo;
+            # request_id distingue los eventos de varios mensajes en curso en el mismo socket
+            socket_id = request.form.get('socket_id')
+            request_id = request.form.get('request_id')
+            inicio = time.perf_counter()
+            primer_resultado_ms = None
 
             try:
                 resultados_tuplas = []
                 imagenes_info_user = []  # Información de imágenes para el usuario
                 resultados_analisis = []  # Para guardar en la sesión con formato completo
+                trabajos = []  # (imagen_info_user, obtener, descripcion) en orden de entrada
 
                 # Procesar archivos primero
                 for i, file in enumerate(archivos):
                     if file and file.filename != "":
-                        ruta_imagen = os.path.join(UPLOAD_FOLDER, file.filename)
-                        file.save(ruta_imagen)
-                        etiqueta, confianza = predecir_imagen(ruta_imagen=ruta_imagen)
-                        resultados_tuplas.append((etiqueta, confianza))
-                        
                         # Información de la imagen para el mensaje del usuario
+                        # (hash, ruta y url_relativa se completan al guardar el blob)
                         imagen_info_user = {
                             "tipo": "archivo_subido",
                             "filename": file.filename,
-                            "ruta": ruta_imagen,
-                            "url_relativa": f"/static/uploads/{file.filename}",
                             "session_id": session_id
                         }
-                        imagenes_info_user.append(imagen_info_user)
-                        
-                        # Obtener recomendación específica para esta sesión
-                        recomendacion = obtener_recomendacion(etiqueta, session_id)
-                        
-                        # Agregar a resultados para guardar en sesión
-                        resultados_analisis.append((imagen_info_user, etiqueta, confianza, recomendacion))
+                        trabajos.append((imagen_info_user, partial(_obtener_archivo, file, imagen_info_user), file.filename))
 
                 # Procesar URLs después
+                timestamp = int(time.time() * 1000)
                 for j, url in enumerate(urls):
                     url = url.strip()
                     if not url:
                         continue
-                    try:
-                        if url.startswith("http://") or url.startswith("https://"):
-                            headers = {"User-Agent": "Mozilla/5.0"}
-                            response = requests.get(url, headers=headers, timeout=10)
-                            if response.status_code == 200 and "image" in response.headers.get("Content-Type", ""):
-                                imagen_bytes = BytesIO(response.content)
-                                etiqueta, confianza = predecir_imagen(imagen_bytes=imagen_bytes)
-                                resultados_tuplas.append((etiqueta, confianza))
-                                
-                                # Guardar imagen
-                                timestamp = int(time.time() * 1000)
-                                nombre_archivo = f"imagen_{timestamp}.jpg"
-                                ruta_archivo = os.path.join(UPLOAD_FOLDER, nombre_archivo)
-                                with open(ruta_archivo, "wb") as f:
-                                    f.write(response.content)
-                                
-                                # Información de la imagen para el mensaje del usuario
-                                imagen_info_user = {
-                                    "tipo": "url_externa",
-                                    "url_original": url,
-                                    "filename": nombre_archivo,
-                                    "ruta": ruta_archivo,
-                                    "url_relativa": f"/static/uploads/{nombre_archivo}",
-                                    "session_id": session_id
-                                }
-                                imagenes_info_user.append(imagen_info_user)
-                                
-                                # Obtener recomendación específica para esta sesión
-                                recomendacion = obtener_recomendacion(etiqueta, session_id)
-                                
-                                # Agregar a resultados para guardar en sesión
-                                resultados_analisis.append((imagen_info_user, etiqueta, confianza, recomendacion))
-                            else:
-                                resultados_lista.append(f"No se pudo descargar la imagen desde {url}")
+                    if url.startswith("http://") or url.startswith("https://"):
+                        nombre_archivo = f"imagen_{timestamp}_{j}.jpg"
+                        
+                        # Información de la imagen para el mensaje del usuario
+                        imagen_info_user = {
+                            "tipo": "url_externa",
+                            "url_original": url,
+                            "filename": nombre_archivo,
+                            "session_id": session_id
+                        }
+                        trabajos.append((imagen_info_user, partial(_obtener_url, url, imagen_info_user), url))
+                    else:
+                        # Ruta local
+                        if os.path.exists(url):
+                            # Información de la imagen para el mensaje del usuario
+                            imagen_info_user = {
+                                "tipo": "ruta_local",
+                                "ruta_original": url,
+                                "filename": os.path.basename(url),
+                                "session_id": session_id
+                            }
+                            trabajos.append((imagen_info_user, partial(_obtener_ruta_local, url), url))
                         else:
-                            # Ruta local
-                            if os.path.exists(url):
-                                etiqueta, confianza = predecir_imagen(ruta_imagen=url)
-                                resultados_tuplas.append((etiqueta, confianza))
-                                
-                                # Información de la imagen para el mensaje del usuario
-                                imagen_info_user = {
-                                    "tipo": "ruta_local",
-                                    "ruta_original": url,
-                                    "filename": os.path.basename(url),
-                                    "session_id": session_id
-                                }
-                                imagenes_info_user.append(imagen_info_user)
-                                
-                                # Obtener recomendación específica para esta sesión
-                                recomendacion = obtener_recomendacion(etiqueta, session_id)
-                                
-                                # Agregar a resultados para guardar en sesión
-                                resultados_analisis.append((imagen_info_user, etiqueta, confianza, recomendacion))
-                            else:
-                                resultados_lista.append(f"La ruta local no existe: {url}")
-                    except Exception as e:
-                        resultados_lista.append(f"Error al cargar {url}: {e}")
+                            resultados_lista.append(f"La ruta local no existe: {url}")
+
+                # Descarga/guardado, preprocesado e inferencia se solapan entre imágenes;
+                # los resultados llegan en orden de entrada
+                resultados_pipeline = pipeline.procesar(
+                    [obtener for _, obtener, _ in trabajos],
+                    al_decodificar=[partial(_miniaturas_desde_decodificacion, info) for info, _, _ in trabajos]
+                )
+                for indice, ((imagen_info_user, _, descripcion), resultado) in enumerate(zip(trabajos, resultados_pipeline)):
+                    if primer_resultado_ms is None:
+                        primer_resultado_ms = (time.perf_counter() - inicio) * 1000
+                    
+                    if isinstance(resultado, Exception):
+                        resultados_lista.append(f"Error al cargar {descripcion}: {resultado}")
+                        if socket_id:
+                            socketio.emit("resultado_imagen", {
+                                "request_id": request_id,
+                                "indice": indice,
+                                "total": len(trabajos),
+                                "error": f"Error al cargar {descripcion}: {resultado}"
+                            }, to=socket_id)
+                        continue
+                    
+                    etiqueta, confianza = resultado
+                    resultados_tuplas.append((etiqueta, confianza))
+                    imagenes_info_user.append(imagen_info_user)
+                    
+                    # La rotación guarda un cursor por (sesión, material): varias imágenes del
+                    # mismo material en un mensaje reciben recomendaciones distintas
+                    recomendacion = obtener_recomendacion(etiqueta, session_id)
+                    
+                    # Agregar a resultados para guardar en sesión
+                    resultados_analisis.append((imagen_info_user, etiqueta, confianza, recomendacion))
+                    
+                    if socket_id:
+                        socketio.emit("resultado_imagen", {
+                            "request_id": request_id,
+                            "indice": indice,
+                            "total": len(trabajos),
+                            "etiqueta": etiqueta,
+                            "confianza": float(confianza),
+                            "recomendacion": recomendacion,
+                            "imagen": imagen_info_user.get("url_relativa")
+                        }, to=socket_id)
 
                 # Generar mensaje elaborado con recomendaciones específicas para esta sesión
                 if resultados_tuplas:
-                    resultado, recomendaciones_individuales = generar_texto_recomendaciones(resultados_tuplas, session_id)
+                    # Reutilizar las recomendaciones ya enviadas para que el texto coincida con lo guardado
+                    resultado, recomendaciones_individuales = generar_texto_recomendaciones(
+                        resultados_tuplas, session_id,
+                        [recomendacion for _, _, _, recomendacion in resultados_analisis]
+                    )
                     
                     # Guardar conversación completa en la sesión (NUEVO: incluye mensaje del usuario)
                     session_manager.add_conversation_to_session(
@@ -158,9 +316,24 @@ def register_routes(app):
                         resultados_analisis  # Resultados del análisis con recomendaciones
                     )
 
+                total_ms = (time.perf_counter() - inicio) * 1000
+                latencias_chat.registrar(primer_resultado_ms, total_ms, len(trabajos))
+                metricas = {
+                    "imagenes": len(trabajos),
+                    "tiempo_primer_resultado_ms": round(primer_resultado_ms, 1) if primer_resultado_ms is not None else None,
+                    "tiempo_total_ms": round(total_ms, 1)
+                }
+                if socket_id:
+                    socketio.emit("resultado_final", {
+                        "request_id": request_id,
+                        "resultado": resultado,
+                        "session_id": session_id,
+                        "metricas": metricas
+                    }, to=socket_id)
+
                 # Si es petición AJAX (Fetch)
                 if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-                    return jsonify({"resultado": resultado, "session_id": session_id})
+                    return jsonify({"resultado": resultado, "session_id": session_id, "metricas": metricas})
 
             except Exception as e:
                 if request.headers.get("X-Requested-With") == "XMLHttpRequest":
@@ -171,84 +344,78 @@ def register_routes(app):
 
     @app.route("/analizar_url", methods=["GET"])
     def analizar_url():
+        """Encolar el análisis de una imagen en vivo y devolver el id del trabajo (202)"""
         url = request.args.get("url", "").strip()
         if not url:
             return jsonify({"error": "No se proporcionó URL o ruta"}), 400
         
+        # Los eventos del trabajo se envían solo a la sala del cliente que lo envía
+        socket_id = request.args.get("socket_id")
         try:
-            # EMITIR EVENTO DE INICIO DE ANÁLISIS ANTES DE CUALQUIER PROCESAMIENTO
-            print(f"[ANÁLISIS] Emitiendo evento inicio_analisis")
-            socketio.emit("inicio_analisis")
-            socketio.sleep(0)  # Forzar que se procese el evento inmediatamente
-            
-            print(f"[ANÁLISIS] Iniciando descarga de imagen: {url}")
-            
-            timestamp = int(time.time() * 1000)
-            nombre_archivo = f"imagen_{timestamp}.jpg"
-            ruta_archivo = os.path.join(UPLOAD_FOLDER, nombre_archivo)
-
-            if url.startswith("http://") or url.startswith("https://"):
-                headers = {"User-Agent": "Mozilla/5.0"}
-                print(f"[ANÁLISIS] Descargando imagen desde URL...")
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200 and "image" in response.headers.get("Content-Type", ""):
-                    imagen_bytes = BytesIO(response.content)
-                    print(f"[ANÁLISIS] Imagen descargada, iniciando predicción...")
-                    etiqueta, confianza = predecir_imagen(imagen_bytes=imagen_bytes)
-                    with open(ruta_archivo, "wb") as f:
-                        f.write(response.content)
-                    
-                    # Obtener recomendación específica (sin sesión para análisis live)
-                    recomendacion = obtener_recomendacion(etiqueta)
-                    
-                    # Guardar en historial live (global)
-                    imagen_info = {
-                        "tipo": "url_live",
-                        "url_original": url,
-                        "filename": nombre_archivo,
-                        "ruta": ruta_archivo,
-                        "url_relativa": f"/static/uploads/{nombre_archivo}"
-                    }
-                    guardar_analisis_live(imagen_info, etiqueta, confianza, recomendacion)
-                    
-                else:
-                    socketio.emit("analisis_error", {"error": "No se pudo descargar la imagen o no es válida"})
-                    return jsonify({"error": "No se pudo descargar la imagen o no es válida"}), 400
-            else:
-                if os.path.exists(url):
-                    print(f"[ANÁLISIS] Procesando archivo local, iniciando predicción...")
-                    etiqueta, confianza = predecir_imagen(ruta_imagen=url)
-                    shutil.copy(url, ruta_archivo)
-                    
-                    # Obtener recomendación específica (sin sesión para análisis live)
-                    recomendacion = obtener_recomendacion(etiqueta)
-                    
-                    # Guardar en historial live (global)
-                    imagen_info = {
-                        "tipo": "ruta_local_live",
-                        "ruta_original": url,
-                        "filename": nombre_archivo,
-                        "ruta": ruta_archivo,
-                        "url_relativa": f"/static/uploads/{nombre_archivo}"
-                    }
-                    guardar_analisis_live(imagen_info, etiqueta, confianza, recomendacion)
-                    
-                else:
-                    socketio.emit("analisis_error", {"error": "La ruta local no existe"})
-                    return jsonify({"error": "La ruta local no existe"}), 400
+            trabajo = cola_trabajos.encolar(_analizar_live, url, sid=socket_id)
+        except ColaLlena as e:
+            print(f"[ANÁLISIS] Trabajo rechazado: {e}")
+            respuesta = jsonify({"error": str(e)})
+            respuesta.headers["Retry-After"] = "1"
+            return respuesta, 429
+        
+        print(f"[ANÁLISIS] Trabajo {trabajo.id} encolado: {url}")
+        return jsonify({"job_id": trabajo.id, "estado": trabajo.estado, "inicio_analisis": True}), 202
 
-            print(f"[IA LIVE] {url} -> {etiqueta} ({confianza*100:.1f}%)")
-            url_para_live = f"/static/uploads/{nombre_archivo}"
-            
-            # EMITIR EVENTO CON EL RESULTADO
-            print(f"[ANÁLISIS] Emitiendo resultado del análisis")
-            socketio.emit("nueva_imagen", {"url": url_para_live, "etiqueta": etiqueta, "confianza": float(confianza)})
-            
-            return jsonify({"etiqueta": etiqueta, "confianza": float(confianza), "inicio_analisis": True})
-        except Exception as e:
-            print(f"[ERROR] Error en análisis: {e}")
-            socketio.emit("analisis_error", {"error": str(e)})
-            return jsonify({"error": str(e)}), 500
+    @app.route("/analizar_url/<job_id>", methods=["GET"])
+    def estado_analisis(job_id):
+        """Estado, etapa y resultado de un trabajo de análisis en vivo"""
+        trabajo = cola_trabajos.obtener(job_id)
+        if trabajo is None:
+            return jsonify({"error": "Trabajo no encontrado"}), 404
+        return jsonify(trabajo.to_dict())
+
+    @app.route("/miniatura/<hash_hex>")
+    def miniatura(hash_hex):
+        """
+        Miniatura de una imagen del almacén de blobs
+
+        Parámetros opcionales:
+            t: Lado mayor en píxeles (uno de MINIATURAS_TAMAÑOS, por defecto 320)
+            formato: "jpeg" o "webp" (por defecto WebP si el navegador lo acepta)
+        """
+        if not HASH_BLOB.match(hash_hex):
+            return jsonify({"error": "Identificador de imagen inválido"}), 400
+        tamaño = request.args.get("t", default=320, type=int)
+        formato = request.args.get("formato")
+        negociado = formato is None
+        if negociado:
+            # Solo si el navegador lo anuncia explícitamente (no por un comodín */*)
+            acepta_webp = "image/webp" in request.headers.get("Accept", "")
+            formato = "webp" if acepta_webp and "webp" in cache_miniaturas.formatos else "jpeg"
+        if tamaño not in cache_miniaturas.tamaños or formato not in cache_miniaturas.formatos:
+            return jsonify({"error": "Tamaño o formato no soportado",
+                            "tamaños": list(cache_miniaturas.tamaños),
+                            "formatos": cache_miniaturas.formatos}), 400
+
+        def cabeceras(respuesta):
+            respuesta.set_etag(etag)
+            respuesta.cache_control.public = True
+            respuesta.cache_control.max_age = MINIATURAS_MAX_AGE
+            respuesta.cache_control.immutable = True
+            if negociado:
+                respuesta.vary.add("Accept")
+            return respuesta
+
+        # El ETag depende solo del contenido: se responde 304 sin tocar el disco
+        etag = cache_miniaturas.etag(hash_hex, tamaño, formato)
+        if etag in request.if_none_match:
+            return cabeceras(Response(status=304))
+
+        ruta_original = almacen_blobs.ruta_de(hash_hex)
+        if ruta_original is None:
+            return jsonify({"error": "Imagen no encontrada"}), 404
+        almacen_blobs.esperar(hash_hex, timeout=5)  # Puede estar aún en el escritor diferido
+        try:
+            ruta = cache_miniaturas.obtener(hash_hex, ruta_original, tamaño, formato)
+        except (OSError, ValueError) as e:
+            return jsonify({"error": f"No se pudo generar la miniatura: {e}"}), 404
+        return cabeceras(send_file(ruta, mimetype=FORMATOS[formato][1], conditional=False, etag=False))
 
     @app.route("/historial")
     def ver_historial():
@@ -268,14 +435,64 @@ def register_routes(app):
 
     @app.route("/historial_live")
     def ver_historial_live():
-        """Endpoint para ver el historial persistente de análisis en vivo en formato JSON"""
+        """
+        Endpoint para ver el historial persistente de análisis en vivo en formato JSON
+
+        Parámetros opcionales:
+            limite: Tamaño de página (activa la paginación)
+            cursor: Posición devuelta como 'siguiente_cursor' en la página anterior
+            offset: Número de análisis (ya filtrados) a saltar
+            desde, hasta: Rango de fechas ISO 8601
+            etiqueta: Material a filtrar
+        Sin 'limite' se devuelve el historial completo generado de forma incremental.
+        """
         try:
-            if os.path.exists(HISTORIAL_LIVE_FILE):
-                with open(HISTORIAL_LIVE_FILE, 'r', encoding='utf-8') as f:
-                    historial = json.load(f)
-                return jsonify(historial)
-            else:
-                return jsonify({"error": "No hay historial live disponible"})
+            limite = request.args.get("limite", type=int)
+            cursor = request.args.get("cursor", default=0, type=int)
+            offset = request.args.get("offset", default=0, type=int)
+            etiqueta = request.args.get("etiqueta")
+            # Validar antes de empezar la respuesta: en streaming ya no se puede devolver un 400
+            desde = parsear_limite_fecha(request.args.get("desde"))
+            hasta = parsear_limite_fecha(request.args.get("hasta"), fin_de_dia=True)
+        except ValueError as e:
+            return jsonify({"error": f"Parámetros inválidos: {str(e)}"}), 400
+
+        def filtrados():
+            saltados = 0
+            for analisis, siguiente in iterar_analisis_live_desde(max(cursor, 0)):
+                if not coincide_filtros(analisis, desde, hasta, etiqueta):
+                    continue
+                if saltados < offset:
+                    saltados += 1
+                    continue
+                yield analisis, siguiente
+
+        try:
+            meta = obtener_meta_live()
+
+            if limite is not None:
+                limite = max(1, min(limite, MAX_LIMITE_HISTORIAL))
+                pagina = []
+                siguiente_cursor = None
+                for analisis, siguiente in filtrados():
+                    pagina.append(analisis)
+                    siguiente_cursor = siguiente
+                    if len(pagina) >= limite:
+                        break
+                return jsonify({
+                    **meta,
+                    "analyses": pagina,
+                    "siguiente_cursor": siguiente_cursor if len(pagina) >= limite else None
+                })
+
+            def generar():
+                cabecera = json.dumps(meta, ensure_ascii=False)[:-1]
+                yield cabecera + ', "analyses": ['
+                for i, (analisis, _) in enumerate(filtrados()):
+                    yield ("," if i else "") + json.dumps(analisis, ensure_ascii=False)
+                yield "]}"
+
+            return Response(stream_with_context(generar()), mimetype="application/json")
         except Exception as e:
             return jsonify({"error": f"Error al leer historial live: {str(e)}"})
 
@@ -287,18 +504,18 @@ def register_routes(app):
             session_stats = session_manager.get_session_stats()
             
             # Estadísticas del live
-            live_stats = {"total": 0, "disponible": False}
-            if os.path.exists(HISTORIAL_LIVE_FILE):
-                with open(HISTORIAL_LIVE_FILE, 'r', encoding='utf-8') as f:
-                    historial_live = json.load(f)
-                live_stats["total"] = historial_live.get("total_images_analyzed", 0)
-                live_stats["disponible"] = True
+            live_stats = {
+                "total": obtener_total_live(),
+                "por_clase": estadisticas.resumen()["clases_live"],
+                "disponible": True
+            }
             
             # Combinar estadísticas
             stats = {
                 "sesiones": {
                     "sesiones_activas": session_stats["active_sessions"],
                     "total_analisis_sesiones": session_stats["total_analyses"],
+                    "por_clase": session_stats["analyses_by_class"],
                     "horas_limpieza": session_stats["cleanup_hours"]
                 },
                 "live": live_stats,
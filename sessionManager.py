@@ -5,35 +5,158 @@ import uuid
 import time
 from datetime import datetime, timedelta
 import threading
-from typing import Optional, Dict, Any
+import atexit
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+from config import (SESSION_BACKEND, SESSION_DB_FILE, SESSIONS_DIR, SESSION_CLEANUP_HOURS,
+                    SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES, SESSION_LOCK_STRIPES,
+                    SESSION_WRITE_MODE, SESSION_FLUSH_INTERVAL)
+from sessionStorage import create_session_storage
+from estadisticas import estadisticas
+from almacen_blobs import almacen_blobs
+from recomendaciones import rotacion_recomendaciones
+
+def _estimate_size(data: Any) -> int:
+    """Tamaño aproximado en bytes de una sesión o conversación serializada"""
+    return len(json.dumps(data, ensure_ascii=False, default=str))
+
+class SessionCache:
+    def __init__(self, max_entries: int, max_bytes: int):
+        """
+        Cache LRU de sesiones acotado por número de entradas y bytes aproximados
+        
+        Args:
+            max_entries: Máximo de sesiones en memoria
+            max_bytes: Máximo de bytes (tamaño JSON estimado) en memoria
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # session_id -> (session_data, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+    
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+    
+    def size_of(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry[1] if entry else None
+    
+    def put(self, session_id: str, session_data: Dict[str, Any], size: Optional[int] = None):
+        if size is None:
+            size = _estimate_size(session_data)
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[session_id] = (session_data, size)
+            self._bytes += size
+            
+            # Expulsar las menos usadas recientemente (siempre se conserva la recién escrita)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+    
+    def pop(self, session_id: str):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
 
 class SessionManager:
-    def __init__(self, sessions_dir="static/sessions", cleanup_hours=24):
+    def __init__(self, sessions_dir="static/sessions", cleanup_hours=24, storage=None,
+                 write_mode=SESSION_WRITE_MODE, flush_interval=SESSION_FLUSH_INTERVAL):
         """
-        Inicializar el gestor de sesiones
+        Inicializar el gestor de sesiones. En la aplicación se usa la instancia compartida
+        de get_session_manager() para que haya un solo cache y un solo hilo de limpieza
         
         Args:
             sessions_dir: Directorio donde se almacenarán los archivos de sesión
             cleanup_hours: Horas después de las cuales se eliminan sesiones inactivas
+            storage: Backend de almacenamiento (por defecto el configurado en SESSION_BACKEND)
+            write_mode: "sync", "conversations" o "deferred" (ver SESSION_WRITE_MODE en config.py)
+            flush_interval: Segundos entre escrituras de las sesiones pendientes
         """
+        if write_mode not in ("sync", "conversations", "deferred"):
+            raise ValueError(f"Modo de escritura de sesiones no soportado: {write_mode}")
+        
         self.sessions_dir = sessions_dir
         self.cleanup_hours = cleanup_hours
-        self.sessions_cache = {}  # Cache en memoria para sesiones activas
+        # Cache en memoria para sesiones activas (LRU acotado)
+        self.sessions_cache = SessionCache(SESSION_CACHE_MAX_ENTRIES, SESSION_CACHE_MAX_BYTES)
+        # Locks por sesión (repartidos en un número fijo de franjas para no crecer sin límite)
+        self._session_locks = [threading.RLock() for _ in range(SESSION_LOCK_STRIPES)]
+        # Write-behind: session_id -> (session_data, conversaciones sin persistir)
+        self.write_mode = write_mode
+        self.flush_interval = flush_interval
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self.last_cleanup = None  # Resultado y duración del último barrido
         
         # Crear directorio de sesiones si no existe
         os.makedirs(self.sessions_dir, exist_ok=True)
         
+        self.storage = storage or create_session_storage(SESSION_BACKEND, sessions_dir, SESSION_DB_FILE)
+        if self.storage.name != "json":
+            self.migrate_json_sessions()
+        
+        # Los agregados se reconstruyen una vez y luego se actualizan en cada escritura
+        self.rebuild_stats()
+        
         # Iniciar limpieza automática en hilo separado
         self.start_cleanup_thread()
         
-        print(f"[SESSION MANAGER] Inicializado - Directorio: {sessions_dir}, Limpieza cada: {cleanup_hours}h")
+        if self.write_mode != "sync":
+            self.start_flush_thread()
+            atexit.register(self.flush)
+        
+        print(f"[SESSION MANAGER] Inicializado - Directorio: {sessions_dir}, Backend: {self.storage.name}, Limpieza cada: {cleanup_hours}h")
     
     def generate_session_id(self) -> str:
         """Generar un ID único para la sesión"""
         return str(uuid.uuid4())
     
+    def session_lock(self, session_id: str) -> threading.RLock:
+        """Lock que serializa las escrituras de una sesión"""
+        return self._session_locks[hash(session_id) % len(self._session_locks)]
+    
     def get_session_file_path(self, session_id: str) -> str:
-        """Obtener la ruta del archivo de sesión"""
+        """Obtener la ruta del archivo de sesión (formato JSON)"""
         return os.path.join(self.sessions_dir, f"session_{session_id}.json")
     
     def create_session(self, session_id: Optional[str] = None) -> str:
@@ -57,13 +180,13 @@ class SessionManager:
             "conversations": []  # Cambio: ahora usamos 'conversations' en lugar de 'analyses'
         }
         
-        # Guardar en archivo
-        session_file = self.get_session_file_path(session_id)
-        with open(session_file, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, indent=2, ensure_ascii=False)
-        
-        # Guardar en cache
-        self.sessions_cache[session_id] = session_data
+        with self.session_lock(session_id):
+            # Guardar en el almacenamiento
+            self.storage.save_session(session_data)
+            
+            # Guardar en cache
+            self.sessions_cache.put(session_id, session_data)
+            estadisticas.sesion_creada(session_data)
         
         print(f"[SESSION] Sesión creada: {session_id}")
         return session_id
@@ -79,28 +202,40 @@ class SessionManager:
             Dict con los datos de la sesión o None si no existe
         """
         # Primero buscar en cache
-        if session_id in self.sessions_cache:
-            return self.sessions_cache[session_id]
-        
-        # Si no está en cache, buscar en archivo
-        session_file = self.get_session_file_path(session_id)
-        if os.path.exists(session_file):
-            try:
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                
-                # Migrar datos antiguos si es necesario
-                if 'analyses' in session_data and 'conversations' not in session_data:
-                    session_data = self._migrate_old_session(session_data)
-                
-                # Actualizar cache
-                self.sessions_cache[session_id] = session_data
+        session_data = self.sessions_cache.get(session_id)
+        if session_data is not None:
+            return session_data
+        
+        with self.session_lock(session_id):
+            # Otro hilo pudo cargarla mientras se esperaba el lock
+            session_data = self.sessions_cache.get(session_id)
+            if session_data is not None:
                 return session_data
+            
+            # Una sesión con cambios pendientes pudo salir del cache antes de escribirse
+            with self._dirty_lock:
+                pending = self._dirty.get(session_id)
+            if pending is not None:
+                self.sessions_cache.put(session_id, pending[0])
+                return pending[0]
+            
+            # Si no está en cache, buscar en el almacenamiento
+            try:
+                session_data = self.storage.load_session(session_id)
             except Exception as e:
                 print(f"[SESSION ERROR] Error al leer sesión {session_id}: {e}")
                 return None
-        
-        return None
+            
+            if session_data is None:
+                return None
+            
+            # Migrar datos antiguos si es necesario
+            if 'analyses' in session_data and 'conversations' not in session_data:
+                session_data = self._migrate_old_session(session_data)
+            
+            # Actualizar cache
+            self.sessions_cache.put(session_id, session_data)
+            return session_data
     
     def _migrate_old_session(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """Migrar sesiones del formato antiguo al nuevo"""
@@ -130,6 +265,38 @@ class SessionManager:
         session_data['conversations'] = conversations
         return session_data
     
+    def migrate_json_sessions(self) -> int:
+        """
+        Migrar los archivos session_<id>.json del directorio de sesiones al backend configurado.
+        Los archivos se dejan en su sitio (alguno está versionado) y el backend registra los ya
+        migrados: una sesión importada que luego expira no vuelve a importarse
+        
+        Returns:
+            int: Número de sesiones migradas
+        """
+        migrated = 0
+        already_migrated = self.storage.migrated_files()
+        session_files = [f for f in os.listdir(self.sessions_dir)
+                         if f.startswith('session_') and f.endswith('.json') and f not in already_migrated]
+        
+        for session_file in session_files:
+            session_path = os.path.join(self.sessions_dir, session_file)
+            try:
+                with open(session_path, 'r', encoding='utf-8') as f:
+                    session_data = json.load(f)
+                
+                if 'analyses' in session_data and 'conversations' not in session_data:
+                    session_data = self._migrate_old_session(session_data)
+                
+                self.storage.save_session(session_data, migrated_from=session_file)
+                migrated += 1
+            except Exception as e:
+                print(f"[SESSION MIGRATION ERROR] Error al migrar {session_file}: {e}")
+        
+        if migrated > 0:
+            print(f"[SESSION] {migrated} sesiones migradas a {self.storage.name}")
+        return migrated
+    
     def update_session_activity(self, session_id: str) -> bool:
         """
         Actualizar la última actividad de una sesión
@@ -140,24 +307,26 @@ class SessionManager:
         Returns:
             bool: True si se actualizó correctamente, False si no existe la sesión
         """
-        session_data = self.get_session(session_id)
-        if session_data is None:
-            return False
-        
-        session_data["last_activity"] = datetime.now().isoformat()
-        
-        # Actualizar archivo
-        session_file = self.get_session_file_path(session_id)
-        try:
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, indent=2, ensure_ascii=False)
+        with self.session_lock(session_id):
+            session_data = self.get_session(session_id)
+            if session_data is None:
+                return False
             
-            # Actualizar cache
-            self.sessions_cache[session_id] = session_data
-            return True
-        except Exception as e:
-            print(f"[SESSION ERROR] Error al actualizar actividad {session_id}: {e}")
-            return False
+            session_data["last_activity"] = datetime.now().isoformat()
+            
+            # Actualizar almacenamiento (agrupado con otras escrituras salvo en modo "sync")
+            try:
+                self._persist(session_data, [], immediate=self.write_mode == "sync")
+                
+                # Actualizar cache
+                self.sessions_cache.put(session_id, session_data, self.sessions_cache.size_of(session_id))
+                estadisticas.actividad_sesion(session_id, session_data["last_activity"])
+                return True
+            except Exception as e:
+                print(f"[SESSION ERROR] Error al actualizar actividad {session_id}: {e}")
+                # El cache ya no coincide con el almacenamiento: se recargará en la próxima lectura
+                self.sessions_cache.pop(session_id)
+                return False
     
     def add_conversation_to_session(self, session_id: str, user_text: str, user_images: list,
                                    resultados_analisis: list) -> bool:
@@ -173,11 +342,6 @@ class SessionManager:
         Returns:
             bool: True si se guardó correctamente
         """
-        session_data = self.get_session(session_id)
-        if session_data is None:
-            print(f"[SESSION ERROR] Sesión no encontrada: {session_id}")
-            return False
-        
         # Crear registro de la conversación completa
         conversation = {
             "conversation_id": str(uuid.uuid4()),
@@ -202,25 +366,39 @@ class SessionManager:
             }
             conversation["bot_responses"].append(bot_response)
         
-        # Agregar al historial de la sesión
-        session_data["conversations"].append(conversation)
-        session_data["total_images_analyzed"] += len(resultados_analisis)
-        session_data["last_activity"] = datetime.now().isoformat()
+        conversation_size = _estimate_size(conversation)
         
-        # Guardar en archivo
-        session_file = self.get_session_file_path(session_id)
-        try:
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, indent=2, ensure_ascii=False)
+        with self.session_lock(session_id):
+            session_data = self.get_session(session_id)
+            if session_data is None:
+                print(f"[SESSION ERROR] Sesión no encontrada: {session_id}")
+                return False
             
-            # Actualizar cache
-            self.sessions_cache[session_id] = session_data
+            # Agregar al historial de la sesión
+            session_data["conversations"].append(conversation)
+            session_data["total_images_analyzed"] += len(resultados_analisis)
+            session_data["last_activity"] = datetime.now().isoformat()
             
-            print(f"[SESSION] Conversación agregada a sesión {session_id}: {len(resultados_analisis)} análisis")
-            return True
-        except Exception as e:
-            print(f"[SESSION ERROR] Error al guardar conversación en sesión {session_id}: {e}")
-            return False
+            # Guardar en el almacenamiento (SQLite solo inserta la nueva conversación)
+            try:
+                self._persist(session_data, [conversation], immediate=self.write_mode != "deferred")
+                # Los blobs de las imágenes se conservan mientras exista la sesión
+                almacen_blobs.agregar_referencias((image.get("hash") for image in user_images),
+                                                  self._blob_owner(session_id))
+                
+                # Actualizar cache
+                cached_size = self.sessions_cache.size_of(session_id)
+                self.sessions_cache.put(session_id, session_data,
+                                        cached_size + conversation_size if cached_size is not None else None)
+                estadisticas.conversacion_agregada(session_data, conversation)
+                
+                print(f"[SESSION] Conversación agregada a sesión {session_id}: {len(resultados_analisis)} análisis")
+                return True
+            except Exception as e:
+                print(f"[SESSION ERROR] Error al guardar conversación en sesión {session_id}: {e}")
+                # El cache ya no coincide con el almacenamiento: se recargará en la próxima lectura
+                self.sessions_cache.pop(session_id)
+                return False
     
     def add_analysis_to_session(self, session_id: str, imagen_info: Dict, 
                                etiqueta: str, confianza: float, recomendacion: str) -> bool:
@@ -235,6 +413,65 @@ class SessionManager:
             [(imagen_info, etiqueta, confianza, recomendacion)]
         )
     
+    def _persist(self, session_data: Dict[str, Any], new_conversations: list, immediate: bool):
+        """
+        Escribir los cambios de una sesión ahora o dejarlos pendientes para el próximo flush.
+        Debe llamarse con el lock de la sesión tomado
+        """
+        session_id = session_data["session_id"]
+        with self._dirty_lock:
+            pending = self._dirty.pop(session_id, None)
+            if not immediate:
+                conversations = pending[1] if pending else []
+                self._dirty[session_id] = (session_data, conversations + new_conversations)
+                return
+        
+        # Una escritura inmediata incluye también los cambios pendientes de la sesión
+        conversations = (pending[1] if pending else []) + new_conversations
+        self.storage.write_changes(session_data, conversations)
+    
+    def flush(self) -> int:
+        """
+        Escribir todas las sesiones con cambios pendientes
+        
+        Returns:
+            int: Número de sesiones escritas
+        """
+        with self._dirty_lock:
+            session_ids = list(self._dirty)
+        
+        flushed = 0
+        for session_id in session_ids:
+            with self.session_lock(session_id):
+                with self._dirty_lock:
+                    pending = self._dirty.pop(session_id, None)
+                if pending is None:
+                    continue
+                session_data, conversations = pending
+                try:
+                    self.storage.write_changes(session_data, conversations)
+                    flushed += 1
+                except Exception as e:
+                    print(f"[SESSION FLUSH ERROR] Error al escribir sesión {session_id}: {e}")
+                    # Reintentar en el próximo flush
+                    with self._dirty_lock:
+                        self._dirty.setdefault(session_id, pending)
+        return flushed
+    
+    def start_flush_thread(self):
+        """Iniciar hilo que escribe periódicamente las sesiones pendientes"""
+        def flush_worker():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"[SESSION FLUSH ERROR] Error en escritura diferida: {e}")
+        
+        flush_thread = threading.Thread(target=flush_worker, daemon=True)
+        flush_thread.start()
+        print(f"[SESSION MANAGER] Escritura diferida activa - Modo: {self.write_mode}, Intervalo: {self.flush_interval}s")
+    
     def cleanup_old_sessions(self) -> int:
         """
         Eliminar sesiones antiguas basadas en la última actividad
@@ -242,53 +479,49 @@ class SessionManager:
         Returns:
             int: Número de sesiones eliminadas
         """
-        if not os.path.exists(self.sessions_dir):
-            return 0
+        # Persistir la actividad pendiente para no eliminar sesiones en uso
+        self.flush()
         
+        start = time.time()
         cutoff_time = datetime.now() - timedelta(hours=self.cleanup_hours)
-        sessions_removed = 0
-        
-        # Obtener todos los archivos de sesión
-        session_files = [f for f in os.listdir(self.sessions_dir) if f.startswith('session_') and f.endswith('.json')]
         
-        for session_file in session_files:
-            session_path = os.path.join(self.sessions_dir, session_file)
-            
-            try:
-                # Leer la sesión para verificar su última actividad
-                with open(session_path, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                
-                last_activity_str = session_data.get("last_activity")
-                if last_activity_str:
-                    last_activity = datetime.fromisoformat(last_activity_str)
-                    
-                    if last_activity < cutoff_time:
-                        # Eliminar sesión antigua
-                        os.remove(session_path)
-                        
-                        # Eliminar del cache si existe
-                        session_id = session_data.get("session_id")
-                        if session_id in self.sessions_cache:
-                            del self.sessions_cache[session_id]
-                        
-                        sessions_removed += 1
-                        print(f"[SESSION CLEANUP] Sesión eliminada: {session_id} (inactiva desde {last_activity_str})")
-                
-            except Exception as e:
-                print(f"[SESSION CLEANUP ERROR] Error al procesar {session_file}: {e}")
-                # Si hay error al leer el archivo, eliminarlo también
-                try:
-                    os.remove(session_path)
-                    sessions_removed += 1
-                except:
-                    pass
+        try:
+            removed = self.storage.delete_expired(cutoff_time)
+        except Exception as e:
+            print(f"[SESSION CLEANUP ERROR] Error al limpiar sesiones: {e}")
+            return 0
         
+        # Eliminar del cache si existen
+        for session_id in removed:
+            with self.session_lock(session_id):
+                self.sessions_cache.pop(session_id)
+        estadisticas.sesiones_eliminadas(removed)
+        rotacion_recomendaciones.olvidar_sesiones(removed)
+        
+        # Liberar los blobs de las sesiones eliminadas y borrar los que quedan sin referencias.
+        # Las imágenes anteriores al almacén de blobs no se borran: se comparten por nombre
+        # entre sesiones y el historial live, e incluyen las de ejemplo y calibración
+        almacen_blobs.liberar(self._blob_owner(session_id) for session_id in removed)
+        blobs_removed, bytes_freed = almacen_blobs.recolectar()
+        
+        sessions_removed = len(removed)
+        duration_ms = (time.time() - start) * 1000
+        self.last_cleanup = {
+            "timestamp": datetime.now().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "sessions_removed": sessions_removed,
+            "blobs_removed": blobs_removed,
+            "bytes_freed": bytes_freed
+        }
         if sessions_removed > 0:
-            print(f"[SESSION CLEANUP] {sessions_removed} sesiones eliminadas")
+            print(f"[SESSION CLEANUP] {sessions_removed} sesiones y {blobs_removed} blobs eliminados en {duration_ms:.0f}ms")
         
         return sessions_removed
     
+    @staticmethod
+    def _blob_owner(session_id: str) -> str:
+        return f"sesion:{session_id}"
+    
     def start_cleanup_thread(self):
         """Iniciar hilo de limpieza automática"""
         def cleanup_worker():
@@ -310,32 +543,40 @@ class SessionManager:
         Returns:
             Dict con estadísticas generales
         """
-        if not os.path.exists(self.sessions_dir):
-            return {"active_sessions": 0, "total_analyses": 0}
-        
-        session_files = [f for f in os.listdir(self.sessions_dir) if f.startswith('session_') and f.endswith('.json')]
-        
-        active_sessions = 0
-        total_analyses = 0
-        
-        for session_file in session_files:
-            session_path = os.path.join(self.sessions_dir, session_file)
-            try:
-                with open(session_path, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                
-                active_sessions += 1
-                total_analyses += session_data.get("total_images_analyzed", 0)
-                
-            except Exception as e:
-                print(f"[SESSION STATS ERROR] Error al leer {session_file}: {e}")
+        totals = estadisticas.resumen()
         
         return {
-            "active_sessions": active_sessions,
-            "total_analyses": total_analyses,
-            "cleanup_hours": self.cleanup_hours
+            "active_sessions": totals["active_sessions"],
+            "total_analyses": totals["total_analyses"],
+            "analyses_by_class": totals["clases_sesiones"],
+            "cleanup_hours": self.cleanup_hours,
+            "last_cleanup": self.last_cleanup
         }
     
+    def get_session_summaries(self) -> List[Dict[str, Any]]:
+        """
+        Obtener un resumen de cada sesión almacenada (sin conversaciones)
+        
+        Returns:
+            Lista de dicts con session_id, created, last_activity, total_conversations,
+            total_analyses y format
+        """
+        return estadisticas.detalles_sesiones()
+    
+    def rebuild_stats(self):
+        """Reconstruir los agregados de estadísticas desde el almacenamiento"""
+        start = time.time()
+        estadisticas.reconstruir_sesiones(self.storage.session_aggregates())
+        print(f"[SESSION STATS] Agregados reconstruidos en {(time.time()-start)*1000:.0f}ms")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Tamaño, tasa de aciertos y expulsiones del cache de sesiones"""
+        stats = self.sessions_cache.get_stats()
+        with self._dirty_lock:
+            stats["dirty_sessions"] = len(self._dirty)
+        stats["write_mode"] = self.write_mode
+        return stats
+    
     def force_cleanup(self) -> int:
         """
         Forzar limpieza inmediata de sesiones antiguas
@@ -343,4 +584,15 @@ class SessionManager:
         Returns:
             int: Número de sesiones eliminadas
         """
-        return self.cleanup_old_sessions()
\ No newline at end of file
+        return self.cleanup_old_sessions()
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+def get_session_manager() -> SessionManager:
+    """Obtener el SessionManager compartido por todo el proceso (se crea en el primer uso)"""
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = SessionManager(sessions_dir=SESSIONS_DIR, cleanup_hours=SESSION_CLEANUP_HOURS)
+        return _shared_manager
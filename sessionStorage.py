@@ -0,0 +1,357 @@
+# sessionStorage.py - Backends de almacenamiento para SessionManager
+import os
+import json
+import heapq
+import sqlite3
+import threading
+from datetime import datetime
+from collections import Counter
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from estadisticas import resumir_sesion
+
+def _timestamp(iso: Optional[str]) -> float:
+    """Convertir una fecha ISO a epoch (0 si no es válida)"""
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+def session_images(session_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Información de las imágenes enviadas en una sesión (formato nuevo y antiguo)"""
+    images = []
+    for conversation in session_data.get("conversations", []):
+        images.extend(conversation.get("user_message", {}).get("images", []))
+    for analysis in session_data.get("analyses", []):
+        if analysis.get("imagen"):
+            images.append(analysis["imagen"])
+    return images
+
+class ExpiryIndex:
+    """
+    Min-heap de (last_activity_ts, session_id) con borrado perezoso: cada actualización
+    agrega una entrada nueva y las obsoletas se descartan al salir del heap
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._current = {}  # session_id -> último timestamp registrado
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def touch(self, session_id: str, timestamp: float):
+        with self._lock:
+            self._current[session_id] = timestamp
+            heapq.heappush(self._heap, (timestamp, session_id))
+            # Compactar cuando las entradas obsoletas dominan el heap
+            if len(self._heap) > 2 * len(self._current) + 1024:
+                self._heap = [(ts, sid) for sid, ts in self._current.items()]
+                heapq.heapify(self._heap)
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._current.pop(session_id, None)
+
+    def pop_expired(self, cutoff_ts: float) -> List[str]:
+        """Sacar del índice las sesiones cuya última actividad es anterior a cutoff_ts"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < cutoff_ts:
+                timestamp, session_id = heapq.heappop(self._heap)
+                if self._current.get(session_id) == timestamp:
+                    del self._current[session_id]
+                    expired.append(session_id)
+        return expired
+
+class JsonSessionStorage:
+    """Un archivo JSON por sesión (formato original); cada escritura reescribe la sesión completa"""
+
+    name = "json"
+
+    def __init__(self, sessions_dir: str):
+        self.sessions_dir = sessions_dir
+        os.makedirs(self.sessions_dir, exist_ok=True)
+
+        # Índice de expiración reconstruido a partir del mtime de cada archivo (sin parsearlos)
+        self.expiry_index = ExpiryIndex()
+        for session_file in self._session_files():
+            try:
+                mtime = os.path.getmtime(os.path.join(self.sessions_dir, session_file))
+            except OSError:
+                continue
+            self.expiry_index.touch(session_file[len('session_'):-len('.json')], mtime)
+
+    def get_session_file_path(self, session_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"session_{session_id}.json")
+
+    def _session_files(self) -> List[str]:
+        if not os.path.exists(self.sessions_dir):
+            return []
+        return [f for f in os.listdir(self.sessions_dir) if f.startswith('session_') and f.endswith('.json')]
+
+    def save_session(self, session_data: Dict[str, Any]):
+        session_file = self.get_session_file_path(session_data["session_id"])
+        with open(session_file, 'w', encoding='utf-8') as f:
+            json.dump(session_data, f, indent=2, ensure_ascii=False)
+        self.expiry_index.touch(session_data["session_id"], _timestamp(session_data.get("last_activity")))
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session_file = self.get_session_file_path(session_id)
+        if not os.path.exists(session_file):
+            return None
+        with open(session_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_changes(self, session_data: Dict[str, Any], new_conversations: List[Dict[str, Any]]):
+        """Persistir actividad y conversaciones nuevas (en JSON se reescribe la sesión completa)"""
+        self.save_session(session_data)
+
+    def delete_session(self, session_id: str):
+        session_file = self.get_session_file_path(session_id)
+        if os.path.exists(session_file):
+            os.remove(session_file)
+        self.expiry_index.remove(session_id)
+
+    def delete_expired(self, cutoff: datetime) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Eliminar sesiones con última actividad anterior a cutoff. Solo se abren los archivos
+        que el índice de expiración marca como vencidos
+
+        Returns:
+            Dict session_id -> imágenes enviadas en la sesión eliminada
+        """
+        removed = {}
+        for session_id in self.expiry_index.pop_expired(cutoff.timestamp()):
+            session_path = self.get_session_file_path(session_id)
+            try:
+                with open(session_path, 'r', encoding='utf-8') as f:
+                    session_data = json.load(f)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                # Archivo vencido (por mtime) e ilegible: se elimina sin imágenes asociadas
+                print(f"[SESSION CLEANUP ERROR] Error al leer {session_path}: {e}")
+                session_data = None
+
+            if session_data is not None:
+                last_activity_str = session_data.get("last_activity")
+                last_activity_ts = _timestamp(last_activity_str)
+                if last_activity_ts >= cutoff.timestamp():
+                    # El mtime no reflejaba la actividad real: reindexar
+                    self.expiry_index.touch(session_id, last_activity_ts)
+                    continue
+
+            try:
+                os.remove(session_path)
+            except OSError as e:
+                print(f"[SESSION CLEANUP ERROR] Error al eliminar {session_path}: {e}")
+                continue
+            removed[session_id] = session_images(session_data) if session_data else []
+            print(f"[SESSION CLEANUP] Sesión eliminada: {session_id}")
+        return removed
+
+    def iter_sessions(self) -> Iterator[Dict[str, Any]]:
+        """Recorrer todas las sesiones almacenadas (para reconstruir estadísticas)"""
+        for session_file in self._session_files():
+            session_path = os.path.join(self.sessions_dir, session_file)
+            try:
+                with open(session_path, 'r', encoding='utf-8') as f:
+                    yield json.load(f)
+            except Exception as e:
+                print(f"[SESSION STATS ERROR] Error al leer {session_file}: {e}")
+
+    def session_aggregates(self) -> Iterator[Tuple[Dict[str, Any], Counter]]:
+        """Resumen y conteo de materiales de cada sesión (requiere leer cada archivo)"""
+        for session_data in self.iter_sessions():
+            yield resumir_sesion(session_data)
+
+class SqliteSessionStorage:
+    """
+    Sesiones en SQLite: cada conversación es una fila y last_activity es una columna indexada,
+    de modo que agregar una conversación es O(1) y la limpieza es un DELETE por índice
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created TEXT,
+                    last_activity TEXT,
+                    last_activity_ts REAL NOT NULL,
+                    total_images_analyzed INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity_ts);
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id);
+                CREATE TABLE IF NOT EXISTS migrated_files (
+                    file_name TEXT PRIMARY KEY
+                );
+            """)
+            self._conn.commit()
+
+    def migrated_files(self) -> set:
+        """Archivos JSON ya migrados (se conservan en disco; no se vuelven a importar)"""
+        with self._lock:
+            return {name for (name,) in self._conn.execute("SELECT file_name FROM migrated_files")}
+
+    def save_session(self, session_data: Dict[str, Any], migrated_from: Optional[str] = None):
+        """
+        Guardar la sesión completa (creación y migración)
+
+        Args:
+            session_data: Sesión con sus conversaciones
+            migrated_from: Archivo JSON de origen; se registra en la misma transacción
+        """
+        session_id = session_data["session_id"]
+        with self._lock, self._conn:
+            if migrated_from:
+                self._conn.execute("INSERT OR IGNORE INTO migrated_files (file_name) VALUES (?)", (migrated_from,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, created, last_activity, last_activity_ts, total_images_analyzed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, session_data.get("created"), session_data.get("last_activity"),
+                 _timestamp(session_data.get("last_activity")), session_data.get("total_images_analyzed", 0))
+            )
+            self._conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT INTO conversations (session_id, data) VALUES (?, ?)",
+                [(session_id, json.dumps(c, ensure_ascii=False)) for c in session_data.get("conversations", [])]
+            )
+
+    def load_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created, last_activity, total_images_analyzed FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conversations = [json.loads(data) for (data,) in self._conn.execute(
+                "SELECT data FROM conversations WHERE session_id = ? ORDER BY id", (session_id,)
+            )]
+        return {
+            "session_id": session_id,
+            "created": row[0],
+            "last_activity": row[1],
+            "total_images_analyzed": row[2],
+            "conversations": conversations
+        }
+
+    def write_changes(self, session_data: Dict[str, Any], new_conversations: List[Dict[str, Any]]):
+        """Insertar las conversaciones nuevas y actualizar los metadatos en una sola transacción"""
+        session_id = session_data["session_id"]
+        with self._lock, self._conn:
+            if new_conversations:
+                self._conn.executemany(
+                    "INSERT INTO conversations (session_id, data) VALUES (?, ?)",
+                    [(session_id, json.dumps(c, ensure_ascii=False)) for c in new_conversations]
+                )
+            self._conn.execute(
+                "UPDATE sessions SET last_activity = ?, last_activity_ts = ?, total_images_analyzed = ? WHERE session_id = ?",
+                (session_data["last_activity"], _timestamp(session_data["last_activity"]),
+                 session_data["total_images_analyzed"], session_id)
+            )
+
+    def delete_session(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def delete_expired(self, cutoff: datetime) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Eliminar sesiones con última actividad anterior a cutoff (consulta por índice)
+
+        Returns:
+            Dict session_id -> imágenes enviadas en la sesión eliminada
+        """
+        cutoff_ts = cutoff.timestamp()
+        with self._lock, self._conn:
+            removed = {session_id: [] for (session_id,) in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_activity_ts < ?", (cutoff_ts,)
+            )}
+            for session_id in removed:
+                for (data,) in self._conn.execute(
+                    "SELECT data FROM conversations WHERE session_id = ?", (session_id,)
+                ):
+                    removed[session_id].extend(json.loads(data).get("user_message", {}).get("images", []))
+            if removed:
+                self._conn.executemany("DELETE FROM conversations WHERE session_id = ?", [(s,) for s in removed])
+                self._conn.execute("DELETE FROM sessions WHERE last_activity_ts < ?", (cutoff_ts,))
+        return removed
+
+    def iter_sessions(self) -> Iterator[Dict[str, Any]]:
+        """Recorrer todas las sesiones almacenadas (para reconstruir estadísticas)"""
+        with self._lock:
+            session_ids = [session_id for (session_id,) in self._conn.execute("SELECT session_id FROM sessions")]
+        for session_id in session_ids:
+            session_data = self.load_session(session_id)
+            if session_data is not None:
+                yield session_data
+
+    def session_aggregates(self) -> Iterator[Tuple[Dict[str, Any], Counter]]:
+        """
+        Resumen y conteo de materiales de cada sesión calculados con agregados SQL,
+        sin cargar las conversaciones en memoria
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT s.session_id, s.created, s.last_activity, s.total_images_analyzed, COUNT(c.id)
+                FROM sessions s LEFT JOIN conversations c ON c.session_id = s.session_id
+                GROUP BY s.session_id
+            """).fetchall()
+            # bot_responses en el formato nuevo; bot_response en conversaciones migradas
+            label_rows = self._conn.execute("""
+                SELECT c.session_id, json_extract(r.value, '$.resultado.etiqueta') AS etiqueta, COUNT(*)
+                FROM conversations c, json_each(c.data, '$.bot_responses') r
+                WHERE etiqueta IS NOT NULL
+                GROUP BY c.session_id, etiqueta
+                UNION ALL
+                SELECT session_id, json_extract(data, '$.bot_response.resultado.etiqueta') AS etiqueta, COUNT(*)
+                FROM conversations
+                WHERE json_type(data, '$.bot_responses') IS NULL AND etiqueta IS NOT NULL
+                GROUP BY session_id, etiqueta
+            """).fetchall()
+
+        labels = {}
+        for session_id, etiqueta, count in label_rows:
+            labels.setdefault(session_id, Counter())[etiqueta] += count
+        for session_id, created, last_activity, total_analyses, total_conversations in rows:
+            yield {
+                "session_id": session_id,
+                "created": created,
+                "last_activity": last_activity,
+                "total_conversations": total_conversations,
+                "total_analyses": total_analyses,
+                "format": "nuevo"
+            }, labels.get(session_id, Counter())
+
+def create_session_storage(backend: str, sessions_dir: str, db_path: Optional[str] = None):
+    """
+    Crear el backend de almacenamiento de sesiones
+
+    Args:
+        backend: "sqlite" o "json"
+        sessions_dir: Directorio de sesiones (backend JSON y origen de la migración)
+        db_path: Archivo de base de datos para el backend SQLite
+    """
+    if backend == "sqlite":
+        return SqliteSessionStorage(db_path or os.path.join(sessions_dir, "sessions.sqlite"))
+    if backend == "json":
+        return JsonSessionStorage(sessions_dir)
+    raise ValueError(f"Backend de sesiones no soportado: {backend}")
@@ -8,13 +8,29 @@ export class LiveAnalyzer {
 
     processAnalysis(url) {
         console.log("Procesando análisis para:", url);
+
+        // El servidor encola el trabajo; el resultado llega por Socket.IO a este cliente
+        const params = new URLSearchParams({ url });
+        const socketId = this.socketManager && this.socketManager.getId();
+        if (socketId) {
+            params.append('socket_id', socketId);
+        }
         
-        fetch(`/analizar_url?url=${encodeURIComponent(url)}`)
-            .then(response => response.json())
+        fetch(`/analizar_url?${params.toString()}`)
+            .then(response => {
+                if (response.status === 429) {
+                    throw new Error('Servidor ocupado, intenta de nuevo en unos segundos');
+                }
+                return response.json();
+            })
             .then(data => {
                 console.log("Respuesta del servidor:", data);
                 if (data.error) {
                     this.uiManager.showError(data.error);
+                } else if (data.job_id && !socketId) {
+                    // Sin socket: consultar el estado del trabajo hasta que termine
+                    this.uiManager.showAnalyzingState();
+                    this.esperarTrabajo(data.job_id);
                 } else if (!data.inicio_analisis) {
                     // Si no hay indicación de inicio_analisis, mostrar resultado directamente
                     console.log("Mostrando resultado directo");
@@ -24,6 +40,25 @@ export class LiveAnalyzer {
             })
             .catch(err => {
                 console.error("Error en fetch:", err);
+                this.uiManager.showError(err.message || 'Error al procesar la imagen');
+            });
+    }
+
+    esperarTrabajo(jobId, intervalo = 500) {
+        fetch(`/analizar_url/${jobId}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.estado === 'completado') {
+                    const r = data.resultado;
+                    this.uiManager.mostrarImagen(r.miniatura || r.url, r.etiqueta, r.confianza);
+                } else if (data.estado === 'error' || data.error) {
+                    this.uiManager.showError(data.error);
+                } else {
+                    setTimeout(() => this.esperarTrabajo(jobId, intervalo), intervalo);
+                }
+            })
+            .catch(err => {
+                console.error("Error al consultar el trabajo:", err);
                 this.uiManager.showError('Error al procesar la imagen');
             });
     }
@@ -1,7 +1,17 @@
 // socketManager.js
+
+// Formato compacto: nombre corto -> [evento completo, campos en orden] (ver eventos_live.py)
+const EVENTOS_COMPACTOS = {
+    ia: ['inicio_analisis', ['job_id']],
+    ni: ['nueva_imagen', ['job_id', 'url', 'etiqueta', 'confianza', 'miniatura']],
+    ae: ['analisis_error', ['job_id', 'error']]
+};
+
 export class SocketManager {
     constructor(uiManager, liveAnalyzer) {
-        this.socket = io();
+        // Eventos en formato compacto; solo llegan los de los trabajos enviados por este
+        // cliente salvo que se suscriba a un canal con suscribir()
+        this.socket = io({ query: { formato: 'compacto' } });
         this.uiManager = uiManager;
         this.liveAnalyzer = liveAnalyzer;
         this.socketConnected = false;
@@ -31,22 +41,39 @@ export class SocketManager {
             }
         });
 
-        // Evento cuando comienza el análisis (desde el backend)
-        this.socket.on("inicio_analisis", () => {
-            console.log("Recibido evento inicio_analisis del backend");
-            this.uiManager.showAnalyzingState();
-        });
+        // Los manejadores confirman cada evento (ack) para que el servidor envíe el siguiente
+        const manejadores = {
+            // Evento cuando comienza el análisis (desde el backend)
+            inicio_analisis: () => {
+                console.log("Recibido evento inicio_analisis del backend");
+                this.uiManager.showAnalyzingState();
+            },
+            // Evento cuando se completa el análisis
+            nueva_imagen: (data) => {
+                console.log("Recibido evento nueva_imagen", data);
+                this.uiManager.mostrarImagen(data.miniatura || data.url, data.etiqueta, data.confianza);
+            },
+            // Evento para errores de análisis
+            analisis_error: (data) => {
+                console.log("Recibido evento analisis_error", data);
+                this.uiManager.showError(data.error);
+            }
+        };
 
-        // Evento cuando se completa el análisis
-        this.socket.on("nueva_imagen", (data) => {
-            console.log("Recibido evento nueva_imagen", data);
-            this.uiManager.mostrarImagen(data.url, data.etiqueta, data.confianza);
+        Object.entries(manejadores).forEach(([evento, manejador]) => {
+            this.socket.on(evento, (data, ack) => {
+                manejador(data || {});
+                if (typeof ack === 'function') ack();
+            });
         });
 
-        // Evento para errores de análisis
-        this.socket.on("analisis_error", (data) => {
-            console.log("Recibido evento analisis_error", data);
-            this.uiManager.showError(data.error);
+        Object.entries(EVENTOS_COMPACTOS).forEach(([corto, [evento, campos]]) => {
+            this.socket.on(corto, (valores, ack) => {
+                const data = {};
+                campos.forEach((campo, i) => { data[campo] = valores[i]; });
+                manejadores[evento](data);
+                if (typeof ack === 'function') ack();
+            });
         });
     }
 
@@ -54,6 +81,17 @@ export class SocketManager {
         return this.socketConnected;
     }
 
+    getId() {
+        return this.socketConnected ? this.socket.id : null;
+    }
+
+    // Recibir también los eventos de los trabajos de otros clientes (p. ej. 'live')
+    suscribir(canal) {
+        return new Promise((resolve) => {
+            this.socket.emit('suscribir', { canal }, (respuesta) => resolve(respuesta && respuesta.ok));
+        });
+    }
+
     emit(event, data) {
         this.socket.emit(event, data);
     }
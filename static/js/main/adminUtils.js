@@ -130,7 +130,7 @@ export class AdminUtils {
         
         // Verificar historial live
         try {
-            const response = await fetch('/historial_live');
+            const response = await fetch('/historial_live?limite=1');
             if (response.ok) {
                 const live = await response.json();
                 console.log('📡 HISTORIAL LIVE:', `${live.total_images_analyzed} imágenes analizadas`);
@@ -3,7 +3,18 @@ export class BackendService {
     constructor() {
         this.baseUrl = '/';
         this.sessionId = null;
+        this.socket = null;
         this.initializeSession();
+        this.initializeSocket();
+    }
+
+    initializeSocket() {
+        // Socket opcional: si el cliente de socket.io no está cargado se usa solo la respuesta HTTP
+        if (typeof io === 'undefined') return;
+        this.socket = io();
+        this.socket.on('connect', () => {
+            console.log('[SOCKET] Conectado para resultados por imagen:', this.socket.id);
+        });
     }
 
     async initializeSession() {
@@ -58,22 +69,51 @@ export class BackendService {
         }
     }
 
-    async sendImages(images, userText = '') {
+    async sendImages(images, userText = '', onResultadoImagen = null) {
         // Asegurar que tenemos una sesión
         if (!this.sessionId) {
             await this.initializeSession();
         }
 
         const formData = this.createFormData(images, userText);
-        
-        const response = await fetch(this.baseUrl, {
-            method: 'POST',
-            headers: { 
-                'X-Requested-With': 'XMLHttpRequest',
-                'X-Session-ID': this.sessionId 
-            },
-            body: formData
-        });
+
+        // Recibir cada resultado por socket en cuanto el servidor lo tiene listo. Varios
+        // mensajes pueden estar en curso en el mismo socket: se filtra por request_id
+        const streaming = onResultadoImagen && this.socket && this.socket.connected;
+        const requestId = Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+        const alResultadoImagen = (data) => {
+            if (data && data.request_id === requestId) onResultadoImagen(data);
+        };
+        const dejarDeEscuchar = () => {
+            this.socket.off('resultado_imagen', alResultadoImagen);
+            this.socket.off('resultado_final', alResultadoFinal);
+        };
+        // resultado_final cierra el flujo de este mensaje (la respuesta HTTP trae el contenido)
+        const alResultadoFinal = (data) => {
+            if (data && data.request_id === requestId) dejarDeEscuchar();
+        };
+        if (streaming) {
+            formData.append('socket_id', this.socket.id);
+            formData.append('request_id', requestId);
+            this.socket.on('resultado_imagen', alResultadoImagen);
+            this.socket.on('resultado_final', alResultadoFinal);
+        }
+
+        let response;
+        try {
+            response = await fetch(this.baseUrl, {
+                method: 'POST',
+                headers: { 
+                    'X-Requested-With': 'XMLHttpRequest',
+                    'X-Session-ID': this.sessionId 
+                },
+                body: formData
+            });
+        } finally {
+            if (streaming) {
+                dejarDeEscuchar();  // También si la petición falla sin resultado_final
+            }
+        }
 
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
@@ -88,7 +128,7 @@ export class BackendService {
             console.log('[SESSION] ID de sesión actualizado:', this.sessionId);
         }
         
-        return { resultado: json.resultado };
+        return { resultado: json.resultado, metricas: json.metricas };
     }
 
     createFormData(images, userText = '') {
@@ -4,6 +4,7 @@ import { bindChatEvents } from './chatEvents.js';
 import { addUserMessage, addBotMessage, showCancelButton, showSendButton } from './chatUI.js';
 import { ImageHandler } from './imageHandler.js';
 import { TypingAnimation } from './typingAnimation.js';
+import { scrollToBottom } from './chatHelpers.js';
 import { BackendService } from './backendService.js';
 import { ImageModal } from './imageModal.js';
 
@@ -86,6 +87,11 @@ export class ChatBot {
         }
     }
 
+    // Miniatura servida por /miniatura para las imágenes del almacén de blobs
+    urlMiniatura(img) {
+        return img.hash ? `/miniatura/${img.hash}?t=320` : img.url_relativa;
+    }
+
     convertirImagenesUsuario(imagenes) {
         if (!imagenes || imagenes.length === 0) return [];
 
@@ -93,13 +99,15 @@ export class ChatBot {
             if (img.tipo === 'archivo_subido') {
                 return {
                     type: 'file',
-                    preview: img.url_relativa,
+                    preview: this.urlMiniatura(img),
+                    full: img.url_relativa,
                     name: img.filename
                 };
             } else if (img.tipo === 'url_externa') {
                 return {
                     type: 'url',
-                    preview: img.url_relativa,
+                    preview: this.urlMiniatura(img),
+                    full: img.url_relativa,
                     url: img.url_original,
                     name: img.filename
                 };
@@ -123,7 +131,8 @@ export class ChatBot {
                 if (img.tipo === 'archivo_subido' || img.tipo === 'url_externa') {
                     imagenes.push({
                         type: img.tipo === 'url_externa' ? 'url' : 'file',
-                        preview: img.url_relativa,
+                        preview: this.urlMiniatura(img),
+                        full: img.url_relativa,
                         name: img.filename
                     });
                 } else if (img.tipo === 'ruta_local') {
@@ -261,7 +270,9 @@ export class ChatBot {
 
         try {
             // NUEVO: Enviar también el texto del usuario al backend
-            const response = await this.backendService.sendImages(imagesToSend, cleanText);
+            // Mostrar cada imagen clasificada mientras llegan las demás
+            const mostrarResultadoImagen = (data) => this.mostrarResultadoParcial(typingDiv, data);
+            const response = await this.backendService.sendImages(imagesToSend, cleanText, mostrarResultadoImagen);
             typingDiv.remove();
             showCancelButton(this, true);
             addBotMessage(this, response.resultado, [], false, true);
@@ -270,7 +281,8 @@ export class ChatBot {
             console.log('[CHATBOT] Mensaje enviado:', {
                 texto_usuario: cleanText,
                 imagenes: imagesToSend.length,
-                session_id: this.backendService.getSessionId()
+                session_id: this.backendService.getSessionId(),
+                metricas: response.metricas
             });
             
         } catch (error) {
@@ -282,6 +294,25 @@ export class ChatBot {
         }
     }
 
+    // Agregar el resultado de una imagen al mensaje de carga
+    mostrarResultadoParcial(typingDiv, data) {
+        const contenedor = typingDiv.querySelector('.message-text');
+        if (!contenedor) return;
+
+        const loadingText = typingDiv.querySelector('.loading-text');
+        if (loadingText) {
+            loadingText.textContent = `Analizando con IA... (${data.indice + 1}/${data.total})`;
+        }
+
+        const linea = document.createElement('div');
+        linea.className = 'resultado-parcial';
+        linea.textContent = data.error
+            ? `Imagen ${data.indice + 1}: ${data.error}`
+            : `Imagen ${data.indice + 1}: ${data.etiqueta} (${(data.confianza * 100).toFixed(1)}%)`;
+        contenedor.appendChild(linea);
+        scrollToBottom(this.chatMessages);
+    }
+
     // Método para reiniciar conversación (crear nueva sesión)
     async reiniciarConversacion() {
         try {
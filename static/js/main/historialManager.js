@@ -38,9 +38,17 @@ export class HistorialManager {
         }
     }
 
-    static async obtenerHistorialLive() {
+    // opciones: { limite, cursor, desde, hasta, etiqueta } - sin limite se recibe todo el historial
+    static async obtenerHistorialLive(opciones = {}) {
         try {
-            const response = await fetch('/historial_live');
+            const params = new URLSearchParams();
+            Object.entries(opciones).forEach(([clave, valor]) => {
+                if (valor !== undefined && valor !== null && valor !== '') {
+                    params.append(clave, valor);
+                }
+            });
+            const query = params.toString();
+            const response = await fetch(query ? `/historial_live?${query}` : '/historial_live');
             if (response.ok) {
                 const historial = await response.json();
                 return historial;
@@ -97,7 +97,7 @@ export class ImageHandler {
                     <div class="message-image-container">
                         <span class="image-number">${index + 1}</span>
                         <img src="${img.preview}" class="message-image" alt="${img.name || 'Imagen'}" 
-                             onclick="ChatBot.openImage('${img.preview}')">
+                             onclick="ChatBot.openImage('${img.full || img.preview}')">
                     </div>
                 `).join('')}
             </div>`;
@@ -105,7 +105,7 @@ export class ImageHandler {
             return `<div class="message-images">
                 ${orderedImages.map(img => `
                     <img src="${img.preview}" class="message-image" alt="${img.name || 'Imagen'}" 
-                         onclick="ChatBot.openImage('${img.preview}')">
+                         onclick="ChatBot.openImage('${img.full || img.preview}')">
                 `).join('')}
             </div>`;
         }
@@ -0,0 +1,95 @@
+# test_descargador.py - DescargadorImagenes contra un servidor HTTP local
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from descargador import DescargadorImagenes, ErrorDescarga
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 200
+
+class _Manejador(BaseHTTPRequestHandler):
+    # ruta -> (content_type, cuerpo, declarar Content-Length)
+    respuestas = {
+        "/imagen.png": ("image/png", PNG, True),
+        "/pagina.html": ("text/html", b"<html></html>", True),
+        "/falsa.png": ("image/png", b"<html>no soy una imagen</html>", True),
+        "/grande_declarada.png": ("image/png", PNG * 100, True),
+        "/grande_sin_longitud.png": ("image/png", PNG * 100, False),
+    }
+    en_curso = 0
+    max_en_curso = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.startswith("/lenta"):
+            with self.lock:
+                type(self).en_curso += 1
+                type(self).max_en_curso = max(self.max_en_curso, self.en_curso)
+            time.sleep(0.2)
+            with self.lock:
+                type(self).en_curso -= 1
+            content_type, cuerpo, declarar = "image/png", PNG, True
+        else:
+            content_type, cuerpo, declarar = self.respuestas[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if declarar:
+            self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente cortó la descarga
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def servidor():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Manejador)
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_descarga_imagen(servidor):
+    assert DescargadorImagenes(timeout=5).descargar(servidor + "/imagen.png") == PNG
+
+def test_rechaza_content_type(servidor):
+    with pytest.raises(ErrorDescarga, match="no es una imagen"):
+        DescargadorImagenes(timeout=5).descargar(servidor + "/pagina.html")
+
+def test_rechaza_magic_bytes(servidor):
+    with pytest.raises(ErrorDescarga, match="formato de imagen"):
+        DescargadorImagenes(timeout=5).descargar(servidor + "/falsa.png")
+
+@pytest.mark.parametrize("ruta", ["/grande_declarada.png", "/grande_sin_longitud.png"])
+def test_corta_al_superar_max_bytes(servidor, ruta):
+    descargador = DescargadorImagenes(timeout=5, max_bytes=1024)
+    with pytest.raises(ErrorDescarga, match="tamaño máximo"):
+        descargador.descargar(servidor + ruta)
+
+def test_limite_por_host(servidor):
+    _Manejador.en_curso = _Manejador.max_en_curso = 0
+    descargador = DescargadorImagenes(timeout=5, max_por_host=2, max_concurrentes=8)
+    errores = []
+
+    def descargar(i):
+        try:
+            descargador.descargar(f"{servidor}/lenta{i}.png")
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=descargar, args=(i,)) for i in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert not errores
+    assert _Manejador.max_en_curso == 2
+    # Sin descargas activas no queda estado por host
+    assert descargador._semaforos == {}
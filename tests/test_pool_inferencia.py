@@ -0,0 +1,70 @@
+# test_pool_inferencia.py - PoolInferenciaProcesos con trabajadores reales y un modelo falso
+import threading
+
+import numpy as np
+import pytest
+
+from config import TAMAÑO_IMAGEN, CLASES
+from pool_inferencia import PoolInferenciaProcesos
+
+def _lote(clases):
+    lote = np.zeros((len(clases), *TAMAÑO_IMAGEN, 3), dtype=np.float32)
+    lote[:, 0, 0, 0] = clases
+    return lote
+
+@pytest.fixture
+def pool():
+    pool = PoolInferenciaProcesos(2, hilos_por_proceso=1, max_lote=4, fijar_cpus=False,
+                                  modulo_modelo="tests.modelo_falso")
+    yield pool
+    pool.cerrar()
+
+def test_ejecuta_y_divide_lotes(pool):
+    clases = [i % len(CLASES) for i in range(10)]
+    salida = pool(_lote(clases))
+    assert salida.shape == (10, len(CLASES))
+    assert salida.argmax(axis=1).tolist() == clases
+
+def test_reemplaza_trabajador_caido(pool):
+    muerto = pool._trabajadores[0]
+    muerto.proceso.kill()
+    muerto.proceso.wait()
+
+    # Cada lote pasa por los dos trabajadores; el caído se reinicia sin perder el lote
+    for _ in range(4):
+        assert pool(_lote([1, 2])).argmax(axis=1).tolist() == [1, 2]
+
+    stats = pool.get_stats()
+    assert stats["reinicios"] == 1
+    assert stats["libres"] == 2
+    assert muerto not in pool._trabajadores
+    assert all(t.proceso.poll() is None for t in pool._trabajadores)
+
+def test_libera_esperas_sin_trabajadores():
+    pool = PoolInferenciaProcesos(1, hilos_por_proceso=1, max_lote=4, fijar_cpus=False,
+                                  modulo_modelo="tests.modelo_falso")
+    try:
+        # Ocupar el único trabajador para que la petición quede esperando uno libre
+        ocupado = pool._libres.get()
+        errores = []
+
+        def peticion():
+            try:
+                pool(_lote([1]))
+            except RuntimeError as e:
+                errores.append(e)
+
+        hilo = threading.Thread(target=peticion)
+        hilo.start()
+
+        # El reinicio falla: el pool se queda sin trabajadores
+        ocupado.modulo_modelo = "tests.modelo_inexistente"
+        assert pool._reemplazar(ocupado) is None
+        hilo.join(timeout=10)
+
+        assert not hilo.is_alive()
+        assert len(errores) == 1
+        with pytest.raises(RuntimeError):
+            pool(_lote([1]))
+    finally:
+        pool.cerrar()
@@ -0,0 +1,145 @@
+# trabajos.py - Cola acotada de trabajos en segundo plano con consulta de estado
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from config import LIVE_TRABAJOS_HILOS, LIVE_TRABAJOS_MAX_COLA, LIVE_TRABAJOS_RETENCION_SEGUNDOS
+
+class ColaLlena(Exception):
+    pass
+
+class Trabajo:
+    def __init__(self, funcion: Callable, args: tuple, sid: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.funcion = funcion
+        self.args = args
+        self.sid = sid  # Sala del cliente que envió el trabajo
+        self.estado = "en_cola"
+        self.etapa = None
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.iniciado = None
+        self.terminado = None
+
+    def avanzar(self, etapa: str):
+        """Registrar la etapa en curso (visible en la consulta de estado)"""
+        self.etapa = etapa
+
+    def to_dict(self) -> Dict[str, Any]:
+        datos = {
+            "job_id": self.id,
+            "estado": self.estado,
+            "etapa": self.etapa,
+            "creado": self.creado
+        }
+        if self.iniciado is not None:
+            datos["espera_ms"] = round((self.iniciado - self.creado) * 1000, 1)
+        if self.terminado is not None:
+            datos["duracion_ms"] = round((self.terminado - self.iniciado) * 1000, 1)
+        if self.resultado is not None:
+            datos["resultado"] = self.resultado
+        if self.error is not None:
+            datos["error"] = self.error
+        return datos
+
+class ColaTrabajos:
+    def __init__(self, hilos=2, max_cola=32, retencion_segundos=600):
+        """
+        Trabajos procesados por un número fijo de hilos; la petición solo encola
+
+        Args:
+            hilos: Trabajos ejecutándose a la vez
+            max_cola: Trabajos pendientes admitidos; por encima se rechazan (ColaLlena)
+            retencion_segundos: Tiempo que se conserva el estado de un trabajo terminado
+        """
+        self.cola = queue.Queue(maxsize=max_cola)
+        self.max_cola = max_cola
+        self.retencion = retencion_segundos
+        self._trabajos = OrderedDict()  # job_id -> Trabajo, en orden de creación
+        self._lock = threading.Lock()
+        self.completados = 0
+        self.fallidos = 0
+        self.rechazados = 0
+
+        for i in range(hilos):
+            threading.Thread(target=self._trabajar, name=f"trabajos-{i}", daemon=True).start()
+
+    def encolar(self, funcion: Callable, *args, sid: Optional[str] = None) -> Trabajo:
+        """
+        Encolar un trabajo sin esperar a que se ejecute
+
+        Args:
+            funcion: Recibe el Trabajo y los args; su valor de retorno es el resultado
+            sid: Sala Socket.IO del cliente que lo envía
+
+        Returns:
+            El Trabajo creado
+
+        Raises:
+            ColaLlena: Si ya hay max_cola trabajos pendientes
+        """
+        trabajo = Trabajo(funcion, args, sid)
+        with self._lock:
+            self._purgar()
+            self._trabajos[trabajo.id] = trabajo
+        try:
+            self.cola.put_nowait(trabajo)
+        except queue.Full:
+            with self._lock:
+                self._trabajos.pop(trabajo.id, None)
+                self.rechazados += 1
+            raise ColaLlena(f"Cola de análisis llena ({self.max_cola} trabajos pendientes)")
+        return trabajo
+
+    def obtener(self, job_id: str) -> Optional[Trabajo]:
+        with self._lock:
+            return self._trabajos.get(job_id)
+
+    def _purgar(self):
+        """Olvidar los trabajos terminados hace más de 'retencion' segundos (llamar con el lock)"""
+        limite = time.time() - self.retencion
+        for job_id in list(self._trabajos):
+            trabajo = self._trabajos[job_id]
+            if trabajo.creado >= limite:
+                break  # El resto es más reciente
+            if trabajo.terminado is not None and trabajo.terminado < limite:
+                del self._trabajos[job_id]
+
+    def _trabajar(self):
+        while True:
+            trabajo = self.cola.get()
+            trabajo.estado = "procesando"
+            trabajo.iniciado = time.time()
+            try:
+                trabajo.resultado = trabajo.funcion(trabajo, *trabajo.args)
+                trabajo.estado = "completado"
+            except Exception as e:
+                print(f"[TRABAJOS] Error en trabajo {trabajo.id}: {e}")
+                trabajo.error = str(e)
+                trabajo.estado = "error"
+            finally:
+                trabajo.terminado = time.time()
+                with self._lock:
+                    if trabajo.estado == "completado":
+                        self.completados += 1
+                    else:
+                        self.fallidos += 1
+                self.cola.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Ocupación de la cola y contadores de trabajos"""
+        with self._lock:
+            return {
+                "en_cola": self.cola.qsize(),
+                "max_cola": self.max_cola,
+                "procesando": sum(1 for t in self._trabajos.values() if t.estado == "procesando"),
+                "completados": self.completados,
+                "fallidos": self.fallidos,
+                "rechazados": self.rechazados,
+                "retenidos": len(self._trabajos)
+            }
+
+cola_trabajos = ColaTrabajos(LIVE_TRABAJOS_HILOS, LIVE_TRABAJOS_MAX_COLA, LIVE_TRABAJOS_RETENCION_SEGUNDOS)